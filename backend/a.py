@@ -3,17 +3,38 @@ import hashlib
 import json
 import requests
 import random
-import string
-from datetime import datetime
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from collections import Counter
 from functools import wraps
 from flask import (
     Flask, request, jsonify, render_template,
-    redirect, url_for, session, send_from_directory
+    redirect, url_for, session,
+    Response, stream_with_context
 )
 from flask_sqlalchemy import SQLAlchemy
+from jinja2 import TemplateNotFound
 from flask_migrate import Migrate
-from reference import generate_ai_reference, generate_ai_checkup_reference
-from app.llama_service import ask_health_assistant, ask_emergency
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from reference import generate_ai_reference, generate_ai_checkup_reference, generate_ambulance_reference
+from app.db.connection import apply_pragmas, STATEMENT_CACHE_SIZE
+from app.static_assets import AssetManifest
+from app.rules_engine import RulesEngine
+from app.task_queue import TaskQueue
+from app.notifications import Outbox, NOTIFY_BATCH_WINDOW, reminder_time
+from app.scheduler import SlotScheduler, SlotUnavailable
+from app.journal import JsonlJournal, migrate_json_array
+from app.llama_service import (
+    ask_health_assistant, ask_emergency, stream_health_assistant, cache_stats,
+    admission_stats, AI_BUSY_MESSAGE
+)
+from app.admission import Overloaded
+from app.metrics import registry as metrics_registry, instrument_app, instrument_engine
+from app.profiler import RequestProfiler
+from app.export import export as export_records, ExportError, FORMATS as EXPORT_FORMATS, DATASETS as EXPORT_DATASETS, sqlite_engine
 
 # -----------------------------
 # Flask Setup
@@ -30,30 +51,159 @@ app = Flask(
 
 app.secret_key = "supersecretkey"
 
-DB_PATH = os.path.join(BASE_DIR, "healthhub.db")
+# Databases, the ambulance journal and health_rules.json live here; point it
+# elsewhere to run against a scratch copy (the benchmarks do).
+DATA_DIR = os.getenv("HEALTHHUB_DATA_DIR", BASE_DIR)
+
+DB_PATH = os.path.join(DATA_DIR, "healthhub.db")
 app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "connect_args": {"timeout": 30, "cached_statements": STATEMENT_CACHE_SIZE},
+}
+
+# WAL, synchronous=NORMAL, busy_timeout, mmap and cache size on every pooled connection.
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_pragmas(dbapi_connection)
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
 # -----------------------------
-# Ambulance JSON Storage
+# Metrics
+# -----------------------------
+# Route latency, in-flight requests and SQL timings; served merged across
+# worker processes at /metrics (see app/metrics.py). Set METRICS_TOKEN to
+# require "Authorization: Bearer <token>" from the scraper.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+instrument_app(app)
+instrument_engine(Engine)
+
+@app.route("/metrics")
+def metrics():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return ("Forbidden", 403)
+    return Response(metrics_registry.exposition(), mimetype="text/plain; version=0.0.4")
+
+# Opt-in profiling: an admin sends "X-Profile: sample" (stack sampling, .folded
+# for flamegraph.pl/speedscope) or "X-Profile: cprofile" (.prof for snakeviz);
+# PROFILE_SAMPLE_RATE profiles a random share of all requests. See app/profiler.py.
+profiler = RequestProfiler(is_admin=lambda: session.get("role") == "admin")
+profiler.init_app(app)
+
+# -----------------------------
+# Static Assets
 # -----------------------------
-AMBULANCE_JSON = os.path.join(BASE_DIR, "ambulance_requests.json")
-if not os.path.exists(AMBULANCE_JSON):
-    with open(AMBULANCE_JSON, "w") as f:
-        json.dump([], f)
+# Hashed, precompressed and fingerprinted once by `flask --app a build-assets`
+# (a deploy step); workers only load the saved manifest, and rebuild it once if
+# it is missing or the frontend changed. See app/static_assets.py.
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join(BASE_DIR, ".asset_cache"))
+assets = AssetManifest(FRONTEND_DIR, ASSET_CACHE_DIR).load_or_build()
+app.jinja_env.globals["asset_url"] = assets.url
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    assets.build()
+    print(f"Built the asset manifest for {FRONTEND_DIR} into {ASSET_CACHE_DIR}")
+
+def render_page(name):
+    asset = assets.get(name)
+    if asset is None or asset.is_template:
+        return render_template(name)
+    return assets.serve(asset)
+
+# -----------------------------
+# Ambulance Request Journal
+# -----------------------------
+# Append-only JSON Lines with cross-process locking, group-commit fsync and rotation.
+# The legacy ambulance_requests.json array is imported by an explicit step
+# (`flask --app a migrate-ambulance-requests`, also run by `python a.py`), never
+# at import time, and the JSON file is left as it is.
+AMBULANCE_JSON = os.path.join(DATA_DIR, "ambulance_requests.json")
+AMBULANCE_JOURNAL = os.path.join(DATA_DIR, "ambulance_requests.jsonl")
+ambulance_journal = JsonlJournal(AMBULANCE_JOURNAL)
+
+@app.cli.command("migrate-ambulance-requests")
+def migrate_ambulance_requests_command():
+    print(f"Imported {migrate_json_array(AMBULANCE_JSON, ambulance_journal)} ambulance requests into {AMBULANCE_JOURNAL}")
 
 def save_ambulance_request(data):
-    try:
-        with open(AMBULANCE_JSON, "r") as f:
-            existing = json.load(f)
-    except:
-        existing = []
-    existing.append(data)
-    with open(AMBULANCE_JSON, "w") as f:
-        json.dump(existing, f, indent=4)
+    ambulance_journal.append(data)
+
+# -----------------------------
+# Background Tasks
+# -----------------------------
+# Follow-up work is enqueued in the same transaction as the row that caused it
+# and runs after the response, on TASK_WORKERS threads in each web process
+# (set TASK_WORKERS=0 and run `python -m app.task_queue work` to move it out).
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "2"))
+tasks = TaskQueue(DB_PATH, context=app.app_context)
+
+@tasks.task("ambulance.journal")
+def journal_ambulance_request(payload):
+    save_ambulance_request(payload)
+
+@event.listens_for(db.session, "after_commit")
+def _wake_task_worker(session):
+    if session.info.pop("tasks_enqueued", False):
+        tasks.notify()
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_enqueued_tasks(session):
+    session.info.pop("tasks_enqueued", None)
+
+@app.before_request
+def _start_task_worker():
+    if TASK_WORKERS > 0:
+        tasks.start_worker(TASK_WORKERS)
+
+# -----------------------------
+# Booking Notifications
+# -----------------------------
+# Confirmations wait NOTIFY_BATCH_WINDOW seconds so a parent's bookings from the
+# same session go out as one digest; reminders are sent the day before.
+outbox = Outbox(DB_PATH)
+
+@tasks.task("notifications.flush")
+def flush_notifications(payload):
+    outbox.flush()
+    # Whatever is left (more due rows, failed digests backing off) gets a flush
+    # at its send time; one task per target second.
+    next_due = outbox.next_due()
+    if next_due is not None:
+        tasks.enqueue("notifications.flush", {}, delay=max(0.0, next_due - time.time()),
+                      dedupe_key=f"notifications.flush:{int(next_due)}")
+
+def notify_booking(recipient, what, child_name, date, reference):
+    """Queues the confirmation and reminder emails in the booking's own transaction."""
+    if not recipient or "@" not in recipient:
+        return
+    details = f"{what} for {child_name} on {date} (reference {reference})"
+    outbox.add(
+        recipient, "confirmation", f"Booking confirmed: {what} for {child_name}",
+        f"Your booking is confirmed: {details}.",
+        session=db.session, dedupe_key=f"confirmation:{reference}"
+    )
+    tasks.enqueue("notifications.flush", {}, session=db.session,
+                  delay=NOTIFY_BATCH_WINDOW, dedupe_key="notifications.flush")
+    send_at = reminder_time(date)
+    if send_at:
+        outbox.add(
+            recipient, "reminder", f"Reminder: {what} for {child_name}",
+            f"This is a reminder of your upcoming booking: {details}.",
+            session=db.session, send_after=send_at, dedupe_key=f"reminder:{reference}"
+        )
+        tasks.enqueue("notifications.flush", {}, session=db.session,
+                      delay=send_at - time.time(), dedupe_key=f"notifications.flush:{int(send_at)}")
+
+# -----------------------------
+# Emergency Guidance Rules
+# -----------------------------
+# Compiled into one matcher and hot-reloaded when /admin/health-rules rewrites the file.
+RULES_JSON = os.path.join(DATA_DIR, "health_rules.json")
+health_rules = RulesEngine(RULES_JSON)
 
 # -----------------------------
 # Utilities
@@ -142,6 +292,269 @@ class VaccineBooking(db.Model):
     date = db.Column(db.String(20), nullable=False)
     reference = db.Column(db.String(50), unique=True, nullable=False)
 
+class ChildHealthSummary(db.Model):
+    """One row per child, kept up to date on every health-related write."""
+    child_name = db.Column(db.String(120), primary_key=True)
+    recent_illnesses = db.Column(db.Text, nullable=False, default="[]")
+    sick_count = db.Column(db.Integer, nullable=False, default=0)
+    booking_count = db.Column(db.Integer, nullable=False, default=0)
+    ambulance_count = db.Column(db.Integer, nullable=False, default=0)
+    last_absence_date = db.Column(db.String(20))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+class HealthRollup(db.Model):
+    """Event counts per day / week / month / all time, per metric and breakdown (grade, vaccine type, ...)."""
+    period = db.Column(db.String(8), primary_key=True)          # "day", "week", "month", "all" or "unknown" (bad date)
+    metric = db.Column(db.String(32), primary_key=True)         # "sick", "vaccine", "checkup", ...
+    period_start = db.Column(db.String(10), primary_key=True)   # ISO date of the period's first day
+    dimension = db.Column(db.String(120), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class VaccineCoverage(db.Model):
+    """One row per child and vaccine type, so coverage counts each child once."""
+    vaccine_type = db.Column(db.String(120), primary_key=True)
+    child_name = db.Column(db.String(120), primary_key=True)
+
+# -----------------------------
+# Child Health Summaries
+# -----------------------------
+# The emergency path reads one summary row by key instead of scanning sick_log.
+# Summaries are maintained inside the same flush (so the same transaction) as
+# the SickLog / booking / ambulance row that changes them.
+RECENT_ILLNESSES = 3
+
+def _apply_health_event(conn, obj):
+    table = ChildHealthSummary.__table__
+    row = conn.execute(
+        table.select().where(table.c.child_name == obj.child_name)
+    ).mappings().first()
+    values = {
+        "recent_illnesses": json.loads(row["recent_illnesses"]) if row else [],
+        "sick_count": row["sick_count"] if row else 0,
+        "booking_count": row["booking_count"] if row else 0,
+        "ambulance_count": row["ambulance_count"] if row else 0,
+        "last_absence_date": row["last_absence_date"] if row else None,
+    }
+    if isinstance(obj, SickLog):
+        values["recent_illnesses"].append(
+            {"date": obj.date, "symptoms": obj.symptoms, "description": obj.description}
+        )
+        values["recent_illnesses"] = values["recent_illnesses"][-RECENT_ILLNESSES:]
+        values["sick_count"] += 1
+        if not values["last_absence_date"] or obj.date > values["last_absence_date"]:
+            values["last_absence_date"] = obj.date
+    elif isinstance(obj, AmbulanceBooking):
+        values["ambulance_count"] += 1
+    else:
+        values["booking_count"] += 1
+    values["recent_illnesses"] = json.dumps(values["recent_illnesses"])
+    values["updated_at"] = datetime.now()
+    conn.execute(
+        sqlite_insert(table)
+        .values(child_name=obj.child_name, **values)
+        .on_conflict_do_update(index_elements=["child_name"], set_=values)
+    )
+
+@event.listens_for(db.session, "after_flush")
+def _update_health_summaries(session, flush_context):
+    tracked = (SickLog, CheckupBooking, VaccineBooking, AmbulanceBooking)
+    new_rows = [obj for obj in session.new if isinstance(obj, tracked)]
+    if not new_rows:
+        return
+    # SickLog rows are applied in insert order so "recent" keeps the latest entries.
+    new_rows.sort(key=lambda obj: (type(obj).__name__, obj.id or 0))
+    conn = session.connection()
+    for obj in new_rows:
+        _apply_health_event(conn, obj)
+
+def rebuild_health_summaries():
+    """Recomputes every summary from the source tables (backfill / repair)."""
+    summaries = {}
+    def summary(name):
+        return summaries.setdefault(name, {
+            "recent_illnesses": [], "sick_count": 0, "booking_count": 0,
+            "ambulance_count": 0, "last_absence_date": None,
+        })
+    for r in SickLog.query.order_by(SickLog.id).yield_per(1000):
+        s = summary(r.child_name)
+        s["recent_illnesses"] = (s["recent_illnesses"] + [
+            {"date": r.date, "symptoms": r.symptoms, "description": r.description}
+        ])[-RECENT_ILLNESSES:]
+        s["sick_count"] += 1
+        if not s["last_absence_date"] or r.date > s["last_absence_date"]:
+            s["last_absence_date"] = r.date
+    for model in (CheckupBooking, VaccineBooking):
+        for name, count in db.session.query(model.child_name, func.count()).group_by(model.child_name):
+            summary(name)["booking_count"] += count
+    for name, count in db.session.query(AmbulanceBooking.child_name, func.count()).group_by(AmbulanceBooking.child_name):
+        summary(name)["ambulance_count"] += count
+
+    ChildHealthSummary.query.delete()
+    now = datetime.now()
+    if summaries:
+        db.session.execute(ChildHealthSummary.__table__.insert(), [
+            dict(s, child_name=name, updated_at=now, recent_illnesses=json.dumps(s["recent_illnesses"]))
+            for name, s in summaries.items()
+        ])
+    db.session.commit()
+    return len(summaries)
+
+@app.cli.command("rebuild-health-summaries")
+def rebuild_health_summaries_command():
+    print(f"Rebuilt {rebuild_health_summaries()} child health summaries")
+
+# -----------------------------
+# Dashboard Rollups
+# -----------------------------
+# The dashboard reads a bounded number of pre-aggregated rows instead of
+# scanning the source tables. Like the summaries above, rollups are updated in
+# the same flush as the rows they count; rebuild_health_rollups() is the catch-up.
+def _event_day(value):
+    """Date a row is counted under, from its own date field; None if that is missing or unparseable."""
+    try:
+        return datetime.strptime((value or "").strip()[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+def _period_starts(day):
+    # Undated rows still count in the all-time totals but in no day/week/month series.
+    if day is None:
+        return {"unknown": "", "all": ""}
+    return {
+        "day": day.isoformat(),
+        "week": (day - timedelta(days=day.weekday())).isoformat(),
+        "month": day.replace(day=1).isoformat(),
+        "all": "",
+    }
+
+def _rollup_event(obj):
+    """(metric, day, dimension) for a tracked row."""
+    if isinstance(obj, SickLog):
+        return "sick", _event_day(obj.date), obj.grade.strip()
+    if isinstance(obj, VaccineBooking):
+        return "vaccine", _event_day(obj.date), obj.vaccine_type.strip()
+    if isinstance(obj, CheckupBooking):
+        return "checkup", _event_day(obj.date), obj.check_type.strip()
+    # Ambulance bookings have no date column; they count on the day they are made.
+    return "ambulance", datetime.now().date(), obj.emergency_type.strip()
+
+def _add_rollup_counts(conn, counts):
+    table = HealthRollup.__table__
+    for (period, metric, start, dimension), n in counts.items():
+        conn.execute(
+            sqlite_insert(table)
+            .values(period=period, metric=metric, period_start=start, dimension=dimension, count=n)
+            .on_conflict_do_update(
+                index_elements=["period", "metric", "period_start", "dimension"],
+                set_={"count": table.c.count + n}
+            )
+        )
+
+@event.listens_for(db.session, "after_flush")
+def _update_health_rollups(session, flush_context):
+    tracked = (SickLog, CheckupBooking, VaccineBooking, AmbulanceBooking)
+    new_rows = [obj for obj in session.new if isinstance(obj, tracked)]
+    if not new_rows:
+        return
+    conn = session.connection()
+    counts = Counter()
+    for obj in new_rows:
+        metric, day, dimension = _rollup_event(obj)
+        for period, start in _period_starts(day).items():
+            counts[(period, metric, start, dimension)] += 1
+        if metric == "vaccine":
+            first = conn.execute(
+                sqlite_insert(VaccineCoverage.__table__)
+                .values(vaccine_type=dimension, child_name=obj.child_name.strip())
+                .on_conflict_do_nothing()
+            ).rowcount
+            if first:
+                counts[("all", "vaccine_children", "", dimension)] += 1
+    _add_rollup_counts(conn, counts)
+
+def rebuild_health_rollups():
+    """
+    Recomputes the sick, vaccine and check-up rollups from their tables.
+    Ambulance rollups are kept: ambulance_booking has no date to recount them from.
+    """
+    counts = Counter()
+    sources = ((SickLog, "sick", SickLog.grade), (VaccineBooking, "vaccine", VaccineBooking.vaccine_type),
+               (CheckupBooking, "checkup", CheckupBooking.check_type))
+    for model, metric, dimension in sources:
+        grouped = db.session.query(model.date, dimension, func.count()).group_by(model.date, dimension)
+        for value, key, n in grouped:
+            for period, start in _period_starts(_event_day(value)).items():
+                counts[(period, metric, start, key.strip())] += n
+
+    VaccineCoverage.query.delete()
+    pairs = {
+        (vaccine_type.strip(), child_name.strip())
+        for vaccine_type, child_name in db.session.query(
+            VaccineBooking.vaccine_type, VaccineBooking.child_name).distinct()
+    }
+    if pairs:
+        db.session.execute(VaccineCoverage.__table__.insert(), [
+            {"vaccine_type": v, "child_name": c} for v, c in pairs
+        ])
+    for vaccine_type, _ in pairs:
+        counts[("all", "vaccine_children", "", vaccine_type)] += 1
+
+    HealthRollup.query.filter(HealthRollup.metric != "ambulance").delete()
+    conn = db.session.connection()
+    _add_rollup_counts(conn, counts)
+    db.session.commit()
+    return len(counts)
+
+@app.cli.command("rebuild-health-rollups")
+def rebuild_health_rollups_command():
+    print(f"Rebuilt {rebuild_health_rollups()} dashboard rollup rows")
+
+def _rollup_series(period, metric, since):
+    rows = (HealthRollup.query
+            .filter(HealthRollup.period == period, HealthRollup.metric == metric,
+                    HealthRollup.period_start >= since)
+            .order_by(HealthRollup.period_start, HealthRollup.dimension))
+    return [{"period": r.period_start, "key": r.dimension, "count": r.count} for r in rows]
+
+def dashboard_data(days=30, weeks=12, months=12):
+    """Everything /api/dashboard returns; reads O(window) rollup rows whatever the history size."""
+    today = datetime.now().date()
+    day_since = (today - timedelta(days=days - 1)).isoformat()
+    week_since = _period_starts(today - timedelta(weeks=weeks - 1))["week"]
+    month_start = today.replace(day=1)
+    for _ in range(months - 1):
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+    month_since = month_start.isoformat()
+
+    grade = func.coalesce(Student.grade, "Unassigned")
+    students = dict(db.session.query(grade, func.count()).group_by(grade))
+    absences = _rollup_series("week", "sick", week_since)
+    for row in absences:
+        enrolled = students.get(row["key"])
+        row["rate"] = round(row["count"] / enrolled, 3) if enrolled else None
+
+    total_students = sum(students.values())
+    bookings = {row["key"]: row["count"] for row in _rollup_series("all", "vaccine", "")}
+    coverage = []
+    for row in _rollup_series("all", "vaccine_children", ""):
+        coverage.append({
+            "vaccine_type": row["key"],
+            "children": row["count"],
+            "bookings": bookings.get(row["key"], 0),
+            "coverage": round(row["count"] / total_students, 3) if total_students else None,
+        })
+
+    return {
+        "window": {"days": days, "weeks": weeks, "months": months},
+        "students_per_grade": students,
+        "absences_per_grade_weekly": absences,
+        "absences_daily": _rollup_series("day", "sick", day_since),
+        "vaccine_coverage": coverage,
+        "vaccinations_weekly": _rollup_series("week", "vaccine", week_since),
+        "checkups_weekly": _rollup_series("week", "checkup", week_since),
+        "ambulance_monthly": _rollup_series("month", "ambulance", month_since),
+    }
+
 # -----------------------------
 # User Management
 # -----------------------------
@@ -207,37 +620,51 @@ def check_session():
 def dashboard():
     if session.get("role").lower() in ["admin", "teacher"]:
         return redirect(url_for("admin_dashboard"))
-    return render_template("hub-dashboard.html")
+    return render_page("hub-dashboard.html")
 
 @app.route("/admin-dashboard")
 @login_required
 def admin_dashboard():
     if session.get("role").lower() not in ["admin", "teacher"]:
         return redirect(url_for("login_page"))
-    return render_template("hub-dashboard.html")
+    return render_page("hub-dashboard.html")
+
+@app.route("/api/dashboard")
+def dashboard_api():
+    if session.get("role") not in ["admin", "teacher"]:
+        return ("Forbidden", 403)
+    def window(name, default, limit):
+        try:
+            return max(1, min(int(request.args.get(name, default)), limit))
+        except ValueError:
+            return default
+    data = dashboard_data(window("days", 30, 366), window("weeks", 12, 260), window("months", 12, 120))
+    body = json.dumps(data, sort_keys=True)
+    etag = hashlib.sha1(body.encode()).hexdigest()
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype="application/json", headers=headers)
 
 # -----------------------------
 # Pages
 # -----------------------------
 @app.route("/")
 def home():
-    return render_template("index.html")
+    return render_page("index.html")
 
 @app.route("/login")
 def login_page():
-    return render_template("login.html")
+    return render_page("login.html")
 
 @app.route("/<path:resource>")
 def serve_resource(resource):
-    safe_path = os.path.normpath(os.path.join(FRONTEND_DIR, resource))
-    if not safe_path.startswith(FRONTEND_DIR):
-        return ("Invalid path", 400)
-    if os.path.exists(safe_path) and os.path.isfile(safe_path):
-        rel = os.path.relpath(safe_path, FRONTEND_DIR)
-        return send_from_directory(FRONTEND_DIR, rel)
+    asset = assets.get(resource)
+    if asset is not None:
+        return render_page(asset.rel_path)
     try:
         return render_template(resource)
-    except Exception:
+    except TemplateNotFound:
         return ("Not Found", 404)
 
 
@@ -247,32 +674,32 @@ def serve_resource(resource):
 @app.route("/health/immunization-booking")
 @login_required
 def immunization_page():
-    return render_template("Immunization-Booking.html")
+    return render_page("Immunization-Booking.html")
 
 @app.route("/health/sick-absenteeism")
 @login_required
 def sick_page():
-    return render_template("sick-log.html")
+    return render_page("sick-log.html")
 
 @app.route("/health/eye-dental-bookings")
 @login_required
 def eye_dental_page():
-    return render_template("eye-dental-booking.html")
+    return render_page("eye-dental-booking.html")
 
 @app.route("/health/school-pharmacy")
 @login_required
 def pharmacy_page():
-    return render_template("pharmacy.html")
+    return render_page("pharmacy.html")
 
 @app.route("/health/ambulance-request")
 @login_required
 def ambulance_page():
-    return render_template("ambulance-request.html")
+    return render_page("ambulance-request.html")
 
 @app.route("/health/ai-assistant")
 @login_required
 def ai_page():
-    return render_template("chatbot.html")
+    return render_page("chatbot.html")
 
 # -----------------------------
 # Form Handlers (Protected APIs)
@@ -297,14 +724,19 @@ def sick_log_form():
 def checkup_form():
     data = request.form
     reference_number = generate_ai_checkup_reference(data["check_type"])
+    try:
+        date = reserve_booking_slot(data, "checkup", reference_number)
+    except SlotUnavailable as e:
+        return slot_unavailable(e)
     entry = CheckupBooking(
         child_name=data["child_name"],
         parent_email=data["parent_email"],
         check_type=data["check_type"],
-        date=data["date"],
+        date=date,
         reference_number=reference_number
     )
     db.session.add(entry)
+    notify_booking(data["parent_email"], data["check_type"], data["child_name"], date, reference_number)
     db.session.commit()
     return jsonify({
         "status": "success",
@@ -318,15 +750,78 @@ def checkup_form():
 def vaccine_form():
     data = request.form
     reference_number = generate_ai_reference(data["vaccine_type"])
+    try:
+        date = reserve_booking_slot(data, "vaccine", reference_number)
+    except SlotUnavailable as e:
+        return slot_unavailable(e)
     entry = VaccineBooking(
         child_name=data["child_name"],
         vaccine_type=data["vaccine_type"],
-        date=data["date"],
+        date=date,
         reference=reference_number
     )
     db.session.add(entry)
+    notify_booking(session.get("username"), f"{data['vaccine_type']} vaccination", data["child_name"],
+                   date, reference_number)
     db.session.commit()
-    return jsonify({"status": "success", "reference": reference_number}), 200
+    return jsonify({"status": "success", "reference": reference_number, "date": date}), 200
+
+# -----------------------------
+# Clinic Slots
+# -----------------------------
+# Clinic and mobile-team visits have a fixed number of places per slot; see
+# app/scheduler.py. A booking that names a slot_id takes its place in the
+# booking's own transaction, so a full slot rolls the whole booking back.
+scheduler = SlotScheduler(DB_PATH)
+
+def reserve_booking_slot(data, service, reference):
+    """The booking date: the reserved slot's start, or the free-text date when no slot_id is sent."""
+    if not data.get("slot_id"):
+        return data["date"]
+    try:
+        slot_id = int(data["slot_id"])
+    except ValueError:
+        raise SlotUnavailable("no such slot", data["slot_id"])
+    return scheduler.reserve(db.session, slot_id, service, reference, data["child_name"])
+
+def slot_unavailable(e):
+    db.session.rollback()
+    return jsonify({"status": "error", "message": e.reason, "slot_id": e.slot_id}), 409
+
+@app.route("/admin/clinic-visits", methods=["POST"])
+def create_clinic_visit():
+    if session.get("role") != "admin":
+        return ("Forbidden", 403)
+    data = request.get_json(silent=True) or {}
+    try:
+        visit_id = scheduler.create_visit(
+            data.get("name", ""), data.get("date", ""),
+            start=data.get("start", "08:00"), end=data.get("end", "14:00"),
+            slot_minutes=int(data.get("slot_minutes", 60)), capacity=int(data.get("capacity", 20)),
+            services=data.get("services") or ("vaccine", "checkup"),
+            kind=data.get("kind", "clinic"), school=data.get("school")
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", "visit_id": visit_id}), 201
+
+@app.route("/api/clinic-visits")
+@api_login_required
+def clinic_visits():
+    return jsonify(scheduler.visits())
+
+@app.route("/api/clinic-visits/<int:visit_id>/availability")
+@api_login_required
+def clinic_visit_availability(visit_id):
+    found = scheduler.availability(visit_id)
+    if found is None:
+        return jsonify({"status": "error", "message": "no such visit"}), 404
+    version, body = found
+    etag = f"{visit_id}-{version}"
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype="application/json", headers=headers)
 
 # -----------------------------
 # Ambulance Booking with AI Assistance
@@ -338,8 +833,7 @@ def ambulance_booking():
     child_name = data["child_name"]
     emergency_type = data["emergency_type"]
 
-    # Generate unique reference
-    ref = "AMB-" + datetime.now().strftime("%Y%m%d") + "-" + ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
+    ref = generate_ambulance_reference()
     hospitals = ["Mediclinic", "Netcare", "Life Healthcare", "Charlotte Maxeke Hospital"]
     selected_hospital = random.choice(hospitals)
 
@@ -351,8 +845,7 @@ def ambulance_booking():
         reference_number=ref
     )
     db.session.add(entry)
-    db.session.commit()
-    save_ambulance_request({
+    tasks.enqueue("ambulance.journal", {
         "reference_number": ref,
         "child_name": child_name,
         "class_name": data["class_name"],
@@ -360,15 +853,14 @@ def ambulance_booking():
         "description": data["description"],
         "hospital": selected_hospital,
         "timestamp": datetime.now().isoformat()
-    })
+    }, session=db.session)
+    db.session.commit()
 
     eta_minutes = random.randint(5, 15)
 
-    # Fetch previous illness records
-    previous_records = SickLog.query.filter_by(child_name=child_name).all()
-    previous_illnesses = [
-        {"date": r.date, "symptoms": r.symptoms, "description": r.description} for r in previous_records
-    ]
+    # Previous illnesses come from the child's summary row (one primary-key read)
+    summary = db.session.get(ChildHealthSummary, child_name)
+    previous_illnesses = json.loads(summary.recent_illnesses) if summary else []
 
     suggested_actions = [
         "Keep the child calm and comfortable.",
@@ -387,38 +879,8 @@ def ambulance_booking():
             ". Monitor for similar symptoms."
         )
 
-    # Emergency-specific guidance
-    emergency_guidance = []
-    if "fever" in emergency_type.lower():
-        emergency_guidance = [
-            "Monitor the child's temperature regularly.",
-            "Keep the child hydrated.",
-            "Do not give any medication unless prescribed by a doctor.",
-            "Remove excess clothing and keep the room cool."
-        ]
-    elif "injury" in emergency_type.lower() or "cut" in emergency_type.lower():
-        emergency_guidance = [
-            "Apply gentle pressure to stop any bleeding.",
-            "Keep the injured area elevated if possible.",
-            "Do not try to move the child if there is suspected fracture.",
-            "Keep the child calm and still."
-        ]
-    elif "allergic" in emergency_type.lower():
-        emergency_guidance = [
-            "Check if the child has an epinephrine auto-injector and use if prescribed.",
-            "Remove any allergen from immediate environment.",
-            "Monitor breathing and pulse continuously.",
-            "Keep the child calm and lying down."
-        ]
-    elif "breathing" in emergency_type.lower() or "asthma" in emergency_type.lower():
-        emergency_guidance = [
-            "Help the child sit upright.",
-            "Give prescribed inhaler if available.",
-            "Keep airways clear and calm the child.",
-            "Monitor breathing closely until help arrives."
-        ]
-    else:
-        emergency_guidance = ["Follow general first-aid measures and keep the child comfortable."]
+    # Emergency-specific guidance from health_rules.json
+    emergency_guidance = health_rules.guidance(emergency_type, data["description"])
 
     ai_suggestions.extend(emergency_guidance)
 
@@ -455,7 +917,12 @@ def ask_ai():
     try:
 
         # Call your Llama wrapper
-        answer = ask_health_assistant(question, age)
+        answer = ask_health_assistant(question, age, category)
+
+    except Overloaded as e:
+        # Shed by admission control: answer fast so the client can retry.
+        response = jsonify({"answer": AI_BUSY_MESSAGE, "retry_after": e.retry_after})
+        return response, 503, {"Retry-After": str(e.retry_after)}
 
     except Exception as e:
         print("Llama API error:", e)
@@ -463,6 +930,105 @@ def ask_ai():
 
     return jsonify({"answer": answer})
 
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route("/api/ask-ai/stream", methods=["POST"])
+def ask_ai_stream():
+    """
+    Streams the assistant's answer as Server-Sent Events:
+    "token" events carry text chunks, a final "done" event closes the stream.
+    Clients that don't send Accept: text/event-stream get the buffered JSON answer.
+    """
+    if "text/event-stream" not in request.headers.get("Accept", ""):
+        return ask_ai()
+
+    data = request.get_json(silent=True) or {}
+    question = data.get("question", "").strip()
+    age = data.get("age", "unknown").strip()
+    category = data.get("category", "General")
+
+    def events():
+        if not question:
+            yield _sse("token", {"text": "❗ Please ask a valid question."})
+        else:
+            try:
+                for text in stream_health_assistant(question, age, category):
+                    if text:
+                        yield _sse("token", {"text": text})
+            except Overloaded as e:
+                yield _sse("token", {"text": AI_BUSY_MESSAGE})
+                yield _sse("busy", {"retry_after": e.retry_after})
+        yield _sse("done", {})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/admin/ai-cache")
+def ai_cache_stats():
+    if session.get("role") != "admin":
+        return ("Forbidden", 403)
+    return jsonify(cache_stats())
+
+@app.route("/admin/llm-admission")
+def llm_admission_stats():
+    if session.get("role") != "admin":
+        return ("Forbidden", 403)
+    return jsonify(admission_stats())
+
+@app.route("/admin/ambulance-requests")
+def recent_ambulance_requests():
+    if session.get("role") not in ["admin", "teacher"]:
+        return ("Forbidden", 403)
+    try:
+        limit = max(1, min(int(request.args.get("limit", 50)), 1000))
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit must be an integer"}), 400
+    return jsonify(ambulance_journal.recent(limit))
+
+# -----------------------------
+# Partner Clinic Exports
+# -----------------------------
+# Streams a dataset as CSV, Parquet or Arrow without loading it into memory;
+# see app/export.py. The school datasets come from the app/db/crud.py database.
+SCHOOL_DB_PATH = os.getenv("SCHOOL_DB_PATH", os.path.join(BASE_DIR, "app", "db", "database.db"))
+_school_engine = None
+
+@app.route("/api/export/<dataset>")
+def export_dataset(dataset):
+    global _school_engine
+    if session.get("role") != "admin":
+        return ("Forbidden", 403)
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({"status": "error", "message": f"unknown dataset {dataset!r}"}), 404
+    if EXPORT_DATASETS[dataset].source == "health":
+        engine = db.engine
+    elif os.path.exists(SCHOOL_DB_PATH):
+        _school_engine = _school_engine or sqlite_engine(SCHOOL_DB_PATH)
+        engine = _school_engine
+    else:
+        return jsonify({"status": "error", "message": "school database not found"}), 404
+    fmt = request.args.get("format", "csv").lower()
+    try:
+        pieces = export_records(
+            engine, dataset, fmt,
+            start=request.args.get("start") or None,
+            end=request.args.get("end") or None,
+            school=request.args.get("school") or None,
+        )
+    except ExportError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"{dataset}-{datetime.now():%Y%m%d}.{extension}"
+    return Response(
+        stream_with_context(pieces),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"}
+    )
+
 # -----------------------------
 # Admin Health Rules Management
 # -----------------------------
@@ -472,10 +1038,11 @@ def update_rules():
    if session.get("role") != "admin":
        return ("Forbidden", 403)
    new_rules = request.get_json(silent=True) or []
-   RULES_JSON = os.path.join(BASE_DIR, "health_rules.json")
-   with open(RULES_JSON, "w") as f:
-       json.dump(new_rules, f, indent=4)
-   return jsonify({"status": "success"})
+   try:
+       rules = health_rules.save(new_rules)
+   except ValueError as e:
+       return jsonify({"status": "error", "message": str(e)}), 400
+   return jsonify({"status": "success", "rules": len(rules)})
 
 
 # -----------------------------
@@ -498,8 +1065,14 @@ def create_demo_data():
 # Run App
 # -----------------------------
 if __name__ == "__main__":
+    migrate_json_array(AMBULANCE_JSON, ambulance_journal)
     with app.app_context():
         db.create_all()
         create_demo_data()
+        if not ChildHealthSummary.query.first() and SickLog.query.first():
+            rebuild_health_summaries()
+        if not HealthRollup.query.first() and (SickLog.query.first() or VaccineBooking.query.first()
+                                               or CheckupBooking.query.first()):
+            rebuild_health_rollups()
     print("Kgodisong Health Hub Running: http://127.0.0.1:5000/ 🚀")
     app.run(host="0.0.0.0", port=5000, debug=True)
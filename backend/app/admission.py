@@ -0,0 +1,184 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+# Per-process budget: with several gunicorn workers set LLM_RATE_PER_MIN to
+# (Groq requests-per-minute quota) / (number of workers).
+LLM_RATE_PER_MIN = float(os.getenv("LLM_RATE_PER_MIN", "30"))
+LLM_BURST = int(os.getenv("LLM_BURST", "5"))
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "8"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "64"))
+# Tokens and in-flight slots that only emergency traffic may use.
+LLM_EMERGENCY_RESERVE_TOKENS = float(os.getenv("LLM_EMERGENCY_RESERVE_TOKENS", "1"))
+LLM_EMERGENCY_RESERVE_SLOTS = int(os.getenv("LLM_EMERGENCY_RESERVE_SLOTS", "2"))
+
+PRIORITY_EMERGENCY = 0
+PRIORITY_HEALTH = 1
+PRIORITY_LOW = 2
+
+# How long a request may wait for admission before it is shed.
+MAX_WAIT = {
+    PRIORITY_EMERGENCY: float(os.getenv("LLM_WAIT_EMERGENCY", "30")),
+    PRIORITY_HEALTH: float(os.getenv("LLM_WAIT_HEALTH", "8")),
+    PRIORITY_LOW: float(os.getenv("LLM_WAIT_LOW", "2")),
+}
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after=1.0, reason="overloaded"):
+        super().__init__(reason)
+        self.retry_after = max(1, int(round(retry_after)))
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec, capacity):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, now, reserve=0.0):
+        """Takes one token if at least `reserve` would remain. Not thread-safe; callers hold a lock."""
+        self._refill(now)
+        if self.tokens - 1 >= reserve - 1e-9:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, reserve=0.0):
+        """Seconds until try_take(reserve) can succeed."""
+        missing = (1 + reserve) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate > 0 else float("inf")
+
+
+class AdmissionController:
+    """
+    Admission control in front of the Groq API.
+
+    - A token bucket keeps the request rate within the Groq quota, and at most
+      `max_inflight` calls run at once.
+    - Waiting requests form a priority queue: an emergency is always next in
+      line, ahead of any health or low-priority question.
+    - Part of the bucket and of the in-flight slots is reserved for emergencies,
+      so a backlog of ordinary questions can never use up their capacity.
+    - Deadline-aware shedding: a request that cannot be admitted within its
+      priority's wait budget fails fast with Overloaded instead of timing out,
+      and when the queue is full the lowest-priority waiter is dropped first.
+    """
+
+    def __init__(self, rate_per_min=LLM_RATE_PER_MIN, burst=LLM_BURST, max_inflight=LLM_MAX_INFLIGHT,
+                 queue_size=LLM_QUEUE_SIZE, reserve_tokens=LLM_EMERGENCY_RESERVE_TOKENS,
+                 reserve_slots=LLM_EMERGENCY_RESERVE_SLOTS, max_wait=None):
+        self.bucket = TokenBucket(rate_per_min / 60.0, burst)
+        self.max_inflight = max_inflight
+        self.queue_size = queue_size
+        self.reserve_tokens = reserve_tokens
+        self.reserve_slots = min(reserve_slots, max(0, max_inflight - 1))
+        self.max_wait = {**MAX_WAIT, **(max_wait or {})}
+        self.inflight = 0
+        self._cond = threading.Condition()
+        self._queue = []  # heap of [priority, seq, waiter]
+        self._seq = itertools.count()
+        self.admitted = {p: 0 for p in self.max_wait}
+        self.shed = {p: 0 for p in self.max_wait}
+
+    def _limits(self, priority):
+        if priority == PRIORITY_EMERGENCY:
+            return 0.0, self.max_inflight
+        return self.reserve_tokens, self.max_inflight - self.reserve_slots
+
+    def _estimate_wait(self, priority):
+        """Rough time until a request of this priority could be admitted."""
+        reserve, _ = self._limits(priority)
+        ahead = sum(1 for p, _, w in self._queue if p <= priority and not w["done"])
+        rate = self.bucket.rate or 1e-9
+        return self.bucket.wait_time(reserve) + ahead / rate
+
+    def _shed(self, priority, retry_after, reason):
+        self.shed[priority] = self.shed.get(priority, 0) + 1
+        raise Overloaded(retry_after, reason)
+
+    def acquire(self, priority=PRIORITY_HEALTH, max_wait=None):
+        max_wait = self.max_wait.get(priority, self.max_wait[PRIORITY_LOW]) if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        with self._cond:
+            self.bucket._refill(time.monotonic())
+            estimate = self._estimate_wait(priority)
+            if estimate > max_wait:
+                self._shed(priority, estimate, "rate limit")
+            if len(self._queue) >= self.queue_size:
+                worst = max(self._queue)
+                if worst[0] <= priority:
+                    self._shed(priority, estimate, "queue full")
+                # Make room by evicting the lowest-priority, most recent waiter.
+                worst[2]["evicted"] = True
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+            waiter = {"done": False, "evicted": False}
+            entry = [priority, next(self._seq), waiter]
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    if waiter["evicted"]:
+                        self._shed(priority, self._estimate_wait(priority), "queue full")
+                    now = time.monotonic()
+                    reserve, slots = self._limits(priority)
+                    if self._queue[0] is entry and self.inflight < slots and self.bucket.try_take(now, reserve):
+                        heapq.heappop(self._queue)
+                        waiter["done"] = True
+                        self.inflight += 1
+                        self.admitted[priority] = self.admitted.get(priority, 0) + 1
+                        self._cond.notify_all()
+                        return
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._shed(priority, self._estimate_wait(priority), "deadline")
+                    self._cond.wait(min(remaining, max(self.bucket.wait_time(reserve), 0.01)))
+            finally:
+                if not waiter["done"]:
+                    if not waiter["evicted"] and entry in self._queue:
+                        self._queue.remove(entry)
+                        heapq.heapify(self._queue)
+                    # The next waiter may now be at the head.
+                    self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, priority=PRIORITY_HEALTH, max_wait=None):
+        self.acquire(priority, max_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._cond:
+            self.bucket._refill(time.monotonic())
+            names = {PRIORITY_EMERGENCY: "emergency", PRIORITY_HEALTH: "health", PRIORITY_LOW: "low"}
+            return {
+                "rate_per_min": self.bucket.rate * 60,
+                "tokens": round(self.bucket.tokens, 2),
+                "inflight": self.inflight,
+                "max_inflight": self.max_inflight,
+                "queued": len(self._queue),
+                "admitted": {names.get(p, p): n for p, n in self.admitted.items()},
+                "shed": {names.get(p, p): n for p, n in self.shed.items()},
+            }
+
+
+admission = AdmissionController()
@@ -0,0 +1,279 @@
+"""
+FAISS approximate nearest-neighbour indexes over a VectorStore.
+
+RAG_INDEX_BACKEND selects how search_documents finds candidates:
+"exact" (brute-force dot product, default), "ivf" (IndexIVFFlat) or
+"hnsw" (IndexHNSWFlat). Indexes are saved next to the store and kept in
+sync incrementally with rows appended to it.
+
+Recall-vs-latency report against exact search:
+
+    python -m app.ann_index report --rows 50000 --k 10
+    python -m app.ann_index report --store vector_store.db
+"""
+import os
+import time
+import argparse
+import threading
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+RAG_INDEX_BACKEND = os.getenv("RAG_INDEX_BACKEND", "exact")
+RAG_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "256"))
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "200"))
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+# Unsaved rows are re-added from the store on load, so saving is only an optimisation.
+RAG_INDEX_SAVE_EVERY = int(os.getenv("RAG_INDEX_SAVE_EVERY", "1000"))
+
+
+def _require_faiss():
+    if faiss is None:
+        raise RuntimeError("faiss-cpu is not installed; use RAG_INDEX_BACKEND=exact or pip install faiss-cpu")
+
+
+def build_faiss_index(kind, vectors, nlist=RAG_IVF_NLIST, m=RAG_HNSW_M,
+                      ef_construction=RAG_HNSW_EF_CONSTRUCTION):
+    """Creates an (empty, trained if needed) inner-product index for these vectors."""
+    _require_faiss()
+    dim = vectors.shape[1]
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        return index
+    if kind == "ivf":
+        # FAISS wants ~39 training points per list; shrink nlist for small corpora.
+        nlist = max(1, min(nlist, len(vectors) // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        sample = vectors
+        if len(vectors) > nlist * 256:
+            picks = np.random.default_rng(0).choice(len(vectors), nlist * 256, replace=False)
+            sample = vectors[np.sort(picks)]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+        return index
+    raise ValueError(f"Unknown FAISS index kind: {kind}")
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    if nprobe is not None and hasattr(index, "nprobe"):
+        index.nprobe = nprobe
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+
+class FaissIndex:
+    """
+    ANN index mirroring a VectorStore. FAISS ids are store row numbers, so
+    newly appended rows are added incrementally and superseded rows are
+    filtered out with the store's live mask. An IVF index is retrained once
+    the corpus is large enough for twice its current number of lists.
+    """
+
+    def __init__(self, store, kind="hnsw", path=None, nprobe=RAG_IVF_NPROBE, ef_search=RAG_HNSW_EF_SEARCH,
+                 nlist=RAG_IVF_NLIST):
+        _require_faiss()
+        self.store = store
+        self.kind = kind
+        self.path = path or f"{store.path}.{kind}.faiss"
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self._lock = threading.Lock()
+        self._index = faiss.read_index(self.path) if os.path.exists(self.path) else None
+        self._unsaved = 0
+
+    def sync(self):
+        """Adds store rows the index hasn't seen yet (building it on first use)."""
+        matrix, live, ids = self.store.rows()
+        with self._lock:
+            if self._index is not None and self._index.ntotal > len(ids):
+                self._index = None  # store was reset underneath us
+            if self._index is None or self._outgrown(len(ids)):
+                if not len(ids):
+                    return matrix, live, ids
+                self._index = build_faiss_index(self.kind, np.asarray(matrix), self.nlist)
+            start = self._index.ntotal
+            if start < len(ids):
+                self._index.add(np.ascontiguousarray(matrix[start:], dtype=np.float32))
+                self._unsaved += len(ids) - start
+                if self._unsaved >= RAG_INDEX_SAVE_EVERY:
+                    self._save_locked()
+        return matrix, live, ids
+
+    def _outgrown(self, rows):
+        """True when an IVF index trained on a smaller corpus could use twice as many lists."""
+        nlist = getattr(self._index, "nlist", None)
+        return nlist is not None and nlist < self.nlist and min(self.nlist, rows // 39) >= 2 * nlist
+
+    def rebuild(self):
+        """Discards the index (e.g. to retrain IVF centroids after the corpus grew)."""
+        with self._lock:
+            self._index = None
+        self.sync()
+        self.save()
+
+    def save(self):
+        with self._lock:
+            if self._index is not None:
+                self._save_locked()
+
+    def _save_locked(self):
+        # Per-process name: another worker may be retraining and saving at the same time.
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            faiss.write_index(self._index, tmp_path)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._unsaved = 0
+
+    def search(self, query, k=3):
+        _, live, ids = self.sync()
+        live_count = int(live.sum())
+        k = min(k, live_count)
+        if k <= 0:
+            return []
+        dead = len(ids) - live_count
+        fetch = min(len(ids), k + min(dead, 4 * k))
+        nprobe = self.nprobe
+        query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        while True:
+            with self._lock:
+                set_search_params(self._index, nprobe, self.ef_search)
+                scores, rows = self._index.search(query, fetch)
+                nlist = getattr(self._index, "nlist", None)
+            results = [
+                (ids[row], float(score)) for score, row in zip(scores[0], rows[0]) if row >= 0 and live[row]
+            ][:k]
+            if len(results) == k:
+                return results
+            # Too many hits were superseded rows: widen the search until k live
+            # rows are found or every row (and, for IVF, every list) was searched.
+            if nlist is not None and (rows[0] < 0).any() and nprobe < nlist:
+                nprobe = min(nlist, max(1, nprobe) * 2)
+            elif fetch < len(ids):
+                fetch = min(len(ids), fetch * 2)
+            else:
+                return results
+
+
+def open_search_index(store, backend=RAG_INDEX_BACKEND):
+    """Returns an object with .search(query, k): the store itself for exact search."""
+    if backend == "exact":
+        return store
+    return FaissIndex(store, kind=backend)
+
+
+# -----------------------------------------------------
+# Recall vs latency report
+# -----------------------------------------------------
+
+def _synthetic_corpus(rows, dim, clusters=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, rows)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def _exact_topk(vectors, queries, k):
+    results = []
+    latencies = []
+    for q in queries:
+        started = time.perf_counter()
+        scores = vectors @ q
+        top = np.argpartition(-scores, k - 1)[:k]
+        latencies.append(time.perf_counter() - started)
+        results.append(set(top.tolist()))
+    latencies.sort()
+    return results, np.mean(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def _measure(index, queries, truth, k):
+    latencies = []
+    hits = 0
+    for q, expected in zip(queries, truth):
+        started = time.perf_counter()
+        _, rows = index.search(q.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - started)
+        hits += len(expected & set(rows[0].tolist()))
+    latencies.sort()
+    return hits / (k * len(queries)), np.mean(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def recall_report(vectors, num_queries=200, k=10, nprobes=(1, 2, 4, 8, 16, 32, 64),
+                  ef_searches=(16, 32, 64, 128, 256), seed=1):
+    _require_faiss()
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.1 * rng.standard_normal((len(picks), vectors.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    k = min(k, len(vectors))
+
+    truth, exact_mean, exact_p95 = _exact_topk(vectors, queries, k)
+    rows = [("exact", "-", 1.0, exact_mean, exact_p95, 0.0)]
+
+    for kind, values, param in (("ivf", nprobes, "nprobe"), ("hnsw", ef_searches, "efSearch")):
+        started = time.perf_counter()
+        index = build_faiss_index(kind, vectors)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - started
+        for value in values:
+            if kind == "ivf":
+                set_search_params(index, nprobe=value)
+            else:
+                set_search_params(index, ef_search=value)
+            recall, mean_latency, p95_latency = _measure(index, queries, truth, k)
+            rows.append((kind, f"{param}={value}", recall, mean_latency, p95_latency, build_seconds))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FAISS index tools for the RAG document store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    report = sub.add_parser("report", help="Recall vs latency against exact search")
+    report.add_argument("--store", help="VectorStore path (defaults to a synthetic corpus)")
+    report.add_argument("--rows", type=int, default=20000, help="Synthetic corpus size")
+    report.add_argument("--dim", type=int, default=256)
+    report.add_argument("--queries", type=int, default=200)
+    report.add_argument("--k", type=int, default=10)
+
+    build = sub.add_parser("build", help="(Re)build and save an index for a store")
+    build.add_argument("--store", required=True)
+    build.add_argument("--kind", choices=["ivf", "hnsw"], default="hnsw")
+
+    args = parser.parse_args(argv)
+    from .vector_store import VectorStore
+
+    if args.command == "build":
+        index = FaissIndex(VectorStore(args.store), kind=args.kind)
+        started = time.perf_counter()
+        index.rebuild()
+        print(f"Saved {args.kind} index to {index.path} in {time.perf_counter() - started:.2f}s")
+        return
+
+    if args.store:
+        matrix, live, _ = VectorStore(args.store).rows()
+        vectors = np.asarray(matrix)[live]
+    else:
+        vectors = _synthetic_corpus(args.rows, args.dim)
+    print(f"{len(vectors)} vectors, {args.queries} queries, recall@{args.k}\n")
+    print(f"{'index':<8}{'setting':<14}{'recall':>8}{'mean ms':>10}{'p95 ms':>10}{'build s':>10}")
+    for kind, setting, recall, mean_latency, p95_latency, build_seconds in recall_report(
+            vectors, args.queries, args.k):
+        print(f"{kind:<8}{setting:<14}{recall:>8.3f}{mean_latency * 1000:>10.3f}"
+              f"{p95_latency * 1000:>10.3f}{build_seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from groq import AsyncGroq
+from .admission import PRIORITY_HEALTH
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+
+def request_key(model, messages, kwargs):
+    """Stable fingerprint of a completion request, used to coalesce duplicates."""
+    payload = json.dumps([model, messages, kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class AsyncLlamaClient:
+    """
+    AsyncGroq client running on a dedicated event-loop thread.
+
+    - Identical in-flight requests are coalesced ("single flight"): the first
+      caller makes the upstream call and every duplicate awaits its result.
+    - Only that first caller goes through `admission` (see admission.py), at its
+      own priority. Admission's in-flight limit is the only bound on upstream
+      calls; duplicates take neither a slot nor a rate token.
+
+    Sync code (Flask views on gthread workers) calls complete_sync(), which
+    parks the request thread on a future instead of holding an HTTP connection
+    of its own; async views await complete_async().
+    """
+
+    def __init__(self, admission=None, **client_kwargs):
+        self.admission = admission
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+        self._client_kwargs = client_kwargs
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+        self._client = None
+        self._inflight = {}
+
+    def _ensure_loop(self):
+        # Restart after fork: gunicorn workers must not share the parent's loop thread.
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True)
+                thread.start()
+                self._loop = loop
+                self._pid = os.getpid()
+                self._client = None
+                self._inflight = {}
+            return self._loop
+
+    async def _complete(self, model, messages, priority, **kwargs):
+        # Always runs on the client's own loop thread.
+        if self._client is None:
+            self._client = AsyncGroq(**self._client_kwargs)
+
+        key = request_key(model, messages, kwargs)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced_calls += 1
+            return await asyncio.shield(pending)
+
+        pending = asyncio.get_running_loop().create_future()
+        self._inflight[key] = pending
+        try:
+            if self.admission is not None:
+                await self._admit(priority)
+            try:
+                self.upstream_calls += 1
+                response = await self._client.chat.completions.create(
+                    model=model, messages=messages, **kwargs
+                )
+            finally:
+                if self.admission is not None:
+                    self.admission.release()
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Mark retrieved so an un-awaited failure doesn't log a warning.
+            pending.exception()
+            raise
+        else:
+            pending.set_result(response)
+            return response
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _admit(self, priority):
+        # acquire() blocks on a condition variable, so it waits off the loop thread.
+        acquired = asyncio.ensure_future(asyncio.to_thread(self.admission.acquire, priority))
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # The thread keeps waiting; give the slot back if it gets one.
+            acquired.add_done_callback(
+                lambda f: f.cancelled() or f.exception() is not None or self.admission.release()
+            )
+            raise
+
+    def complete_sync(self, model, messages, priority=PRIORITY_HEALTH, timeout=LLM_TIMEOUT, **kwargs):
+        """
+        Coalesced, admission-controlled chat completion. Returns the raw response;
+        raises Overloaded if the leading request was shed.
+        """
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._complete(model, messages, priority, **kwargs), loop)
+        return future.result(timeout)
+
+    async def complete_async(self, model, messages, priority=PRIORITY_HEALTH, timeout=LLM_TIMEOUT, **kwargs):
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._complete(model, messages, priority, **kwargs), loop)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    def stats(self):
+        return {
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.upstream_calls,
+            "coalesced_calls": self.coalesced_calls,
+        }
@@ -0,0 +1,315 @@
+import re
+import math
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# add() compacts the postings once retired documents outnumber live ones (and
+# there are at least this many).
+BM25_COMPACT_MIN_DEAD = 1000
+# Query terms found in more than this share of documents (idf below ~1.4) are
+# skipped when the query also has rarer terms, so common words don't cost a full
+# postings scan. Only applied from BM25_PRUNE_MIN_DOCS documents.
+BM25_MAX_DF_RATIO = 0.25
+BM25_PRUNE_MIN_DOCS = 1000
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "is",
+    "are", "be", "it", "this", "that", "at", "as", "by", "my", "what", "do", "i",
+}
+
+
+def tokenize(text):
+    return [t for t in re.findall(r"[a-z0-9]+", (text or "").lower()) if t not in _STOPWORDS]
+
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_postings(blob):
+    """Decodes (doc_num delta, term frequency) varint pairs into absolute (doc_num, tf)."""
+    postings = []
+    doc_num = 0
+    value = shift = 0
+    pending_delta = None
+    for byte in blob:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if pending_delta is None:
+            pending_delta = value
+        else:
+            doc_num += pending_delta
+            postings.append((doc_num, value))
+            pending_delta = None
+        value = shift = 0
+    return postings
+
+
+def decode_postings_array(blob):
+    """decode_postings as two int64 arrays (doc_nums, tfs), vectorized."""
+    data = np.frombuffer(blob, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shifts = 7 * (np.arange(len(data)) - np.repeat(starts, ends - starts + 1))
+    values = np.add.reduceat((data & 0x7F).astype(np.int64) << shifts, starts)
+    return np.cumsum(values[0::2]), values[1::2]
+
+
+class BM25Index:
+    """
+    Persistent inverted index with BM25 scoring, stored in `<path>.bm25.sqlite`.
+
+    Each term's postings list is a delta + varint encoded blob of
+    (doc_num, term frequency) pairs. Documents get increasing doc numbers, so
+    inserting only ever appends to the end of a postings list. Re-adding a
+    document id retires its old doc number (and takes it out of its terms'
+    document frequencies) instead of rewriting postings; compact() drops
+    retired documents from the postings once they pile up.
+    """
+
+    def __init__(self, path):
+        self.path = path + ".bm25.sqlite"
+        self._lock = threading.Lock()
+        self._seen_generation = -1
+        self._docs = {}  # doc_num -> (doc_id, length)
+        self._live_by_id = {}  # doc_id -> doc_num
+        self._lengths = np.zeros(0, dtype=np.float64)  # by doc_num; 0 for retired or unknown
+        self._total_length = 0
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS bm25_docs (
+                    doc_num INTEGER PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    length INTEGER NOT NULL,
+                    live INTEGER NOT NULL DEFAULT 1,
+                    generation INTEGER NOT NULL,
+                    terms TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS bm25_docs_doc_id ON bm25_docs (doc_id);
+                CREATE INDEX IF NOT EXISTS bm25_docs_generation ON bm25_docs (generation);
+                CREATE TABLE IF NOT EXISTS bm25_terms (
+                    term TEXT PRIMARY KEY,
+                    df INTEGER NOT NULL,
+                    last_doc INTEGER NOT NULL,
+                    postings BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS bm25_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+                INSERT OR IGNORE INTO bm25_meta (key, value) VALUES ('generation', 0);
+                INSERT OR IGNORE INTO bm25_meta (key, value) VALUES ('compacted', 0);
+                INSERT OR IGNORE INTO bm25_meta (key, value) VALUES ('dead', 0);
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, documents):
+        """Indexes an iterable of (doc_id, text) in one transaction; a repeated doc_id keeps its last text."""
+        documents = list(dict(documents).items())
+        if not documents:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            generation = self._meta(conn, "generation") + 1
+            conn.execute("UPDATE bm25_meta SET value = ? WHERE key = 'generation'", (generation,))
+            next_doc = conn.execute("SELECT COALESCE(MAX(doc_num), 0) + 1 FROM bm25_docs").fetchone()[0]
+
+            additions = {}  # term -> [(doc_num, tf)]
+            doc_rows = []
+            for doc_id, text in documents:
+                counts = {}
+                tokens = tokenize(text)
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                doc_rows.append((next_doc, doc_id, len(tokens), generation, " ".join(counts)))
+                for term, tf in counts.items():
+                    additions.setdefault(term, []).append((next_doc, tf))
+                next_doc += 1
+
+            removals = {}  # term -> number of retired documents containing it
+            retired = 0
+            ids = [doc_id for doc_id, _ in documents]
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for (terms,) in conn.execute(
+                        f"SELECT terms FROM bm25_docs WHERE live = 1 AND doc_id IN ({placeholders})", part):
+                    retired += 1
+                    for term in terms.split():
+                        removals[term] = removals.get(term, 0) + 1
+                conn.execute(
+                    f"UPDATE bm25_docs SET live = 0, generation = ? WHERE live = 1 AND doc_id IN ({placeholders})",
+                    [generation, *part]
+                )
+            conn.executemany(
+                "INSERT INTO bm25_docs (doc_num, doc_id, length, generation, terms) VALUES (?, ?, ?, ?, ?)", doc_rows
+            )
+            conn.executemany(
+                "UPDATE bm25_terms SET df = df - ? WHERE term = ?",
+                [(count, term) for term, count in removals.items() if term not in additions]
+            )
+
+            terms = list(additions)
+            existing = {}
+            for start in range(0, len(terms), 500):
+                part = terms[start:start + 500]
+                existing.update(
+                    (term, (df, last_doc, blob)) for term, df, last_doc, blob in conn.execute(
+                        f"SELECT term, df, last_doc, postings FROM bm25_terms WHERE term IN ({','.join('?' * len(part))})",
+                        part
+                    )
+                )
+            updates = []
+            for term, postings in additions.items():
+                df, last_doc, blob = existing.get(term, (0, 0, b""))
+                out = bytearray(blob)
+                for doc_num, tf in postings:
+                    encode_varint(doc_num - last_doc, out)
+                    encode_varint(tf, out)
+                    last_doc = doc_num
+                updates.append((term, df + len(postings) - removals.get(term, 0), last_doc, bytes(out)))
+            conn.executemany(
+                "INSERT OR REPLACE INTO bm25_terms (term, df, last_doc, postings) VALUES (?, ?, ?, ?)", updates
+            )
+
+            dead = self._meta(conn, "dead") + retired
+            conn.execute("UPDATE bm25_meta SET value = ? WHERE key = 'dead'", (dead,))
+            needs_compaction = dead >= BM25_COMPACT_MIN_DEAD and dead > conn.execute(
+                "SELECT COUNT(*) FROM bm25_docs WHERE live = 1").fetchone()[0]
+        if needs_compaction:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrites every postings list without retired documents, recounts document
+        frequencies from what is left and deletes the retired rows.
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            live = {doc_num for (doc_num,) in conn.execute("SELECT doc_num FROM bm25_docs WHERE live = 1")}
+            updates, empty = [], []
+            for term, blob in conn.execute("SELECT term, postings FROM bm25_terms").fetchall():
+                out = bytearray()
+                df = last_doc = 0
+                for doc_num, tf in decode_postings(blob):
+                    if doc_num in live:
+                        encode_varint(doc_num - last_doc, out)
+                        encode_varint(tf, out)
+                        last_doc = doc_num
+                        df += 1
+                if df:
+                    updates.append((df, last_doc, bytes(out), term))
+                else:
+                    empty.append((term,))
+            conn.executemany("UPDATE bm25_terms SET df = ?, last_doc = ?, postings = ? WHERE term = ?", updates)
+            conn.executemany("DELETE FROM bm25_terms WHERE term = ?", empty)
+            conn.execute("DELETE FROM bm25_docs WHERE live = 0")
+            generation = self._meta(conn, "generation") + 1
+            # Readers that saw an older generation reload everything (the retired rows are gone).
+            conn.executemany("UPDATE bm25_meta SET value = ? WHERE key = ?",
+                             [(generation, "generation"), (generation, "compacted"), (0, "dead")])
+
+    @staticmethod
+    def _meta(conn, key):
+        return conn.execute("SELECT value FROM bm25_meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _refresh(self, conn):
+        generation = self._meta(conn, "generation")
+        if generation == self._seen_generation:
+            return
+        if self._meta(conn, "compacted") > self._seen_generation:
+            self._docs, self._live_by_id, self._total_length = {}, {}, 0
+            self._lengths = np.zeros(0, dtype=np.float64)
+            self._seen_generation = -1
+        rows = conn.execute(
+            "SELECT doc_num, doc_id, length, live FROM bm25_docs WHERE generation > ?",
+            (self._seen_generation,)).fetchall()
+        top = max((row[0] for row in rows), default=0)
+        if top >= len(self._lengths):
+            lengths = np.zeros(max(top + 1, 2 * len(self._lengths)), dtype=np.float64)
+            lengths[:len(self._lengths)] = self._lengths
+            self._lengths = lengths
+        for doc_num, doc_id, length, live in rows:
+            if live:
+                self._docs[doc_num] = (doc_id, length)
+                self._live_by_id[doc_id] = doc_num
+                self._lengths[doc_num] = length
+                self._total_length += length
+            elif doc_num in self._docs:
+                _, old_length = self._docs.pop(doc_num)
+                self._lengths[doc_num] = 0
+                self._total_length -= old_length
+                if self._live_by_id.get(doc_id) == doc_num:
+                    del self._live_by_id[doc_id]
+        self._seen_generation = generation
+
+    def search(self, query, k=10):
+        """Top-k (doc_id, BM25 score) pairs for the query terms."""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        # Scored under the lock: _refresh mutates the doc map and lengths in place.
+        with self._lock, self._connect() as conn:
+            self._refresh(conn)
+            rows = conn.execute(
+                f"SELECT df, postings FROM bm25_terms WHERE term IN ({','.join('?' * len(terms))})", terms
+            ).fetchall()
+            docs, lengths = self._docs, self._lengths
+            total_docs = len(docs)
+            if not rows or not total_docs or k <= 0:
+                return []
+            avg_length = self._total_length / total_docs or 1.0
+
+            # Common terms only matter when nothing rarer matched.
+            rare = [row for row in rows if row[0] <= BM25_MAX_DF_RATIO * total_docs]
+            if total_docs >= BM25_PRUNE_MIN_DOCS and rare:
+                rows = rare
+
+            scores = np.zeros(len(lengths), dtype=np.float64)
+            norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avg_length)
+            for df, blob in rows:
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                doc_nums, tfs = decode_postings_array(blob)
+                # Rows committed after _refresh are not in `lengths` yet; retired ones have length 0.
+                keep = doc_nums < len(lengths)
+                doc_nums, tfs = doc_nums[keep], tfs[keep]
+                keep = lengths[doc_nums] > 0
+                doc_nums, tfs = doc_nums[keep], tfs[keep]
+                scores[doc_nums] += idf * tfs * (BM25_K1 + 1) / (tfs + norms[doc_nums])
+            hits = np.flatnonzero(scores)
+            if len(hits) > k:
+                hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+            return [(docs[int(doc_num)][0], float(scores[doc_num])) for doc_num in hits]
+
+    def __len__(self):
+        with self._lock, self._connect() as conn:
+            self._refresh(conn)
+            return len(self._docs)
+
+
+def reciprocal_rank_fusion(*rankings, k=60):
+    """Fuses ranked lists of (doc_id, score) into [(doc_id, fused score)], best first."""
+    fused = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
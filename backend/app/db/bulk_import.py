@@ -0,0 +1,354 @@
+"""
+Streaming bulk import of parents, teachers and children from CSV or XLSX.
+
+    python -m app.db.bulk_import parents parents.csv --db database.db
+    python -m app.db.bulk_import children children.xlsx --rejects rejected.csv
+
+Rows are read one at a time, validated and normalized, and written in
+chunks with executemany, one transaction per chunk. A child's parent is
+resolved from its parent id number or parent email against an in-memory
+lookup of the Parents table. Rejected rows are written to a CSV report
+with the reason. Import parents before their children.
+"""
+import os
+import re
+import csv
+import sys
+import time
+import argparse
+from datetime import datetime, date
+
+try:
+    from .connection import get_connection, unit_of_work
+    from .crud import Children, Parent, Teacher
+except ImportError:  # run as a script from app/db
+    from connection import get_connection, unit_of_work
+    from crud import Children, Parent, Teacher
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%Y/%m/%d", "%d-%m-%Y", "%d %B %Y", "%d %b %Y")
+
+# Accepted spellings of each column, after lower-casing and turning spaces/dashes into underscores.
+COLUMNS = {
+    "parents": {
+        "id_number": ("parent_id_number", "id_number", "id"),
+        "first_name": ("first_name", "name"),
+        "surname": ("surname", "last_name"),
+        "phone": ("phone_number", "phone", "cell", "cellphone"),
+        "email": ("email", "email_address"),
+    },
+    "teachers": {
+        "id_number": ("teacher_id_number", "id_number", "id"),
+        "first_name": ("first_name", "name"),
+        "surname": ("surname", "last_name"),
+        "email": ("email", "email_address"),
+    },
+    "children": {
+        "id_number": ("child_id_number", "id_number", "id"),
+        "first_name": ("first_name", "name"),
+        "surname": ("surname", "last_name"),
+        "date_of_birth": ("date_of_birth", "dob", "birth_date"),
+        "school": ("school",),
+        "grade": ("grade",),
+        "class": ("class", "class_name"),
+        "parent_id_number": ("parent_id_number", "parent_id"),
+        "parent_email": ("parent_email",),
+    },
+}
+REQUIRED = {
+    "parents": ("id_number", "first_name", "surname"),
+    "teachers": ("id_number", "first_name", "surname"),
+    "children": ("id_number", "first_name", "surname"),
+}
+ID_TABLES = {
+    "parents": ("Parents", "Parent_id_number"),
+    "teachers": ("Teachers", "Teacher_id_number"),
+    "children": ("Children", "Child_id_number"),
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def _header_key(name):
+    return re.sub(r"[\s\-]+", "_", str(name or "").strip().lower())
+
+
+def iter_rows(path):
+    """Yields (line_number, {header: value}) without loading the file into memory."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None) or ()
+            for number, values in enumerate(rows, start=2):
+                if values and any(v not in (None, "") for v in values):
+                    yield number, dict(zip(header, values))
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                if any((v or "").strip() for v in row.values() if isinstance(v, str)):
+                    yield reader.line_num, row
+
+
+def map_columns(kind, header):
+    """Maps canonical field -> column name present in the file."""
+    keys = {_header_key(h): h for h in header if h is not None}
+    mapping = {}
+    for field, aliases in COLUMNS[kind].items():
+        for alias in aliases:
+            if alias in keys:
+                mapping[field] = keys[alias]
+                break
+    missing = [f for f in REQUIRED[kind] if f not in mapping]
+    if kind == "children" and "parent_id_number" not in mapping and "parent_email" not in mapping:
+        missing.append("parent_id_number or parent_email")
+    if missing:
+        raise RowError(f"missing columns: {', '.join(missing)}")
+    return mapping
+
+
+# -----------------------------
+# Normalizing
+# -----------------------------
+def clean_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return " ".join(str(value).split())
+
+
+def clean_id(value, label="id number"):
+    text = clean_text(value).replace(" ", "")
+    if not text.isdigit():
+        raise RowError(f"invalid {label}: {clean_text(value)!r}")
+    return int(text)
+
+
+def clean_email(value, required=False):
+    email = clean_text(value).lower()
+    if not email:
+        if required:
+            raise RowError("missing email")
+        return None
+    if not EMAIL_RE.match(email):
+        raise RowError(f"invalid email: {email!r}")
+    return email
+
+
+def clean_phone(value):
+    digits = re.sub(r"\D", "", clean_text(value))
+    if not digits:
+        return None
+    if digits.startswith("27") and len(digits) == 11:
+        digits = "0" + digits[2:]
+    if not 9 <= len(digits) <= 10:
+        raise RowError(f"invalid phone number: {clean_text(value)!r}")
+    return digits
+
+
+def clean_date(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        parsed = value.date()
+    elif isinstance(value, date):
+        parsed = value
+    else:
+        text = clean_text(value)
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt).date()
+                break
+            except ValueError:
+                continue
+        else:
+            raise RowError(f"invalid date of birth: {text!r}")
+    if parsed > date.today():
+        raise RowError(f"date of birth in the future: {parsed.isoformat()}")
+    return parsed.isoformat()
+
+
+def _get(row, mapping, field):
+    column = mapping.get(field)
+    return row.get(column) if column is not None else None
+
+
+def _name(row, mapping, field):
+    value = clean_text(_get(row, mapping, field))
+    if not value:
+        raise RowError(f"missing {field.replace('_', ' ')}")
+    return value
+
+
+def normalize_row(kind, row, mapping, parents=None):
+    """Returns the crud.py insert tuple for one input row, or raises RowError."""
+    id_number = clean_id(_get(row, mapping, "id_number"))
+    first_name = _name(row, mapping, "first_name")
+    surname = _name(row, mapping, "surname")
+    if kind == "parents":
+        return (id_number, first_name, surname,
+                clean_phone(_get(row, mapping, "phone")), clean_email(_get(row, mapping, "email")))
+    if kind == "teachers":
+        return (id_number, first_name, surname, clean_email(_get(row, mapping, "email")))
+
+    parent_id = None
+    if clean_text(_get(row, mapping, "parent_id_number")):
+        parent_id = clean_id(_get(row, mapping, "parent_id_number"), "parent id number")
+        if parent_id not in parents.id_numbers:
+            raise RowError(f"unknown parent id number: {parent_id}")
+    else:
+        email = clean_email(_get(row, mapping, "parent_email"), required=True)
+        parent_id = parents.by_email.get(email)
+        if parent_id is None:
+            raise RowError(f"unknown parent email: {email}")
+    # Children.Parent_id holds the parent's id number (see view_data.get_children).
+    return (id_number, first_name, surname, clean_date(_get(row, mapping, "date_of_birth")),
+            clean_text(_get(row, mapping, "school")) or None,
+            clean_text(_get(row, mapping, "grade")) or None,
+            clean_text(_get(row, mapping, "class")).upper() or None,
+            parent_id)
+
+
+class ParentLookup:
+    """Parent id numbers and emails held in memory so children resolve without a query per row."""
+
+    def __init__(self, conn):
+        self.id_numbers = set()
+        self.by_email = {}
+        for id_number, email in conn.execute("SELECT Parent_id_number, Email FROM Parents"):
+            self.id_numbers.add(id_number)
+            if email:
+                self.by_email.setdefault(email.strip().lower(), id_number)
+
+
+# -----------------------------
+# Importing
+# -----------------------------
+class RejectReport:
+    """CSV of rejected rows: line number, reason and the original values."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._writer = None
+        self._fields = None
+
+    def add(self, line, reason, row):
+        if self.path is None:
+            return
+        if self._writer is None:
+            self._fields = [str(k) for k in row if k is not None]
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["line", "reason", *self._fields])
+        values = {str(k): v for k, v in row.items() if k is not None}
+        self._writer.writerow([line, reason, *(values.get(f, "") for f in self._fields)])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _write(kind, db_path, rows):
+    with unit_of_work(db_path):
+        if kind == "parents":
+            Parent(db_path).add_parent(rows)
+        elif kind == "teachers":
+            Teacher(db_path).add_teacher(rows)
+        else:
+            Children(db_path).add_child(rows)
+
+
+def import_file(kind, path, db_path="database.db", chunk_size=5000, rejects_path=None,
+                progress=None, progress_every=2.0):
+    """
+    Imports `path` into the `kind` table. Returns a summary dict.
+    Duplicate id numbers (already in the database or earlier in the file) are rejected.
+    """
+    if kind not in COLUMNS:
+        raise ValueError(f"unknown import kind: {kind}")
+    conn = get_connection(db_path)
+    table, id_column = ID_TABLES[kind]
+    existing = {row[0] for row in conn.execute(f"SELECT {id_column} FROM {table}")}
+    parents = ParentLookup(conn) if kind == "children" else None
+    report = RejectReport(rejects_path)
+    stats = {"read": 0, "imported": 0, "rejected": 0, "seconds": 0.0, "rows_per_sec": 0.0}
+    started = last_report = time.monotonic()
+    mapping = None
+    chunk = []
+    try:
+        for line, row in iter_rows(path):
+            stats["read"] += 1
+            if mapping is None:
+                mapping = map_columns(kind, row.keys())
+            try:
+                values = normalize_row(kind, row, mapping, parents)
+                if values[0] in existing:
+                    raise RowError(f"duplicate id number: {values[0]}")
+            except RowError as e:
+                stats["rejected"] += 1
+                report.add(line, str(e), row)
+                continue
+            existing.add(values[0])
+            chunk.append(values)
+            if len(chunk) >= chunk_size:
+                _write(kind, db_path, chunk)
+                stats["imported"] += len(chunk)
+                chunk = []
+            now = time.monotonic()
+            if progress and now - last_report >= progress_every:
+                stats["seconds"] = now - started
+                stats["rows_per_sec"] = stats["read"] / stats["seconds"]
+                progress(dict(stats))
+                last_report = now
+        if chunk:
+            _write(kind, db_path, chunk)
+            stats["imported"] += len(chunk)
+    finally:
+        report.close()
+
+    stats["seconds"] = time.monotonic() - started
+    stats["rows_per_sec"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def print_progress(stats):
+    print(f"  {stats['read']} rows read, {stats['imported']} imported, {stats['rejected']} rejected "
+          f"({stats['rows_per_sec']:.0f} rows/s)", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-import parents, teachers or children from CSV/XLSX")
+    parser.add_argument("kind", choices=sorted(COLUMNS))
+    parser.add_argument("file")
+    parser.add_argument("--db", default="database.db")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per transaction")
+    parser.add_argument("--rejects", default=None,
+                        help="Rejected-rows CSV (default: <file>.rejected.csv)")
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.file):
+        parser.error(f"{args.file} does not exist")
+    rejects = args.rejects or os.path.splitext(args.file)[0] + ".rejected.csv"
+    try:
+        stats = import_file(args.kind, args.file, args.db, args.chunk_size, rejects, progress=print_progress)
+    except RowError as e:
+        parser.error(str(e))
+    print(f"Imported {stats['imported']} of {stats['read']} {args.kind} rows in {stats['seconds']:.1f}s "
+          f"- {stats['rows_per_sec']:.0f} rows/s")
+    if stats["rejected"]:
+        print(f"{stats['rejected']} rows rejected, see {rejects}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Applied to every connection opened through this module (and to the
+# Flask-SQLAlchemy engine in a.py). WAL lets readers run alongside a writer,
+# synchronous=NORMAL is durable across app crashes in WAL mode and avoids an
+# fsync per commit, busy_timeout makes writers wait instead of failing with
+# "database is locked".
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", 10000),
+    ("mmap_size", 256 * 1024 * 1024),
+    ("cache_size", -64 * 1024),  # negative = KiB, so 64 MiB
+    ("temp_store", "MEMORY"),
+)
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+
+def apply_pragmas(conn):
+    cursor = conn.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def get_connection(db_path):
+    """
+    Pooled connection for the current thread: one per (thread, database file),
+    opened once with the performance pragmas and a prepared-statement cache.
+    """
+    pool = getattr(_local, "connections", None)
+    if pool is None:
+        pool = _local.connections = {}
+        _local.depth = {}
+    conn = pool.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30, cached_statements=STATEMENT_CACHE_SIZE)
+        apply_pragmas(conn)
+        pool[db_path] = conn
+    return conn
+
+
+@contextmanager
+def unit_of_work(db_path):
+    """
+    Groups every statement in the block into one transaction on the pooled
+    connection. Nested blocks join the outer one; the outermost block commits,
+    or rolls back if the block raised.
+    """
+    conn = get_connection(db_path)
+    depth = _local.depth
+    key = id(conn)
+    depth[key] = depth.get(key, 0) + 1
+    try:
+        yield conn
+    except BaseException:
+        depth[key] -= 1
+        if depth[key] == 0:
+            conn.rollback()
+        raise
+    else:
+        depth[key] -= 1
+        if depth[key] == 0:
+            conn.commit()
+
+
+def close_connections():
+    """Closes this thread's pooled connections (e.g. at worker shutdown)."""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+    _local.depth = {}
@@ -1,9 +1,14 @@
-import sqlite3
 import datetime
 
+try:
+    from .connection import get_connection, unit_of_work
+except ImportError:  # run as a script from app/db
+    from connection import get_connection, unit_of_work
+
 class view_data:
     def __init__(self, db_path="database.db"):
-        self.db = sqlite3.connect(db_path)
+        self.db_path = db_path
+        self.db = get_connection(db_path)
         self.cursor = self.db.cursor()
         
     def get_parents(self):
@@ -43,22 +48,23 @@ class view_data:
 
 class Children:
     def __init__(self, db_path="database.db"):
-         self.db = sqlite3.connect(db_path)
+         self.db_path = db_path
+         self.db = get_connection(db_path)
          self.cursor = self.db.cursor()
 
     # cant add child with no linked parent
     def add_child(self,children):
-        self.cursor.executemany("""
+        with unit_of_work(self.db_path) as db:
+            db.executemany("""
                             INSERT INTO Children(Child_id_number,First_name,Surname,
                             Date_of_birth,School,Grade,Class,Parent_id)
                             values(?,?,?,?,?,?,?,?)""",children)
-        self.db.commit()
         print(f"child added")
 
         
     def remove_child(self,child_id_number):
-        self.cursor.execute("DELETE FROM Children WHERE Child_id_number = ?",(child_id_number,))
-        self.db.commit()
+        with unit_of_work(self.db_path) as db:
+            db.execute("DELETE FROM Children WHERE Child_id_number = ?",(child_id_number,))
         print("child removed")
 
     def update_child_info(self):
@@ -66,20 +72,21 @@ class Children:
 
 class Teacher:
     def __init__(self, db_path="database.db"):
-        self.db = sqlite3.connect(db_path)
+        self.db_path = db_path
+        self.db = get_connection(db_path)
         self.cursor = self.db.cursor()
 
     def add_teacher(self,Teacher):
-        self.cursor.executemany("""
+        with unit_of_work(self.db_path) as db:
+            db.executemany("""
                             INSERT INTO Teachers(Teacher_id_number,First_name,
                             Surname,Email)
                             values(?,?,?,?)""",Teacher)
-        self.db.commit()
         print(f"teacher added")
         
     def remove_teacher(self,teacher_id_number):
-        self.cursor.execute("DELETE FROM Teachers WHERE Teacher_id_number = ?",(teacher_id_number,))
-        self.db.commit()
+        with unit_of_work(self.db_path) as db:
+            db.execute("DELETE FROM Teachers WHERE Teacher_id_number = ?",(teacher_id_number,))
         print("teacher removed")
 
     def update_teacher_info(self):
@@ -87,20 +94,21 @@ class Teacher:
 
 class Parent:
     def __init__(self, db_path="database.db"):
-        self.db = sqlite3.connect(db_path)
+        self.db_path = db_path
+        self.db = get_connection(db_path)
         self.cursor = self.db.cursor()
 
     def add_parent(self,Parent):
-        self.cursor.executemany("""
+        with unit_of_work(self.db_path) as db:
+            db.executemany("""
                             INSERT INTO Parents(Parent_id_number,First_name,Surname,
                             Phone_number,Email)
                             values(?,?,?,?,?)""",Parent)
-        self.db.commit()
         print(f"parent added")
         
     def remove_parent(self,parent_id_number):
-        self.cursor.execute("DELETE FROM Parents WHERE Parent_id_number = ?",(parent_id_number,))
-        self.db.commit()
+        with unit_of_work(self.db_path) as db:
+            db.execute("DELETE FROM Parents WHERE Parent_id_number = ?",(parent_id_number,))
         print("parent removed")
 
     def update_parent_info(self):
@@ -109,30 +117,32 @@ class Parent:
 
 class Bookings:
     def __init__(self, db_path="database.db"):
-        self.db = sqlite3.connect(db_path)
+        self.db_path = db_path
+        self.db = get_connection(db_path)
         self.cursor = self.db.cursor()
 
     def create_booking(self,child_id, booking_type_id, booking_date):
-        self.cursor.execute("""INSERT INTO Bookings (child_id, booking_type_id, booking_date)
-        values (?, ?, ?)""",(child_id, booking_type_id, booking_date))
-        self.db.commit()
+        with unit_of_work(self.db_path) as db:
+            db.execute("""INSERT INTO Bookings (child_id, booking_type_id, booking_date)
+            values (?, ?, ?)""",(child_id, booking_type_id, booking_date))
 
     def update_booking_status(self):
         ...
 
     def cancel_booking(self,child_id,booking_date):
-        self.cursor.execute("DELETE FROM Bookings WHERE Child_id = ?  and booking_date = ?",(child_id,booking_date))
-        self.db.commit()
+        with unit_of_work(self.db_path) as db:
+            db.execute("DELETE FROM Bookings WHERE Child_id = ?  and booking_date = ?",(child_id,booking_date))
         
 class Absence_log():
     def __init__(self, db_path="database.db"):
-        self.db = sqlite3.connect(db_path)
+        self.db_path = db_path
+        self.db = get_connection(db_path)
         self.cursor = self.db.cursor()
 
     def log_absence(self,child_id, absence_date, reason , logged_by):
-        self.cursor.execute("""INSERT INTO Absence_logs (child_id, absence_date, reason , logged_by)
-        values (?, ?, ?, ?)""",(child_id, absence_date, reason , logged_by))
-        self.db.commit()
+        with unit_of_work(self.db_path) as db:
+            db.execute("""INSERT INTO Absence_logs (child_id, absence_date, reason , logged_by)
+            values (?, ?, ?, ?)""",(child_id, absence_date, reason , logged_by))
 
     def view_absence_history(self,child_id = None):
         if child_id != None:
@@ -141,20 +151,20 @@ class Absence_log():
         else:
             self.cursor.execute("SELECT * FROM Absence_logs")
             rows = self.cursor.fetchall()
-        self.db.commit()
         print(rows)
         return rows
     
 
 class Booking_types:
     def __init__(self, db_path="database.db"):
-        self.db = sqlite3.connect(db_path)
+        self.db_path = db_path
+        self.db = get_connection(db_path)
         self.cursor = self.db.cursor()
 
     def add_booking_types(self,types):
-            self.cursor.executemany("""INSERT INTO Booking_types (Booking_type)
-            values (?)""",types)
-            self.db.commit()
+            with unit_of_work(self.db_path) as db:
+                db.executemany("""INSERT INTO Booking_types (Booking_type)
+                values (?)""",types)
 
 if __name__ == "__main__":
     ...
@@ -1,6 +1,8 @@
 import sqlite3
+from connection import apply_pragmas
 
 db = sqlite3.connect("database.db")
+apply_pragmas(db)  # WAL is persistent, so every later connection uses it too
 cursor = db.cursor()
 
 # children table
@@ -0,0 +1,270 @@
+"""
+Streaming exports of health records for partner clinics and mobile health teams.
+
+Rows are read with a server-side cursor in chunks of `chunk_size` (SQLAlchemy
+yield_per) and encoded as they arrive, so memory stays flat however many
+rows match. Date-range and school filters are part of the SQL query.
+
+    python -m app.export sick_logs --format csv --start 2026-01-01 --end 2026-03-31 > sick.csv
+    python -m app.export absences --format parquet --school WTC --out absences.parquet
+    python -m app.export bookings --format arrow --school-db app/db/database.db --out bookings.arrow
+
+Datasets:
+    sick_logs, vaccine_bookings, checkup_bookings, ambulance_bookings  (healthhub.db)
+    absences, bookings                                                 (app/db/database.db)
+
+Parquet and Arrow output need pyarrow (pip install pyarrow).
+"""
+import io
+import os
+import csv
+import sys
+import argparse
+from sqlalchemy import create_engine, text
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+
+class ExportError(ValueError):
+    """Unknown dataset or format, or a filter the dataset does not support."""
+
+
+class Dataset:
+    def __init__(self, source, sql, columns, date_column=None, school_column=None, order_by=None):
+        self.source = source              # "health" (healthhub.db) or "school" (crud database.db)
+        self.sql = sql
+        self.columns = columns            # [(name, "int" | "str")], in SELECT order
+        self.date_column = date_column
+        self.school_column = school_column
+        self.order_by = order_by
+
+    def query(self, start=None, end=None, school=None):
+        """SQL text and parameters with the filters pushed into the WHERE clause."""
+        where, params = [], {}
+        if (start or end) and not self.date_column:
+            raise ExportError("this dataset has no date to filter on")
+        if school and not self.school_column:
+            raise ExportError("this dataset has no school to filter on")
+        if start:
+            where.append(f"{self.date_column} >= :start")
+            params["start"] = start
+        if end:
+            where.append(f"{self.date_column} <= :end")
+            params["end"] = end
+        if school:
+            where.append(f"{self.school_column} = :school COLLATE NOCASE")
+            params["school"] = school
+        sql = self.sql
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if self.order_by:
+            sql += f" ORDER BY {self.order_by}"
+        return sql, params
+
+
+DATASETS = {
+    "sick_logs": Dataset(
+        "health",
+        "SELECT id, child_name, grade, symptoms, description, date FROM sick_log",
+        [("id", "int"), ("child_name", "str"), ("grade", "str"), ("symptoms", "str"),
+         ("description", "str"), ("date", "str")],
+        date_column="date", order_by="id",
+    ),
+    "vaccine_bookings": Dataset(
+        "health",
+        "SELECT id, child_name, vaccine_type, date, reference FROM vaccine_booking",
+        [("id", "int"), ("child_name", "str"), ("vaccine_type", "str"), ("date", "str"), ("reference", "str")],
+        date_column="date", order_by="id",
+    ),
+    "checkup_bookings": Dataset(
+        "health",
+        "SELECT id, child_name, parent_email, check_type, date, reference_number FROM checkup_booking",
+        [("id", "int"), ("child_name", "str"), ("parent_email", "str"), ("check_type", "str"),
+         ("date", "str"), ("reference_number", "str")],
+        date_column="date", order_by="id",
+    ),
+    "ambulance_bookings": Dataset(
+        "health",
+        "SELECT id, child_name, class_name, emergency_type, description, reference_number FROM ambulance_booking",
+        [("id", "int"), ("child_name", "str"), ("class_name", "str"), ("emergency_type", "str"),
+         ("description", "str"), ("reference_number", "str")],
+        order_by="id",
+    ),
+    "absences": Dataset(
+        "school",
+        "SELECT a.Absence_id, c.Child_id_number, c.First_name, c.Surname, c.School, c.Grade, c.Class, "
+        "a.Absence_date, a.Reason, a.Logged_by "
+        "FROM Absence_logs a JOIN Children c ON c.Child_id = a.Child_id",
+        [("absence_id", "int"), ("child_id_number", "int"), ("first_name", "str"), ("surname", "str"),
+         ("school", "str"), ("grade", "str"), ("class", "str"), ("absence_date", "str"),
+         ("reason", "str"), ("logged_by", "str")],
+        date_column="a.Absence_date", school_column="c.School", order_by="a.Absence_id",
+    ),
+    "bookings": Dataset(
+        "school",
+        "SELECT b.Booking_id, c.Child_id_number, c.First_name, c.Surname, c.School, c.Grade, "
+        "t.Booking_type, b.Booking_date, b.status "
+        "FROM Bookings b JOIN Children c ON c.Child_id = b.Child_id "
+        "LEFT JOIN Booking_types t ON t.Booking_id = b.Booking_type_id",
+        [("booking_id", "int"), ("child_id_number", "int"), ("first_name", "str"), ("surname", "str"),
+         ("school", "str"), ("grade", "str"), ("booking_type", "str"), ("booking_date", "str"),
+         ("status", "str")],
+        date_column="b.Booking_date", school_column="c.School", order_by="b.Booking_id",
+    ),
+}
+
+
+def get_dataset(name):
+    dataset = DATASETS.get(name)
+    if dataset is None:
+        raise ExportError(f"unknown dataset {name!r}; choose from {', '.join(DATASETS)}")
+    return dataset
+
+
+def iter_chunks(engine, dataset, start=None, end=None, school=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields lists of row tuples, `chunk_size` at a time, from a server-side cursor."""
+    sql, params = dataset.query(start, end, school)
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(text(sql), params)
+        for partition in result.partitions(chunk_size):
+            yield [tuple(row) for row in partition]
+
+
+def encode_csv(dataset, chunks):
+    """CSV text, one piece per chunk, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in dataset.columns])
+    yield buffer.getvalue()
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def _arrow_schema(pa, dataset):
+    types = {"int": pa.int64(), "str": pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in dataset.columns])
+
+
+def _record_batch(pa, schema, rows):
+    columns = list(zip(*rows)) if rows else [() for _ in schema]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+    )
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain()."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def encode_arrow(dataset, chunks, fmt="parquet"):
+    """
+    Parquet (one row group per chunk) or an Arrow IPC stream (one record batch
+    per chunk), yielded as bytes as each chunk is written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa, dataset)
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        for rows in chunks:
+            writer.write_batch(_record_batch(pa, schema, rows))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export(engine, dataset_name, fmt="csv", start=None, end=None, school=None,
+           chunk_size=EXPORT_CHUNK_SIZE):
+    """Generator of encoded pieces (str for CSV, bytes otherwise). Validates before the first row is read."""
+    dataset = get_dataset(dataset_name)
+    if fmt not in FORMATS:
+        raise ExportError(f"unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+    dataset.query(start, end, school)  # raise filter errors now, not mid-stream
+    if fmt != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError(f"{fmt} export needs pyarrow (pip install pyarrow)")
+    chunks = iter_chunks(engine, dataset, start, end, school, chunk_size)
+    if fmt == "csv":
+        return encode_csv(dataset, chunks)
+    return encode_arrow(dataset, chunks, fmt)
+
+
+def sqlite_engine(path):
+    return create_engine(f"sqlite:///{path}", connect_args={"timeout": 30})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream health records to CSV, Parquet or Arrow")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--out", default=None, help="Output file (default: stdout)")
+    parser.add_argument("--start", default=None, help="First date included (YYYY-MM-DD)")
+    parser.add_argument("--end", default=None, help="Last date included (YYYY-MM-DD)")
+    parser.add_argument("--school", default=None, help="Only children of this school (absences, bookings)")
+    parser.add_argument("--health-db", default="healthhub.db")
+    parser.add_argument("--school-db", default=os.path.join("app", "db", "database.db"))
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    path = args.health_db if DATASETS[args.dataset].source == "health" else args.school_db
+    if not os.path.exists(path):
+        parser.error(f"{path} does not exist")
+    try:
+        pieces = export(sqlite_engine(path), args.dataset, args.format, args.start, args.end,
+                        args.school, args.chunk_size)
+    except ExportError as e:
+        parser.error(str(e))
+
+    if args.out:
+        out = open(args.out, "w", newline="", encoding="utf-8") if args.format == "csv" else open(args.out, "wb")
+    else:
+        out = sys.stdout if args.format == "csv" else sys.stdout.buffer
+    try:
+        for piece in pieces:
+            out.write(piece)
+    finally:
+        if args.out:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
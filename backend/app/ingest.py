@@ -0,0 +1,176 @@
+"""
+Bulk ingestion of PDF / text policy documents into the RAG document store.
+
+    python -m app.ingest docs/handbooks --db vector_store.db --workers 4
+
+Each file is read page by page, split into overlapping word chunks and
+embedded in one task on a process pool, so PDF text extraction (the slow
+part) runs in parallel across files. Finished files are written in batches
+of about `batch_size` chunks: BM25 postings first, then vectors and text in
+one vector-store transaction, which is when the batch becomes readable. A
+failed or interrupted run leaves only whole batches behind, and a file that
+cannot be read is reported in the summary instead of stopping the run.
+"""
+import os
+import sys
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .vector_store import VectorStore, hash_embed
+from .bm25_index import BM25Index
+from .retrieval import RAG_DB_PATH
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".md")
+
+
+def iter_files(directory):
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+def iter_pages(path):
+    """Yields (page_number, text). Text files are split into pages on form feeds."""
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        for number, page in enumerate(reader.pages, start=1):
+            yield number, page.extract_text() or ""
+    else:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            page, number = [], 1
+            for line in f:
+                *finished, rest = line.split("\f")
+                for piece in finished:
+                    page.append(piece)
+                    yield number, "".join(page)
+                    page, number = [], number + 1
+                page.append(rest)
+            yield number, "".join(page)
+
+
+def chunk_text(text, chunk_words=200, overlap=40):
+    """Splits text into windows of chunk_words words, consecutive windows sharing `overlap` words."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+def file_chunks(path, directory, chunk_words=200, overlap=40):
+    """(pages, [(doc_id, content, tags)]) for one file. Ids are stable, so re-ingesting a file replaces its chunks."""
+    source = os.path.relpath(path, directory)
+    pages, chunks = 0, []
+    for page, text in iter_pages(path):
+        pages += 1
+        for index, chunk in enumerate(chunk_text(text, chunk_words, overlap)):
+            doc_id = hashlib.sha1(f"{source}:{page}:{index}".encode()).hexdigest()
+            chunks.append((doc_id, chunk, {"source": source, "page": page, "chunk": index}))
+    return pages, chunks
+
+
+def process_file(path, directory, chunk_words=200, overlap=40):
+    """Extract, chunk and embed one file; runs in a pool worker."""
+    pages, chunks = file_chunks(path, directory, chunk_words, overlap)
+    vectors = np.vstack([hash_embed(content) for _, content, _ in chunks]) if chunks else None
+    return pages, chunks, vectors
+
+
+def ingest_directory(directory, db_path, store=None, keyword_index=None, workers=None,
+                     chunk_words=200, overlap=40, batch_size=2000, progress=None, progress_every=2.0):
+    """
+    Ingests every supported file under `directory`. Returns a summary dict;
+    files that failed are listed under "errors" as {"file", "error"}.
+    `progress(stats)` is called at most every `progress_every` seconds.
+    """
+    store = store or VectorStore(db_path)
+    keyword_index = keyword_index or BM25Index(db_path)
+    stats = {"files": 0, "pages": 0, "chunks": 0, "errors": [], "seconds": 0.0, "chunks_per_sec": 0.0}
+    started = last_report = time.monotonic()
+    batch = []  # (chunks, vectors) per finished file
+    pending = []
+    workers = workers or os.cpu_count() or 1
+
+    def write_batch():
+        doc_ids = [doc_id for chunks, _ in batch for doc_id, _, _ in chunks]
+        if doc_ids:
+            keyword_index.add((doc_id, content) for chunks, _ in batch for doc_id, content, _ in chunks)
+            store.add(doc_ids, np.vstack([vectors for _, vectors in batch]),
+                      [(content, tags) for chunks, _ in batch for _, content, tags in chunks])
+            stats["chunks"] += len(doc_ids)
+        batch.clear()
+
+    def collect(path, future):
+        try:
+            pages, chunks, file_vectors = future.result()
+        except Exception as e:
+            print(f"Ingest of {path} failed:", e, file=sys.stderr)
+            stats["errors"].append({"file": os.path.relpath(path, directory), "error": str(e)})
+            return
+        stats["files"] += 1
+        stats["pages"] += pages
+        if chunks:
+            batch.append((chunks, file_vectors))
+        if sum(len(chunks) for chunks, _ in batch) >= batch_size:
+            write_batch()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path in iter_files(directory):
+            pending.append((path, pool.submit(process_file, path, directory, chunk_words, overlap)))
+            # Keep a bounded number of files in flight so huge directories don't sit in memory twice.
+            while len(pending) > workers * 2:
+                collect(*pending.pop(0))
+            now = time.monotonic()
+            if progress and now - last_report >= progress_every:
+                stats["seconds"] = now - started
+                stats["chunks_per_sec"] = stats["chunks"] / stats["seconds"]
+                progress(dict(stats))
+                last_report = now
+        for path, future in pending:
+            collect(path, future)
+    write_batch()
+
+    stats["seconds"] = time.monotonic() - started
+    stats["chunks_per_sec"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def print_progress(stats):
+    print(f"  {stats['files']} files, {stats['pages']} pages, {stats['chunks']} chunks "
+          f"({stats['chunks_per_sec']:.0f} chunks/s)", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-ingest PDF and text documents into the RAG store")
+    parser.add_argument("directory")
+    parser.add_argument("--db", default=RAG_DB_PATH, help="Document store path (default: RAG_DB_PATH)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-words", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=2000, help="Chunks written per transaction")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+    stats = ingest_directory(
+        args.directory, args.db, workers=args.workers,
+        chunk_words=args.chunk_words, overlap=args.overlap, batch_size=args.batch_size, progress=print_progress,
+    )
+    print(f"Ingested {stats['chunks']} chunks from {stats['files']} files ({stats['pages']} pages) "
+          f"in {stats['seconds']:.1f}s - {stats['chunks_per_sec']:.0f} chunks/s")
+    for error in stats["errors"]:
+        print(f"  failed: {error['file']}: {error['error']}")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
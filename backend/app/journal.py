@@ -0,0 +1,191 @@
+import os
+import json
+import glob
+import hashlib
+import threading
+from datetime import datetime, date
+from .utils import file_lock
+
+
+class JsonlJournal:
+    """
+    Append-only JSON Lines journal shared by every worker process.
+
+    - One record per line, written with a single O_APPEND write under a
+      cross-process lock, so concurrent workers never lose or interleave records.
+    - Group commit: append(durable=True) returns once the record is fsynced.
+      Writers that arrive while an fsync is running are covered together by
+      the next one, so a burst of requests costs a handful of fsyncs.
+    - Rotation: the live file is renamed to `<name>-YYYYMMDD-HHMMSS-NNNN.jsonl` when it
+      exceeds max_bytes or was last written on an earlier day.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, rotate_daily=True):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self._stem = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+        self._fd = None
+        self._write_lock = threading.Lock()
+        self._sync = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+
+    # -----------------------------
+    # Writing
+    # -----------------------------
+    def _open(self):
+        """(Re)opens the live file if we have none or another process rotated it away."""
+        if self._fd is not None:
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self._fd).st_ino:
+                    return self._fd
+            except FileNotFoundError:
+                pass
+            self._fsync_and_close()
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _fsync_and_close(self):
+        # Records written to the old file must still be durable before we move on.
+        os.fsync(self._fd)
+        os.close(self._fd)
+        with self._sync:
+            self._synced = self._written
+            self._sync.notify_all()
+        self._fd = None
+
+    def _maybe_rotate(self, fd):
+        stat = os.fstat(fd)
+        if stat.st_size == 0:
+            return fd
+        last_written = datetime.fromtimestamp(stat.st_mtime)
+        too_big = stat.st_size >= self.max_bytes
+        stale = self.rotate_daily and last_written.date() != date.today()
+        if not (too_big or stale):
+            return fd
+        suffix = last_written.strftime("%Y%m%d-%H%M%S")
+        counter = 0
+        while os.path.exists(f"{self._stem}-{suffix}-{counter:04d}.jsonl"):
+            counter += 1
+        os.rename(self.path, f"{self._stem}-{suffix}-{counter:04d}.jsonl")
+        return self._open()
+
+    def append_many(self, records, durable=True):
+        lines = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+        if not lines:
+            return
+        with self._write_lock, file_lock(self.lock_path):
+            fd = self._maybe_rotate(self._open())
+            os.write(fd, lines.encode("utf-8"))
+            self._written += 1
+            ticket = self._written
+        if durable:
+            self._wait_durable(ticket)
+
+    def append(self, record, durable=True):
+        self.append_many([record], durable)
+
+    def _wait_durable(self, ticket):
+        with self._sync:
+            while self._synced < ticket:
+                if self._syncing:
+                    self._sync.wait()
+                    continue
+                # Become the leader: one fsync covers every write made so far.
+                self._syncing = True
+                target, fd = self._written, self._fd
+                self._sync.release()
+                try:
+                    if fd is not None:
+                        os.fsync(fd)
+                except OSError:
+                    pass  # fd was closed by a reopen, which fsynced it first
+                finally:
+                    self._sync.acquire()
+                    self._syncing = False
+                self._synced = max(self._synced, target)
+                self._sync.notify_all()
+
+    # -----------------------------
+    # Reading
+    # -----------------------------
+    def files(self):
+        """Rotated files oldest first, then the live file."""
+        rotated = sorted(glob.glob(glob.escape(self._stem) + "-*.jsonl"))
+        return rotated + ([self.path] if os.path.exists(self.path) else [])
+
+    def __iter__(self):
+        for path in self.files():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # torn final line after a crash
+
+    def recent(self, limit=20, block_size=64 * 1024):
+        """Last `limit` records (newest last), reading files backwards from the end."""
+        records = []
+        for path in reversed(self.files()):
+            with open(path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                position = f.tell()
+                buffer = b""
+                while position > 0 and len(records) < limit:
+                    step = min(block_size, position)
+                    position -= step
+                    f.seek(position)
+                    buffer = f.read(step) + buffer
+                    lines = buffer.split(b"\n")
+                    # The first line may continue in the previous block.
+                    buffer = lines.pop(0) if position > 0 else b""
+                    for line in reversed(lines):
+                        if line.strip():
+                            try:
+                                records.append(json.loads(line))
+                            except ValueError:
+                                continue
+                            if len(records) == limit:
+                                break
+            if len(records) >= limit:
+                break
+        return list(reversed(records[:limit]))
+
+
+def migrate_json_array(json_path, journal):
+    """
+    One-time import of a legacy JSON array file into the journal. The file itself
+    is left alone (it may be checked in); the sha256 of each imported file is
+    recorded in `<journal>.imported`, so importing the same contents again is a no-op.
+    Returns the number of records migrated.
+    """
+    marker_path = journal.path + ".imported"
+    with file_lock(journal.lock_path + ".migrate"):
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if os.path.exists(marker_path):
+            with open(marker_path, encoding="utf-8") as f:
+                if digest in f.read().split():
+                    return 0
+        try:
+            records = json.loads(raw.decode("utf-8"))
+        except ValueError as e:
+            # Leave the file alone rather than silently dropping its records.
+            print(f"Could not migrate {json_path}: {e}")
+            return 0
+        if not isinstance(records, list):
+            print(f"Could not migrate {json_path}: expected a JSON array")
+            return 0
+        journal.append_many(records)
+        with open(marker_path, "a", encoding="utf-8") as f:
+            f.write(f"{digest} {os.path.basename(json_path)}\n")
+        return len(records)
@@ -1,76 +1,492 @@
 import os
+import re
+import math
+import zlib
+import time
+import hashlib
+import threading
 from groq import Groq
 from dotenv import load_dotenv
+from .utils import TTLCache
+from .async_llm import AsyncLlamaClient
+from .admission import admission, Overloaded, PRIORITY_EMERGENCY, PRIORITY_HEALTH, PRIORITY_LOW
+from .rag_service import retrieve_context, corpus_version
+from .metrics import registry, LATENCY_BUCKETS
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Point at a Groq/OpenAI-compatible server instead of api.groq.com,
+# e.g. the local mock in loadtest/mock_groq.py (no real key needed then).
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
 
 if not GROQ_API_KEY:
-    raise Exception("API_KEY missing")
+    if not GROQ_BASE_URL:
+        raise Exception("API_KEY missing")
+    GROQ_API_KEY = "mock-key"
 
 client = Groq(
     api_key=GROQ_API_KEY,
+    base_url=GROQ_BASE_URL,
 )
 
+# Non-streaming completions go through the async client by default so that
+# identical in-flight prompts share one upstream call, and one admission slot
+# (set LLM_ASYNC=0 to disable).
+async_client = None
+if os.getenv("LLM_ASYNC", "1") != "0":
+    async_client = AsyncLlamaClient(admission, api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL)
 
-def call_llama(messages, model="llama-3.1-8b-instant", **kwargs):
+AI_UNAVAILABLE_MESSAGE = "Sorry, the AI service is temporarily unavailable."
+AI_BUSY_MESSAGE = "The assistant is busy right now, please try again shortly."
+SAFETY_DISCLAIMER = "If symptoms worsen or life is at risk, seek urgent medical care."
+
+SAFE_SYSTEM_PROMPT = """
+    You are a child-health guidance assistant.
+    You cater for the South African region.
+    You MUST NOT diagnose diseases.
+    If prompt not a symptom for an age specified child, channel the user.
+    Give short, simple, high-level steps parents can do at home.
+    Always include red-flag warnings.
+    ALWAYS end with: "If symptoms worsen or life is at risk, seek urgent medical care.
+    """
+
+
+# -----------------------------
+# Response Cache
+# -----------------------------
+# Answers are keyed on (normalized question, age bucket, category, prompt version).
+# The prompt version is a hash of the system prompt plus the RAG corpus version, so
+# editing SAFE_SYSTEM_PROMPT or adding school documents invalidates cached answers.
+# By default only the exact question is reused. LLM_CACHE_SIMILARITY > 0 opts in to
+# near-duplicate matching: a question whose keyword set overlaps a cached one at least
+# that much (Jaccard) reuses its answer, but only if both have exactly the same
+# negations and red-flag symptoms ("not vomiting" never matches "vomiting").
+# Candidates come from an inverted index over each entry's keyword prefix, so a miss
+# compares only entries that could reach the threshold.
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0"))
+
+_cache_lock = threading.Lock()  # guards _cached_prompt_version and the keyword index
+_keyword_index = {}             # (age bucket, category, version, guard words, keyword) -> set of cache keys
+_cached_keywords = {}           # cache key -> its keyword set
+_cached_prompt_version = None
+
+
+def _forget_similar(key):
+    with _cache_lock:
+        words = _cached_keywords.pop(key, None) or frozenset()
+        for word in _keyword_prefix(words):
+            index_key = key[1:] + (_guard_words(words), word)
+            bucket = _keyword_index.get(index_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del _keyword_index[index_key]
+
+
+response_cache = TTLCache(max_size=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, on_evict=_forget_similar)
+
+_STOPWORDS = {
+    "a", "an", "the", "my", "our", "is", "are", "am", "was", "be", "i", "we",
+    "what", "should", "do", "does", "can", "could", "would", "how", "to", "of",
+    "and", "or", "in", "on", "for", "with", "it", "this", "that", "has", "have",
+    "had", "please", "help", "me", "us", "about", "if", "so", "very", "just",
+}
+_SYNONYMS = {
+    "kid": "child", "kids": "child", "son": "child", "daughter": "child",
+    "baby": "child", "toddler": "child", "children": "child",
+    "temperature": "fever", "temp": "fever", "feverish": "fever",
+    "throwing": "vomit", "vomiting": "vomit", "puking": "vomit",
+    "tummy": "stomach", "belly": "stomach",
+}
+# Words that change what a safe answer is. "t" is what is left of "n't" after normalizing.
+_NEGATIONS = {
+    "no", "not", "never", "without", "none", "nor", "cannot", "t",
+    "isn", "aren", "wasn", "weren", "doesn", "don", "didn", "hasn", "haven", "won",
+}
+_RED_FLAG_PREFIXES = (
+    "vomit", "sleep", "drows", "unconscious", "unrespons", "seiz", "convuls", "chok",
+    "bleed", "blood", "breath", "blue", "limp", "faint", "stiff", "rash", "swallow",
+    "poison", "anaphyla", "dehydrat", "confus", "head",
+)
+
+
+def prompt_version(system_prompt=SAFE_SYSTEM_PROMPT):
+    return hashlib.sha256(system_prompt.encode()).hexdigest()[:12]
+
+
+def normalize_question(question):
+    """Lowercase, strip punctuation and collapse whitespace."""
+    return " ".join(re.findall(r"[a-z0-9]+", (question or "").lower()))
+
+
+def _keywords(normalized):
+    words = set()
+    for word in normalized.split():
+        word = _SYNONYMS.get(word, word)
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+
+def _guard_words(words):
+    """The negations and red-flag terms in a keyword set; near-duplicates must agree on these exactly."""
+    return frozenset(w for w in words if w in _NEGATIONS or w.startswith(_RED_FLAG_PREFIXES))
+
+
+def _keyword_prefix(words):
+    """
+    Prefix filtering: with every keyword set sorted in one fixed order, two sets
+    with Jaccard >= LLM_CACHE_SIMILARITY always share a keyword from their first
+    n - ceil(similarity * n) + 1 entries. Only those are indexed and probed.
+    """
+    ordered = sorted(words, key=lambda word: (zlib.crc32(word.encode()), word))
+    return ordered[:len(ordered) - math.ceil(LLM_CACHE_SIMILARITY * len(ordered) - 1e-9) + 1]
+
+
+def age_bucket(age):
+    """Map free-text ages ("3", "4 years", "18 months") onto coarse buckets."""
+    text = str(age or "").lower()
+    match = re.search(r"\d+(\.\d+)?", text)
+    if not match:
+        return "unknown"
+    years = float(match.group())
+    if "month" in text:
+        years /= 12
+    if years < 1:
+        return "infant"
+    if years < 3:
+        return "1-2"
+    if years < 6:
+        return "3-5"
+    if years < 13:
+        return "6-12"
+    return "13+"
+
+
+def _cache_key(question, age, category, version):
+    return (normalize_question(question), age_bucket(age), (category or "general").lower(), version)
+
+
+def _check_prompt_version(version):
+    global _cached_prompt_version
+    if version == _cached_prompt_version:
+        return
+    with _cache_lock:
+        if version != _cached_prompt_version:
+            response_cache.clear()
+            _keyword_index.clear()
+            _cached_keywords.clear()
+            _cached_prompt_version = version
+
+
+def _similar_key(key):
+    """The cached key in the same bucket whose keywords best match `key`'s, if close enough."""
+    wanted = _keywords(key[0])
+    if not wanted:
+        return None
+    low, high = LLM_CACHE_SIMILARITY * len(wanted), len(wanted) / LLM_CACHE_SIMILARITY
+    guard = _guard_words(wanted)
+    best_key, best_score = None, 0.0
+    with _cache_lock:
+        candidates = set()
+        for word in _keyword_prefix(wanted):
+            candidates.update(_keyword_index.get(key[1:] + (guard, word), ()))
+        candidates = [(k, _cached_keywords[k]) for k in candidates if k in _cached_keywords]
+    for cached_key, cached_words in candidates:
+        if not low <= len(cached_words) <= high:
+            continue  # sizes alone rule out the threshold
+        score = len(wanted & cached_words) / len(wanted | cached_words)
+        if score > best_score:
+            best_key, best_score = cached_key, score
+    return best_key if best_score >= LLM_CACHE_SIMILARITY else None
+
+
+def get_cached_answer(question, age, category, version):
+    _check_prompt_version(version)
+    key = _cache_key(question, age, category, version)
+    answer = response_cache.get(key, count=False)
+    if answer is None and LLM_CACHE_SIMILARITY > 0:
+        best_key = _similar_key(key)
+        if best_key is not None:
+            answer = response_cache.get(best_key, count=False)
+    response_cache.record(answer is not None)
+    return answer
+
+
+def store_cached_answer(question, age, category, version, answer):
+    if not answer or answer == AI_UNAVAILABLE_MESSAGE:
+        return
+    _check_prompt_version(version)
+    key = _cache_key(question, age, category, version)
+    response_cache.set(key, answer)
+    if LLM_CACHE_SIMILARITY > 0:
+        words = _keywords(key[0])
+        with _cache_lock:
+            if key[3] != _cached_prompt_version:
+                return  # the prompt changed meanwhile; the entry is unreachable anyway
+            _cached_keywords[key] = words
+            guard = _guard_words(words)
+            for word in _keyword_prefix(words):
+                _keyword_index.setdefault(key[1:] + (guard, word), set()).add(key)
+
+
+def cache_stats():
+    stats = response_cache.stats()
+    stats["prompt_version"] = _cached_prompt_version
+    return stats
+
+
+# Chatbot topics -> admission priority. Unknown topics count as general health questions.
+CATEGORY_PRIORITIES = {
+    "emergency": PRIORITY_EMERGENCY,
+    "ambulance": PRIORITY_EMERGENCY,
+    "health": PRIORITY_HEALTH,
+    "general": PRIORITY_HEALTH,
+    "behaviour": PRIORITY_LOW,
+    "child_support": PRIORITY_LOW,
+    "nutrition": PRIORITY_LOW,
+}
+# Questions that read like an emergency are treated as one whatever topic was picked.
+URGENT_RE = re.compile(
+    r"\b(not breathing|can'?t breathe|unconscious|unresponsive|seizure|convuls\w*|chok\w*|"
+    r"severe bleeding|bleeding heavily|anaphyla\w*|swallowed|poison\w*|blue lips)\b",
+    re.IGNORECASE
+)
+
+
+def question_priority(question, category):
+    if URGENT_RE.search(question or ""):
+        return PRIORITY_EMERGENCY
+    return CATEGORY_PRIORITIES.get((category or "").strip().lower(), PRIORITY_HEALTH)
+
+
+def admission_stats():
+    return admission.stats()
+
+
+LLM_LATENCY = registry.histogram(
+    "llm_request_duration_seconds", "Groq call latency, including admission wait.",
+    ("model", "outcome"), buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = registry.counter("llm_tokens_total", "Tokens reported by Groq usage.", ("model", "kind"))
+LLM_ERRORS = registry.counter("llm_errors_total", "Failed Groq calls by exception class.", ("model", "error"))
+
+
+def _record_llm(model, started, usage=None, error=None):
+    LLM_LATENCY.observe(time.perf_counter() - started, (model, "error" if error else "ok"))
+    if error is not None:
+        LLM_ERRORS.inc(labels=(model, type(error).__name__))
+    elif usage is not None:
+        LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, (model, "prompt"))
+        LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, (model, "completion"))
+
+
+def call_llama(messages, model="llama-3.1-8b-instant", priority=PRIORITY_HEALTH, **kwargs):
     """
     Handles raw chat completion calls to the Llama API.
     messages = [
         {"role": "system", "content": "..."},
         {"role": "system", "content": "..."}
     ]
+    Waits for admission at `priority` first; raises Overloaded if the request is shed.
+    With the async client only the first of several identical in-flight calls is
+    admitted; the others share its answer (or its Overloaded).
+    """
+    started = time.perf_counter()
+    try:
+        if async_client is not None:
+            return _complete(messages, model, started, priority, **kwargs)
+        with admission.admit(priority):
+            return _complete(messages, model, started, priority, **kwargs)
+    except Overloaded as e:
+        _record_llm(model, started, error=e)
+        raise
+
+
+def _complete(messages, model, started, priority, **kwargs):
+    try:
+        if async_client is not None:
+            response = async_client.complete_sync(
+                model=model,
+                messages=messages,
+                priority=priority,
+                temperature=0.6,
+                **kwargs
+            )
+        else:
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.6,
+                **kwargs
+            )
+        _record_llm(model, started, getattr(response, "usage", None))
+        return response.choices[0].message.content
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        print("API Error:", e)
+        _record_llm(model, started, error=e)
+        return AI_UNAVAILABLE_MESSAGE
+
+
+async def acall_llama(messages, model="llama-3.1-8b-instant", priority=PRIORITY_HEALTH, **kwargs):
+    """
+    Async variant of call_llama for async views and scripts.
     """
+    if async_client is None:
+        raise RuntimeError("Async LLM client is disabled (LLM_ASYNC=0)")
+    started = time.perf_counter()
     try:
-        response = client.chat.completions.create(
+        response = await async_client.complete_async(
             model=model,
             messages=messages,
+            priority=priority,
             temperature=0.6,
             **kwargs
         )
+        _record_llm(model, started, getattr(response, "usage", None))
         return response.choices[0].message.content
 
+    except Overloaded as e:
+        _record_llm(model, started, error=e)
+        raise
     except Exception as e:
         print("API Error:", e)
-        return "Sorry, the AI service is temporarily unavailable."
+        _record_llm(model, started, error=e)
+        return AI_UNAVAILABLE_MESSAGE
 
 
-def ask_health_assistant(question: str, age: str):
+def stream_llama(messages, model="llama-3.1-8b-instant", priority=PRIORITY_HEALTH, **kwargs):
     """
-    Safe child-health assistant wrapper.
-    Applies safety rules, disclaimers, and structured prompts.
+    Streaming variant of call_llama: yields content deltas as the model
+    produces them. Errors propagate so the caller can decide how to recover.
+    The admission slot is held until the stream ends.
     """
+    started = time.perf_counter()
+    usage = None
+    try:
+        with admission.admit(priority):
+            stream = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.6,
+                stream=True,
+                **kwargs
+            )
+            for chunk in stream:
+                # Groq reports usage on the last chunk, under x_groq.
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+    except Exception as e:
+        _record_llm(model, started, error=e)
+        raise
+    _record_llm(model, started, usage)
+
+
+def missing_disclaimer(answer):
+    """Returns the text to append so the answer ends with the safety disclaimer."""
+    if SAFETY_DISCLAIMER.lower().rstrip(".") in (answer or "").lower():
+        return ""
+    return "\n\n" + SAFETY_DISCLAIMER
+
+
+def _answer_version():
+    # Cached answers depend on both the system prompt and the school documents.
+    return f"{prompt_version(SAFE_SYSTEM_PROMPT)}-{corpus_version()}"
 
-    SAFE_SYSTEM_PROMPT = """
-    You are a child-health guidance assistant.
-    You cater for the South African region.
-    You MUST NOT diagnose diseases.
-    If prompt not a symptom for an age specified child, channel the user.
-    Give short, simple, high-level steps parents can do at home.
-    Always include red-flag warnings.
-    ALWAYS end with: "If symptoms worsen or life is at risk, seek urgent medical care.
-    """
+
+def _health_messages(question, age):
+    context = retrieve_context(question)
+    guidance = f"""
+    School guidance documents (use only if relevant):
+    {context}
+    """ if context else ""
 
     user_prompt = f"""
     Question: {question}
     Age range: {age}
-    
+    {guidance}
     Provide:
     1. Immediate safe steps parents can do at home.
     2. Red flags to watch for.
     3. When to call clinic or emergency services.
     """
 
-    messages = [
+    return [
         {"role": "system", "content": SAFE_SYSTEM_PROMPT},
         {"role": "user", "content": user_prompt}
     ]
 
-    return call_llama(messages)
+
+def ask_health_assistant(question: str, age: str, category: str = "General"):
+    """
+    Safe child-health assistant wrapper.
+    Applies safety rules, disclaimers, and structured prompts.
+    Answers are served from the response cache when possible.
+    Raises Overloaded when the request is shed by admission control.
+    """
+
+    version = _answer_version()
+    cached = get_cached_answer(question, age, category, version)
+    if cached is not None:
+        return cached
+
+    answer = call_llama(_health_messages(question, age), priority=question_priority(question, category))
+    if answer == AI_UNAVAILABLE_MESSAGE:
+        return answer
+    answer += missing_disclaimer(answer)
+    store_cached_answer(question, age, category, version, answer)
+    return answer
+
+
+def stream_health_assistant(question: str, age: str, category: str = "General"):
+    """
+    Streaming variant of ask_health_assistant.
+    Yields text chunks; the last chunk always completes the safety disclaimer.
+    """
+
+    version = _answer_version()
+    cached = get_cached_answer(question, age, category, version)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    try:
+        for delta in stream_llama(_health_messages(question, age), priority=question_priority(question, category)):
+            parts.append(delta)
+            yield delta
+    except Overloaded:
+        raise
+    except Exception as e:
+        print("API Error:", e)
+        if not parts:
+            yield AI_UNAVAILABLE_MESSAGE
+            return
+        # A partial answer is still shown, but it is not cached.
+        yield missing_disclaimer("".join(parts))
+        return
+
+    answer = "".join(parts)
+    tail = missing_disclaimer(answer)
+    if tail:
+        yield tail
+    store_cached_answer(question, age, category, version, answer + tail)
 
 
-def ask_emergency(question: str):
+def ask_emergency(question: str, age: str = "unknown"):
     """
     Returns structured JSON using function-calling pattern
     """
@@ -94,4 +510,4 @@ def ask_emergency(question: str):
             "role": "user", "content": f"Emergency for a {age}-year-old: {question}",
         }
     ]
-    return call_llama(messages)
+    return call_llama(messages, priority=PRIORITY_EMERGENCY)
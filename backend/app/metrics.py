@@ -0,0 +1,371 @@
+import os
+import glob
+import json
+import time
+import atexit
+import bisect
+import tempfile
+import threading
+from contextvars import ContextVar
+
+# Every process writes its samples to METRICS_DIR every METRICS_FLUSH_INTERVAL
+# seconds; /metrics merges the files so all gunicorn workers are counted. The
+# gunicorn master empties the directory on start (gunicorn.conf.py), or
+# counters from the previous run would be carried over.
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "kgodisong-metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Metric:
+    """
+    One metric family. Samples are keyed by a tuple of label values, so an
+    update is a dict lookup under a lock; no per-call objects are created.
+    """
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def samples(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, labels=()):
+        self.registry.ensure_writer()
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Summed over live processes only; the value of an exited worker is dropped."""
+    type = "gauge"
+
+    def inc(self, amount=1, labels=()):
+        self.registry.ensure_writer()
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+    def set(self, value, labels=()):
+        self.registry.ensure_writer()
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        self.registry.ensure_writer()
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, then +Inf, sum and count.
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+
+class Registry:
+    def __init__(self, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._writer_pid = None
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} is already registered as a {metric.type}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    # -----------------------------
+    # Per-process snapshots
+    # -----------------------------
+    def ensure_writer(self):
+        """Starts the snapshot thread once per process (again after a fork)."""
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            if self._writer_pid is not None:
+                # Forked from a process that already recorded samples: start from zero
+                # so the parent's values are not counted twice.
+                for metric in self._metrics.values():
+                    metric.reset()
+            self._writer_pid = os.getpid()
+            threading.Thread(target=self._write_loop, name="metrics-writer", daemon=True).start()
+
+    def _write_loop(self):
+        pid = os.getpid()
+        while self._writer_pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                print("Metrics snapshot error:", e)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def clear_directory(self):
+        """Removes every process's snapshot; run once when the server starts."""
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json*")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def write_snapshot(self):
+        pid = os.getpid()
+        snapshot = {
+            "pid": pid,
+            "metrics": {
+                name: {
+                    "type": metric.type,
+                    "help": metric.documentation,
+                    "labels": list(metric.labelnames),
+                    "buckets": list(getattr(metric, "buckets", ())),
+                    "samples": metric.samples(),
+                }
+                for name, metric in list(self._metrics.items())
+            },
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(pid)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+
+    def _snapshots(self):
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # being replaced or truncated; picked up on the next scrape
+            snapshot["alive"] = _pid_alive(snapshot.get("pid"))
+            snapshots.append(snapshot)
+        return snapshots
+
+    def collect(self):
+        """Samples merged across every process that has written a snapshot."""
+        if self._writer_pid == os.getpid():
+            self.write_snapshot()
+        merged = {}
+        for snapshot in self._snapshots():
+            for name, family in snapshot["metrics"].items():
+                if family["type"] == "gauge" and not snapshot["alive"]:
+                    continue
+                target = merged.setdefault(name, dict(family, samples={}))
+                if family["type"] == "histogram" and family["buckets"] != target["buckets"]:
+                    continue  # bucket layout changed between deploys
+                for labels, value in family["samples"]:
+                    key = tuple(labels)
+                    current = target["samples"].get(key)
+                    if current is None:
+                        target["samples"][key] = value
+                    elif isinstance(value, list):
+                        target["samples"][key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        target["samples"][key] = current + value
+        return merged
+
+    def exposition(self):
+        """The merged samples in the Prometheus text format (version 0.0.4)."""
+        lines = []
+        for name, family in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {_escape_help(family['help'])}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            labelnames = family["labels"]
+            for labels, value in sorted(family["samples"].items()):
+                pairs = list(zip(labelnames, labels))
+                if family["type"] != "histogram":
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(family["buckets"] + ["+Inf"], value[:-2]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(pairs + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(pairs)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(pairs)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid):
+    if not isinstance(pid, int):
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape_help(text):
+    return text.replace("\\", r"\\").replace("\n", r"\n")
+
+
+def _escape_label(value):
+    return str(value).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + "}"
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+
+@atexit.register
+def _final_snapshot():
+    if registry._writer_pid == os.getpid():
+        try:
+            registry.write_snapshot()
+        except OSError:
+            pass
+
+
+# -----------------------------
+# Instrumentation
+# -----------------------------
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Time spent in the Flask view, by route.",
+    ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "Requests currently being handled.", ("method", "route")
+)
+DB_QUERY_LATENCY = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time, by statement kind.",
+    ("statement",), buckets=QUERY_BUCKETS
+)
+DB_QUERIES_PER_REQUEST = registry.histogram(
+    "http_request_db_queries", "SQL statements executed while handling one request.",
+    ("route",), buckets=COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = registry.histogram(
+    "http_request_db_seconds", "Total SQL time spent while handling one request.",
+    ("route",), buckets=LATENCY_BUCKETS
+)
+
+# [queries, seconds] for the request being handled in this context, or None.
+_request_db = ContextVar("request_db", default=None)
+
+_STATEMENT_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "PRAGMA"}
+
+
+def _statement_kind(statement):
+    word = statement.lstrip()[:8].split(None, 1)
+    kind = word[0].upper() if word else ""
+    return kind if kind in _STATEMENT_KINDS else "OTHER"
+
+
+def instrument_app(app):
+    """Records per-route latency, in-flight requests and per-request SQL totals."""
+    from flask import g, request
+
+    def route_of():
+        return request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics = (time.perf_counter(), (request.method, route_of()), _request_db.set([0, 0.0]))
+        HTTP_IN_FLIGHT.inc(labels=g._metrics[1])
+
+    @app.after_request
+    def _metrics_record(response):
+        started = g.get("_metrics")
+        if started is not None:
+            method, route = started[1]
+            HTTP_LATENCY.observe(time.perf_counter() - started[0], (method, route, str(response.status_code)))
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        started = g.pop("_metrics", None)
+        if started is None:
+            return
+        HTTP_IN_FLIGHT.dec(labels=started[1])
+        queries, seconds = _request_db.get() or (0, 0.0)
+        DB_QUERIES_PER_REQUEST.observe(queries, (started[1][1],))
+        DB_TIME_PER_REQUEST.observe(seconds, (started[1][1],))
+        try:
+            _request_db.reset(started[2])
+        except ValueError:
+            _request_db.set(None)  # torn down in another context (streamed response)
+
+
+def instrument_engine(engine):
+    """Times every SQL statement run through `engine` (an Engine or the Engine class)."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _query_start(conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _query_end(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("metrics_query_start", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        DB_QUERY_LATENCY.observe(elapsed, (_statement_kind(statement),))
+        tally = _request_db.get()
+        if tally is not None:
+            tally[0] += 1
+            tally[1] += elapsed
@@ -0,0 +1,375 @@
+"""
+Notification outbox: booking confirmations and reminders, sent as per-parent digests.
+
+Bookings add rows to `notification_outbox` in their own transaction. A flush
+(run as a background task a short batching window later) collects every due
+row, groups them by parent into one digest email each, and sends the batch
+over a single SMTP connection, throttled to NOTIFY_MAX_PER_MINUTE.
+
+    python -m app.notifications sink --port 1025            # local SMTP sink for testing
+    python -m app.notifications --db healthhub.db flush     # send everything due now
+    python -m app.notifications --db healthhub.db stats
+"""
+import os
+import sys
+import json
+import time
+import smtplib
+import argparse
+import threading
+import socketserver
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from .db.connection import get_connection, unit_of_work
+from .task_queue import TASK_VISIBILITY_TIMEOUT
+
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "0") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+NOTIFY_FROM = os.getenv("NOTIFY_FROM", "Kgodisong Health Hub <no-reply@kgodisong.com>")
+
+NOTIFY_BATCH_WINDOW = float(os.getenv("NOTIFY_BATCH_WINDOW", "60"))  # seconds to gather a digest
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "500"))  # outbox rows per flush
+NOTIFY_MAX_PER_MINUTE = float(os.getenv("NOTIFY_MAX_PER_MINUTE", "120"))
+if NOTIFY_MAX_PER_MINUTE > 0:
+    # A flush runs inside one task lease: keep the throttled send time to half
+    # of it, so a big batch is not re-claimed and sent twice. The rest is
+    # picked up by the next flush.
+    NOTIFY_BATCH_SIZE = max(1, min(NOTIFY_BATCH_SIZE, int(NOTIFY_MAX_PER_MINUTE * TASK_VISIBILITY_TIMEOUT / 60 / 2)))
+NOTIFY_MESSAGES_PER_CONNECTION = int(os.getenv("NOTIFY_MESSAGES_PER_CONNECTION", "100"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+NOTIFY_REMINDER_HOURS = float(os.getenv("NOTIFY_REMINDER_HOURS", "24"))
+NOTIFY_CLAIM_TIMEOUT = 600  # a 'sending' row older than this was abandoned by a crashed flush
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipient TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    send_after REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    sent_at REAL,
+    last_error TEXT,
+    dedupe_key TEXT UNIQUE,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notification_outbox_due ON notification_outbox (status, send_after);
+"""
+
+INSERT_SQL = """
+INSERT OR IGNORE INTO notification_outbox (recipient, kind, subject, body, send_after, dedupe_key, created_at)
+VALUES (:recipient, :kind, :subject, :body, :send_after, :dedupe_key, :created_at)
+"""
+
+STATUSES = ("pending", "sending", "sent", "failed")
+
+
+def reminder_time(booking_date, hours_before=NOTIFY_REMINDER_HOURS):
+    """Epoch seconds to send a reminder for a YYYY-MM-DD booking, or None if unparseable or past."""
+    try:
+        day = datetime.strptime(str(booking_date)[:10], "%Y-%m-%d")
+    except ValueError:
+        return None
+    # Clinic days start in the morning: remind the day before at the same hour.
+    when = day + timedelta(hours=8) - timedelta(hours=hours_before)
+    return when.timestamp() if when > datetime.now() else None
+
+
+class Outbox:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with unit_of_work(db_path) as conn:
+            conn.executescript(SCHEMA)
+
+    # -----------------------------
+    # Queuing
+    # -----------------------------
+    def add(self, recipient, kind, subject, body, session=None, send_after=None, dedupe_key=None):
+        """Adds one notification; with a SQLAlchemy `session` it commits with the caller's transaction."""
+        now = time.time()
+        params = {
+            "recipient": recipient.strip().lower(),
+            "kind": kind,
+            "subject": subject,
+            "body": body,
+            "send_after": send_after if send_after is not None else now,
+            "dedupe_key": dedupe_key,
+            "created_at": now,
+        }
+        if session is not None:
+            from sqlalchemy import text
+            session.execute(text(INSERT_SQL), params)
+        else:
+            with unit_of_work(self.db_path) as conn:
+                conn.execute(INSERT_SQL, params)
+        return params["send_after"]
+
+    # -----------------------------
+    # Sending
+    # -----------------------------
+    def _claim(self, limit):
+        now = time.time()
+        conn = get_connection(self.db_path)
+        with unit_of_work(self.db_path):
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("""
+                SELECT id, recipient, kind, subject, body, attempts FROM notification_outbox
+                WHERE (status = 'pending' AND send_after <= :now)
+                   OR (status = 'sending' AND claimed_at <= :stale)
+                ORDER BY recipient, send_after, id LIMIT :limit
+            """, {"now": now, "stale": now - NOTIFY_CLAIM_TIMEOUT, "limit": limit}).fetchall()
+            conn.executemany(
+                "UPDATE notification_outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, row[0]) for row in rows]
+            )
+        return rows
+
+    def _finish(self, ids, error=None):
+        if not ids:
+            return
+        marks = ",".join("?" * len(ids))
+        with unit_of_work(self.db_path) as conn:
+            if error is None:
+                conn.execute(
+                    f"UPDATE notification_outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id IN ({marks})",
+                    [time.time(), *ids]
+                )
+            else:
+                # Back off a little per attempt; give up after NOTIFY_MAX_ATTEMPTS.
+                conn.execute(f"""
+                    UPDATE notification_outbox SET attempts = attempts + 1, last_error = ?,
+                        status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+                        send_after = ? + 60 * (attempts + 1)
+                    WHERE id IN ({marks})
+                """, [error, NOTIFY_MAX_ATTEMPTS, time.time(), *ids])
+
+    def flush(self, limit=NOTIFY_BATCH_SIZE, transport=None):
+        """
+        Sends every due notification (up to `limit` rows) as per-recipient digests
+        over one SMTP connection. Returns {"digests", "notifications", "failed", "remaining"}.
+        """
+        rows = self._claim(limit)
+        digests = {}
+        for row_id, recipient, kind, subject, body, _ in rows:
+            digests.setdefault(recipient, []).append((row_id, kind, subject, body))
+        stats = {"digests": 0, "notifications": 0, "failed": 0, "remaining": 0}
+        if digests:
+            transport = transport or SmtpTransport()
+            try:
+                for recipient, items in digests.items():
+                    ids = [item[0] for item in items]
+                    try:
+                        transport.send(build_digest(recipient, items))
+                    except (smtplib.SMTPException, OSError) as e:
+                        print(f"Notification to {recipient} failed:", e)
+                        self._finish(ids, str(e))
+                        stats["failed"] += len(ids)
+                        continue
+                    self._finish(ids)
+                    stats["digests"] += 1
+                    stats["notifications"] += len(ids)
+            finally:
+                transport.close()
+        conn = get_connection(self.db_path)
+        stats["remaining"] = conn.execute(
+            "SELECT COUNT(*) FROM notification_outbox WHERE status = 'pending' AND send_after <= ?", (time.time(),)
+        ).fetchone()[0]
+        return stats
+
+    def next_due(self):
+        """Epoch seconds when the earliest pending notification (including a retry) is due, or None."""
+        conn = get_connection(self.db_path)
+        return conn.execute("SELECT MIN(send_after) FROM notification_outbox WHERE status = 'pending'").fetchone()[0]
+
+    def stats(self):
+        conn = get_connection(self.db_path)
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM notification_outbox GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in STATUSES}
+
+
+def build_digest(recipient, items):
+    """One email for all of a parent's pending notifications."""
+    message = EmailMessage()
+    message["From"] = NOTIFY_FROM
+    message["To"] = recipient
+    if len(items) == 1:
+        message["Subject"] = items[0][2]
+        text = items[0][3]
+    else:
+        message["Subject"] = f"Kgodisong Health Hub: {len(items)} updates about your bookings"
+        text = "\n\n".join(f"{subject}\n{body}" for _, _, subject, body in items)
+    message.set_content(
+        f"Hello,\n\n{text}\n\n"
+        "Kind regards,\nKgodisong Health Hub\n"
+        "(This is an automated message - please do not reply.)\n"
+    )
+    return message
+
+
+class SmtpTransport:
+    """
+    One SMTP connection reused for a whole batch, opened lazily, throttled to
+    `max_per_minute` and recycled every `per_connection` messages.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, max_per_minute=NOTIFY_MAX_PER_MINUTE,
+                 per_connection=NOTIFY_MESSAGES_PER_CONNECTION):
+        self.host = host
+        self.port = port
+        self.interval = 60.0 / max_per_minute if max_per_minute > 0 else 0.0
+        self.per_connection = per_connection
+        self.sent = 0
+        self._smtp = None
+        self._sent_on_connection = 0
+        self._last_send = 0.0
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+        self._smtp = smtp
+        self._sent_on_connection = 0
+
+    def send(self, message):
+        wait = self._last_send + self.interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        if self._smtp is None or self._sent_on_connection >= self.per_connection:
+            self.close()
+            self._connect()
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # The server may drop idle connections; reconnect once and retry.
+            self._connect()
+            self._smtp.send_message(message)
+        self._last_send = time.monotonic()
+        self._sent_on_connection += 1
+        self.sent += 1
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+
+# -----------------------------
+# Local SMTP sink (testing)
+# -----------------------------
+class _SinkHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self._reply("220 kgodisong-sink ESMTP")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self._reply("250 kgodisong-sink")
+            elif verb == "MAIL":
+                sender, recipients = command[10:].strip(), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command[8:].strip())
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data[1:] if data.startswith(b"..") else data)
+                self.server.deliver(sender, recipients, b"".join(lines))
+                self._reply("250 OK queued")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            elif verb in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            else:
+                self._reply("502 Command not implemented")
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """Accepts mail and keeps it (and optionally appends it to a file) instead of delivering it."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=1025, mailbox=None, verbose=False):
+        super().__init__((host, port), _SinkHandler)
+        self.mailbox = mailbox
+        self.verbose = verbose
+        self.messages = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def deliver(self, sender, recipients, data):
+        with self._lock:
+            self.messages.append({"from": sender, "to": recipients, "data": data})
+            if self.mailbox:
+                with open(self.mailbox, "ab") as f:
+                    f.write(f"From {sender or '-'} {time.ctime()}\n".encode() + data + b"\n")
+        if self.verbose:
+            print(f"Mail {sender} -> {', '.join(recipients)} ({len(data)} bytes)")
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Notification outbox tools")
+    parser.add_argument("--db", default="healthhub.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sink = sub.add_parser("sink", help="Run a local SMTP sink")
+    sink.add_argument("--host", default="127.0.0.1")
+    sink.add_argument("--port", type=int, default=1025)
+    sink.add_argument("--mailbox", default=None, help="Append received mail to this mbox file")
+    sub.add_parser("flush", help="Send every due notification now")
+    sub.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    if args.command == "sink":
+        server = SmtpSink(args.host, args.port, args.mailbox, verbose=True)
+        print(f"SMTP sink listening on {args.host}:{args.port}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+    elif args.command == "flush":
+        outbox = Outbox(args.db)
+        total = {"digests": 0, "notifications": 0, "failed": 0}
+        while True:
+            stats = outbox.flush()
+            for key in total:
+                total[key] += stats[key]
+            if not stats["remaining"] or not (stats["notifications"] or stats["failed"]):
+                break
+        print(json.dumps(total))
+    else:
+        print(json.dumps(Outbox(args.db).stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
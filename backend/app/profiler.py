@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+import random
+import cProfile
+import tempfile
+import threading
+from collections import Counter
+from functools import lru_cache
+
+# Off unless a request asks for it: an admin session (or PROFILE_TOKEN) sending
+# "X-Profile: sample" / "X-Profile: cprofile", or a PROFILE_SAMPLE_RATE share of
+# all requests. Profiles land in PROFILE_DIR, newest PROFILE_KEEP kept.
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "kgodisong-profiles"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_HEADER = "X-Profile"
+
+# Frames that mark time spent in the parts we usually care about.
+CATEGORIES = {
+    "sql": ("sqlalchemy", "sqlite3"),
+    "templates": ("jinja2",),
+    "llm": ("call_llama", "acall_llama", "stream_llama", "groq"),
+}
+
+
+class StackSampler:
+    """
+    Statistical profiler for one thread: a helper thread records the target's
+    stack every `interval` seconds. The output is the "folded" format used by
+    flamegraph.pl, speedscope and inferno (one "frame;frame;frame count" per line).
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{_module(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        """Share of samples per CATEGORIES entry, e.g. {"sql": 0.12, "llm": 0.7}."""
+        total = sum(self.stacks.values())
+        if not total:
+            return {}
+        shares = {}
+        for name, markers in CATEGORIES.items():
+            hits = sum(
+                count for stack, count in self.stacks.items()
+                if any(marker in stack for marker in markers)
+            )
+            shares[name] = round(hits / total, 3)
+        return shares
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+
+
+class CallProfiler:
+    """Deterministic cProfile of the request thread; written as a pstats .prof file."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+        return self
+
+    def stop(self):
+        self.profile.disable()
+
+    def summary(self):
+        self.profile.create_stats()
+        # The outermost frame's cumulative time is the whole profiled span.
+        total = max((stat[3] for stat in self.profile.stats.values()), default=0.0) or 1.0
+        shares = {}
+        for name, markers in CATEGORIES.items():
+            # Cumulative time of the outermost matching functions (inner calls are nested in them).
+            hits = max(
+                (stat[3] for (filename, _, func), stat in self.profile.stats.items()
+                 if any(marker in filename or marker == func for marker in markers)),
+                default=0.0
+            )
+            shares[name] = round(min(hits / total, 1.0), 3)
+        return shares
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+@lru_cache(maxsize=4096)
+def _module(filename):
+    """Short, stable frame names: site-packages/sqlalchemy/orm/session.py -> sqlalchemy/orm/session.py."""
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return os.path.relpath(filename) if os.path.isabs(filename) else filename
+
+
+def _rotate(directory, keep):
+    try:
+        entries = sorted(os.scandir(directory), key=lambda e: e.stat().st_mtime, reverse=True)
+    except OSError:
+        return
+    for entry in entries[keep:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class RequestProfiler:
+    """Flask before/after-request hooks that profile selected requests."""
+
+    def __init__(self, directory=PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE,
+                 keep=PROFILE_KEEP, token=PROFILE_TOKEN, is_admin=None):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.token = token
+        self.is_admin = is_admin or (lambda: False)
+        self._write_lock = threading.Lock()
+
+    def _mode(self, request):
+        requested = request.headers.get(PROFILE_HEADER)
+        if requested is not None:
+            token = request.headers.get("X-Profile-Token")
+            if (self.token and token == self.token) or self.is_admin():
+                return "cprofile" if requested.strip().lower() == "cprofile" else "sample"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def init_app(self, app):
+        from flask import g, request
+
+        @app.before_request
+        def _profile_start():
+            if self.sample_rate <= 0 and PROFILE_HEADER not in request.headers:
+                return  # the common case: one header lookup
+            mode = self._mode(request)
+            if mode == "cprofile":
+                try:
+                    profiler = CallProfiler().start()
+                except ValueError:  # another profiler is active in this process
+                    profiler = StackSampler(threading.get_ident()).start()
+            elif mode == "sample":
+                profiler = StackSampler(threading.get_ident()).start()
+            else:
+                return
+            g._profile = (profiler, time.perf_counter())
+
+        @app.after_request
+        def _profile_finish(response):
+            started = g.pop("_profile", None)
+            if started is None:
+                return response
+            profiler, t0 = started
+            profiler.stop()
+            elapsed_ms = (time.perf_counter() - t0) * 1000
+            endpoint = (request.endpoint or "unmatched").replace(".", "-")
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(elapsed_ms)}ms-{os.getpid()}"
+            name += ".prof" if isinstance(profiler, CallProfiler) else ".folded"
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                profiler.write(os.path.join(self.directory, name))
+                with self._write_lock:
+                    _rotate(self.directory, self.keep)
+            except OSError as e:
+                print("Profile write error:", e)
+                return response
+            if PROFILE_HEADER in request.headers:
+                summary = ";".join(f"{k}={v:.0%}" for k, v in profiler.summary().items())
+                response.headers["X-Profile-File"] = name
+                response.headers["X-Profile-Summary"] = summary
+            return response
+
+        @app.teardown_request
+        def _profile_abort(exc):
+            started = g.pop("_profile", None)
+            if started is not None:
+                started[0].stop()  # the view raised before after_request ran
@@ -0,0 +1,136 @@
+import os
+import re
+import hashlib
+import threading
+from .utils import TTLCache
+from .retrieval import default_store
+
+RAG_ENABLED = os.getenv("RAG_ENABLED", "1") != "0"
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "600"))
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", "8"))
+RAG_CONTEXT_TTL = int(os.getenv("RAG_CONTEXT_TTL", "600"))
+# Passages sharing this much of their word trigrams with an already packed one are dropped.
+RAG_REDUNDANCY = float(os.getenv("RAG_REDUNDANCY", "0.6"))
+
+context_cache = TTLCache(max_size=1024, ttl=RAG_CONTEXT_TTL)
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "is",
+    "are", "be", "it", "my", "what", "should", "do", "i", "has", "have", "how",
+    "can", "if", "child", "children", "kid",
+}
+
+
+def _get_encoding():
+    """cl100k_base, loaded on first use (tiktoken may download it); None if unavailable."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:  # not installed, or the encoding can't be downloaded
+                    print("tiktoken unavailable, approximating token counts:", e)
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def truncate_tokens(text, max_tokens):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+def _words(text):
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def _shingles(words, n=3):
+    if len(words) < n:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _is_redundant(shingles, kept):
+    for other in kept:
+        overlap = len(shingles & other)
+        # Containment, not Jaccard: a passage mostly repeated inside a longer one adds nothing.
+        if overlap and overlap / min(len(shingles), len(other)) >= RAG_REDUNDANCY:
+            return True
+    return False
+
+
+def pack_context(question, results, token_budget=RAG_CONTEXT_TOKENS):
+    """
+    Packs ranked search results into at most `token_budget` tokens.
+    Skips passages sharing no keyword with the question, and duplicate or
+    largely redundant passages. The last passage may be truncated to fit.
+    """
+    keywords = {w for w in _words(question) if w not in _STOPWORDS}
+    blocks, kept = [], []
+    remaining = token_budget
+    for result in results:
+        words = _words(result["content"])
+        if keywords and not keywords.intersection(words):
+            continue
+        shingles = _shingles(words)
+        if _is_redundant(shingles, kept):
+            continue
+        source = (result.get("tags") or {}).get("source")
+        block = f"- ({source}) {result['content'].strip()}" if source else f"- {result['content'].strip()}"
+        tokens = count_tokens(block) + 1
+        if tokens > remaining:
+            if remaining >= 40:
+                blocks.append(truncate_tokens(block, remaining - 1) + "…")
+            break
+        blocks.append(block)
+        kept.append(shingles)
+        remaining -= tokens
+    return "\n".join(blocks)
+
+
+def corpus_version():
+    """Changes whenever documents are added; "" when retrieval is disabled or unavailable."""
+    if not RAG_ENABLED:
+        return ""
+    try:
+        return str(default_store().version())
+    except Exception as e:
+        print("RAG store unavailable:", e)
+        return ""
+
+
+def retrieve_context(question, token_budget=RAG_CONTEXT_TOKENS):
+    """
+    School documents relevant to `question`, packed into `token_budget` tokens.
+    Cached per (normalized question, budget, corpus version).
+    """
+    if not RAG_ENABLED or not question:
+        return ""
+    version = corpus_version()
+    normalized = " ".join(_words(question))
+    signature = hashlib.sha256(f"{normalized}|{token_budget}|{version}".encode()).hexdigest()
+    context = context_cache.get(signature)
+    if context is not None:
+        return context
+    try:
+        results = default_store().search(question, RAG_CANDIDATES)
+    except Exception as e:
+        print("RAG search error:", e)
+        return ""
+    context = pack_context(question, results, token_budget)
+    context_cache.set(signature, context)
+    return context
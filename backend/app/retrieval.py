@@ -0,0 +1,126 @@
+"""
+The school document store behind RAG: embeddings, document text and tags in a
+VectorStore, keywords in a BM25Index, and an optional FAISS index (see
+ann_index.py), all next to one path. Documents from the older shelve store at
+that path are imported once, when the vector store is still empty.
+
+Search is hybrid: vector similarity and BM25 keyword hits, fused with
+reciprocal-rank fusion. rag_demo.py (the document admin app) and the health
+assistant (rag_service.py) both go through default_store().
+"""
+import os
+import dbm
+import uuid
+import shelve
+import threading
+from .vector_store import VectorStore, hash_embed
+from .ann_index import open_search_index
+from .bm25_index import BM25Index, reciprocal_rank_fusion
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAG_DB_PATH = os.getenv(
+    "RAG_DB_PATH", os.path.join(os.getenv("HEALTHHUB_DATA_DIR", BASE_DIR), "vector_store.db")
+)
+
+
+def fake_embed(text):
+    """Deterministic hashed bag-of-words embedding (no model needed)."""
+    return hash_embed(text)
+
+
+class DocumentStore:
+    def __init__(self, path=RAG_DB_PATH):
+        self.path = path
+        self._vector_store = None
+        self._keyword_index = None
+        self._search_index = None
+        self._lock = threading.Lock()
+
+    def _legacy_documents(self):
+        """[(doc_id, content, tags)] from a shelve store at `path`, if there is one."""
+        try:
+            with shelve.open(self.path, "r") as db:
+                return [(doc_id, data["content"], data.get("tags") or {}) for doc_id, data in db.items()]
+        except dbm.error:
+            return []
+
+    def vector_store(self):
+        """Opens the embedding matrix and document table, importing the legacy shelve documents once."""
+        with self._lock:
+            if self._vector_store is None:
+                store = VectorStore(self.path)
+                if len(store) == 0:
+                    items = self._legacy_documents()
+                    if items:
+                        store.add([doc_id for doc_id, _, _ in items], [fake_embed(c) for _, c, _ in items],
+                                  [(content, tags) for _, content, tags in items])
+                self._vector_store = store
+            return self._vector_store
+
+    def keyword_index(self):
+        """Opens the BM25 inverted index, backfilling it from the document table once."""
+        store = self.vector_store()
+        with self._lock:
+            if self._keyword_index is None:
+                index = BM25Index(self.path)
+                if len(index) == 0:
+                    index.add((doc_id, content) for doc_id, (content, _) in store.documents().items())
+                self._keyword_index = index
+            return self._keyword_index
+
+    def search_index(self):
+        """Exact store or FAISS index, depending on RAG_INDEX_BACKEND."""
+        store = self.vector_store()
+        with self._lock:
+            if self._search_index is None:
+                self._search_index = open_search_index(store)
+            return self._search_index
+
+    def version(self):
+        """Changes whenever documents are added."""
+        return self.vector_store().version()
+
+    def save(self, content, tags=None, doc_id=None):
+        doc_id = doc_id or str(uuid.uuid4())
+        store = self.vector_store()
+        keyword_index = self.keyword_index()
+        # Postings first: the document becomes readable when its vector row and text commit.
+        keyword_index.add([(doc_id, content)])
+        store.add([doc_id], [fake_embed(content)], [(content, tags)])
+        return doc_id
+
+    def search(self, question, number_of_results=3):
+        """Top documents as dicts with document_id, content, tags and relevance_score."""
+        candidates = max(number_of_results * 4, 20)
+        vector_hits = self.search_index().search(fake_embed(question), candidates)
+        keyword_hits = self.keyword_index().search(question, candidates)
+        hits = reciprocal_rank_fusion(vector_hits, keyword_hits)[:number_of_results]
+        if not hits:
+            return []
+
+        documents = self.vector_store().documents(doc_id for doc_id, _ in hits)
+        results = []
+        for doc_id, relevance in hits:
+            if doc_id not in documents:
+                continue
+            content, tags = documents[doc_id]
+            results.append({
+                "document_id": doc_id,
+                "content": content,
+                "tags": tags,
+                "relevance_score": round(relevance, 4)
+            })
+        return results
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def default_store():
+    """The process-wide store at RAG_DB_PATH."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = DocumentStore(RAG_DB_PATH)
+        return _default_store
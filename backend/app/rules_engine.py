@@ -0,0 +1,223 @@
+import os
+import re
+import json
+import time
+import threading
+
+RULES_CHECK_INTERVAL = float(os.getenv("RULES_CHECK_INTERVAL", "1.0"))
+
+# Used when health_rules.json does not exist yet. Earlier rules win, as in an if/elif chain.
+DEFAULT_RULES = [
+    {
+        "name": "fever",
+        "keywords": ["fever"],
+        "guidance": [
+            "Monitor the child's temperature regularly.",
+            "Keep the child hydrated.",
+            "Do not give any medication unless prescribed by a doctor.",
+            "Remove excess clothing and keep the room cool."
+        ]
+    },
+    {
+        "name": "injury",
+        "keywords": ["injury", "cut"],
+        "guidance": [
+            "Apply gentle pressure to stop any bleeding.",
+            "Keep the injured area elevated if possible.",
+            "Do not try to move the child if there is suspected fracture.",
+            "Keep the child calm and still."
+        ]
+    },
+    {
+        "name": "allergy",
+        "keywords": ["allergic"],
+        "guidance": [
+            "Check if the child has an epinephrine auto-injector and use if prescribed.",
+            "Remove any allergen from immediate environment.",
+            "Monitor breathing and pulse continuously.",
+            "Keep the child calm and lying down."
+        ]
+    },
+    {
+        "name": "breathing",
+        "keywords": ["breathing", "asthma"],
+        "guidance": [
+            "Help the child sit upright.",
+            "Give prescribed inhaler if available.",
+            "Keep airways clear and calm the child.",
+            "Monitor breathing closely until help arrives."
+        ]
+    },
+]
+DEFAULT_GUIDANCE = ["Follow general first-aid measures and keep the child comfortable."]
+
+
+def validate_rules(data):
+    """Normalized copy of a rules list; raises ValueError describing the first problem."""
+    if not isinstance(data, list):
+        raise ValueError("rules must be a JSON list")
+    rules = []
+    for index, rule in enumerate(data):
+        if not isinstance(rule, dict):
+            raise ValueError(f"rule {index} must be an object")
+        keywords = rule.get("keywords")
+        guidance = rule.get("guidance")
+        if not isinstance(keywords, list) or not all(isinstance(k, str) and k.strip() for k in keywords) or not keywords:
+            raise ValueError(f"rule {index}: 'keywords' must be a non-empty list of strings")
+        if not isinstance(guidance, list) or not all(isinstance(g, str) for g in guidance):
+            raise ValueError(f"rule {index}: 'guidance' must be a list of strings")
+        rules.append({
+            "name": str(rule.get("name") or f"rule {index + 1}"),
+            "keywords": [" ".join(k.lower().split()) for k in keywords],
+            "guidance": guidance,
+        })
+    return rules
+
+
+def _trie_pattern(keywords):
+    """
+    Regex source for a set of keywords, factored as a character trie
+    ("fever|fracture" -> "f(?:ever|racture)") so the engine never retries
+    keywords sharing a prefix. Spaces in keywords match any whitespace.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node):
+        ends = "" in node
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + emit(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends:
+            # Greedy optional: the longest keyword at a position wins.
+            return "(?:" + body + ")?" if len(branches) == 1 else body + "?"
+        return body
+
+    return emit(trie)
+
+
+class CompiledRules:
+    """
+    Every keyword of every rule folded into one trie-shaped regex, so matching
+    is a single scan of the text however many rules there are. Keywords match
+    at the start of a word ("fever" matches "fevers" but "cut" does not match "acute").
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._keyword_rules = {}  # keyword -> indices of rules using it
+        for index, rule in enumerate(rules):
+            for keyword in rule["keywords"]:
+                self._keyword_rules.setdefault(keyword, []).append(index)
+        self._pattern = re.compile(
+            r"\b" + _trie_pattern(self._keyword_rules), re.IGNORECASE
+        ) if self._keyword_rules else None
+        # IGNORECASE matches "ſ" for "s" and "İ" for "i", which lower() does not
+        # map back; look matches up casefolded and fall back to _resolve().
+        self._folded_rules = {keyword.casefold(): indices for keyword, indices in self._keyword_rules.items()}
+
+    def _resolve(self, matched):
+        """Rule indices of the keyword that matched `matched` (rare: a case mapping lower() misses)."""
+        for keyword, indices in self._keyword_rules.items():
+            if re.fullmatch(_trie_pattern([keyword]), matched, re.IGNORECASE):
+                return indices
+        return None
+
+    def first_match(self, text):
+        """The earliest-listed rule with a keyword in `text`, or None."""
+        if self._pattern is None or not text:
+            return None
+        best = None
+        for match in self._pattern.finditer(text):
+            matched = match.group(0)
+            indices = self._folded_rules.get(" ".join(matched.casefold().split())) or self._resolve(matched)
+            if indices is None:
+                continue
+            index = indices[0]
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return self.rules[best] if best is not None else None
+
+
+class RulesEngine:
+    """
+    Emergency guidance rules loaded from `path` (written by /admin/health-rules).
+    The file is re-read when its mtime, size or inode changes, at most every
+    RULES_CHECK_INTERVAL seconds. The compiled rules are swapped in as one
+    object, so a lookup never sees a half-loaded rule set. A broken file is
+    reported and the previous rules stay active.
+    """
+
+    def __init__(self, path, check_interval=RULES_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._compiled = CompiledRules(validate_rules(DEFAULT_RULES))
+        self._signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+            if signature is None:
+                compiled = CompiledRules(validate_rules(DEFAULT_RULES))
+            else:
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        compiled = CompiledRules(validate_rules(json.load(f)))
+                except (OSError, ValueError) as e:
+                    print("Health rules error, keeping previous rules:", e)
+                    self._signature = signature
+                    return
+            self._compiled = compiled
+            self._signature = signature
+
+    def rules(self):
+        self._maybe_reload()
+        return self._compiled.rules
+
+    def match(self, emergency_type, description=""):
+        """Rule for an emergency: the type is checked first, then the description."""
+        self._maybe_reload()
+        compiled = self._compiled
+        return compiled.first_match(emergency_type) or compiled.first_match(description)
+
+    def guidance(self, emergency_type, description=""):
+        rule = self.match(emergency_type, description)
+        return list(rule["guidance"]) if rule else list(DEFAULT_GUIDANCE)
+
+    def save(self, data):
+        """Validates and atomically replaces the rules file; returns the normalized rules."""
+        rules = validate_rules(data)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rules, f, indent=4)
+        os.replace(tmp, self.path)
+        with self._lock:
+            self._next_check = 0.0  # pick the new file up on the next lookup
+        return rules
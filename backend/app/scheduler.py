@@ -0,0 +1,259 @@
+"""
+Clinic and mobile-team visit slots with fixed capacities.
+
+A visit is split into slots (e.g. hourly, 20 children each). A booking takes a
+place with one conditional UPDATE ... WHERE reserved < capacity, run in the
+booking's own transaction, so two workers can never oversell a slot and a
+failed booking releases nothing it did not take.
+
+Availability is answered from a per-process index of each visit's free places,
+keyed on the visit's version (bumped by every reservation). A request costs one
+primary-key read while nothing changed, and clients polling with If-None-Match
+get a 304.
+
+    python -m app.scheduler --db healthhub.db create "Mobile clinic" 2026-11-05 \
+        --start 08:00 --end 13:00 --slot-minutes 60 --capacity 20 --service vaccine --service checkup
+    python -m app.scheduler --db healthhub.db list
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta
+from .db.connection import get_connection, unit_of_work
+
+SERVICES = ("vaccine", "checkup")
+KINDS = ("clinic", "mobile")
+MAX_SLOTS_PER_VISIT = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clinic_visits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'clinic',
+    visit_date TEXT NOT NULL,
+    school TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS clinic_visits_date ON clinic_visits (visit_date);
+CREATE TABLE IF NOT EXISTS clinic_slots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    visit_id INTEGER NOT NULL REFERENCES clinic_visits (id),
+    service TEXT NOT NULL,
+    starts_at TEXT NOT NULL,
+    ends_at TEXT NOT NULL,
+    capacity INTEGER NOT NULL,
+    reserved INTEGER NOT NULL DEFAULT 0,
+    CHECK (reserved >= 0 AND reserved <= capacity)
+);
+CREATE INDEX IF NOT EXISTS clinic_slots_visit ON clinic_slots (visit_id, starts_at);
+CREATE TABLE IF NOT EXISTS slot_reservations (
+    reference TEXT PRIMARY KEY,
+    slot_id INTEGER NOT NULL REFERENCES clinic_slots (id),
+    child_name TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# One statement: takes a place only if one is left and the slot offers the service.
+RESERVE_SQL = """
+UPDATE clinic_slots SET reserved = reserved + 1
+WHERE id = :slot_id AND service = :service AND reserved < capacity
+RETURNING visit_id, starts_at
+"""
+BUMP_VERSION_SQL = "UPDATE clinic_visits SET version = version + 1 WHERE id = :visit_id"
+RECORD_SQL = """
+INSERT INTO slot_reservations (reference, slot_id, child_name, created_at)
+VALUES (:reference, :slot_id, :child_name, :created_at)
+"""
+
+
+class SlotUnavailable(Exception):
+    """The slot does not exist, does not offer the service, or is full."""
+
+    def __init__(self, reason, slot_id):
+        super().__init__(reason)
+        self.reason = reason
+        self.slot_id = slot_id
+
+
+class SlotScheduler:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._index = {}  # visit_id -> (version, JSON body)
+        self._lock = threading.Lock()
+        with unit_of_work(db_path) as conn:
+            conn.executescript(SCHEMA)
+
+    # -----------------------------
+    # Visits
+    # -----------------------------
+    def create_visit(self, name, visit_date, start="08:00", end="14:00", slot_minutes=60,
+                     capacity=20, services=SERVICES, kind="clinic", school=None):
+        """Creates a visit with one slot per service per `slot_minutes`; returns the visit id."""
+        day = datetime.strptime(visit_date, "%Y-%m-%d")
+        first = datetime.combine(day.date(), datetime.strptime(start, "%H:%M").time())
+        last = datetime.combine(day.date(), datetime.strptime(end, "%H:%M").time())
+        services = [s for s in dict.fromkeys(services)]
+        if not name or not name.strip():
+            raise ValueError("name is required")
+        if last <= first or slot_minutes <= 0:
+            raise ValueError("end must be after start and slot_minutes positive")
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+        unknown = [s for s in services if s not in SERVICES]
+        if unknown or not services:
+            raise ValueError(f"services must be chosen from {', '.join(SERVICES)}")
+
+        step = timedelta(minutes=slot_minutes)
+        starts = []
+        while first + step <= last:
+            starts.append(first)
+            first += step
+        if not starts or len(starts) * len(services) > MAX_SLOTS_PER_VISIT:
+            raise ValueError(f"a visit needs between 1 and {MAX_SLOTS_PER_VISIT} slots")
+
+        with unit_of_work(self.db_path) as conn:
+            visit_id = conn.execute(
+                "INSERT INTO clinic_visits (name, kind, visit_date, school, created_at) VALUES (?, ?, ?, ?, ?)",
+                (name.strip(), kind, visit_date, school, time.time())
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO clinic_slots (visit_id, service, starts_at, ends_at, capacity) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (visit_id, service, s.strftime("%Y-%m-%d %H:%M"), (s + step).strftime("%Y-%m-%d %H:%M"), capacity)
+                    for s in starts for service in services
+                ]
+            )
+        return visit_id
+
+    def visits(self, since=None):
+        """Visits on or after `since` (default today), soonest first."""
+        since = since or datetime.now().strftime("%Y-%m-%d")
+        conn = get_connection(self.db_path)
+        rows = conn.execute("""
+            SELECT v.id, v.name, v.kind, v.visit_date, v.school,
+                   COALESCE(SUM(s.capacity), 0), COALESCE(SUM(s.reserved), 0)
+            FROM clinic_visits v LEFT JOIN clinic_slots s ON s.visit_id = v.id
+            WHERE v.visit_date >= ? GROUP BY v.id ORDER BY v.visit_date, v.id
+        """, (since,)).fetchall()
+        return [
+            {"id": r[0], "name": r[1], "kind": r[2], "date": r[3], "school": r[4],
+             "capacity": r[5], "free": r[5] - r[6]}
+            for r in rows
+        ]
+
+    # -----------------------------
+    # Availability
+    # -----------------------------
+    def availability(self, visit_id):
+        """(version, JSON body) of a visit's free places, or None if there is no such visit."""
+        conn = get_connection(self.db_path)
+        row = conn.execute("SELECT version FROM clinic_visits WHERE id = ?", (visit_id,)).fetchone()
+        if row is None:
+            return None
+        cached = self._index.get(visit_id)
+        if cached is not None and cached[0] >= row[0]:
+            return cached
+        with self._lock:
+            # Another thread may have rebuilt it while this one waited.
+            cached = self._index.get(visit_id)
+            if cached is not None and cached[0] >= row[0]:
+                return cached
+            visit = conn.execute(
+                "SELECT id, name, kind, visit_date, school FROM clinic_visits WHERE id = ?", (visit_id,)
+            ).fetchone()
+            # One statement, so the slot counts and the version come from the same snapshot.
+            slots = conn.execute("""
+                SELECT v.version, s.id, s.service, s.starts_at, s.ends_at, s.capacity, s.reserved
+                FROM clinic_visits v JOIN clinic_slots s ON s.visit_id = v.id
+                WHERE v.id = ? ORDER BY s.starts_at, s.service
+            """, (visit_id,)).fetchall()
+            data = {
+                "visit": {"id": visit[0], "name": visit[1], "kind": visit[2], "date": visit[3], "school": visit[4]},
+                "slots": [
+                    {"id": s[1], "service": s[2], "starts_at": s[3], "ends_at": s[4],
+                     "capacity": s[5], "free": s[5] - s[6]}
+                    for s in slots
+                ],
+            }
+            entry = (slots[0][0] if slots else row[0], json.dumps(data))
+            self._index[visit_id] = entry
+            return entry
+
+    # -----------------------------
+    # Reservations
+    # -----------------------------
+    def reserve(self, session, slot_id, service, reference, child_name):
+        """
+        Takes one place in `slot_id` inside the caller's SQLAlchemy transaction and
+        returns the slot's start ("YYYY-MM-DD HH:MM"). Raises SlotUnavailable.
+        """
+        from sqlalchemy import text
+        row = session.execute(text(RESERVE_SQL), {"slot_id": slot_id, "service": service}).first()
+        if row is None:
+            exists = session.execute(
+                text("SELECT service FROM clinic_slots WHERE id = :slot_id"), {"slot_id": slot_id}
+            ).first()
+            if exists is None:
+                raise SlotUnavailable("no such slot", slot_id)
+            if exists[0] != service:
+                raise SlotUnavailable(f"this slot is for {exists[0]} bookings", slot_id)
+            raise SlotUnavailable("this slot is full", slot_id)
+        visit_id, starts_at = row
+        session.execute(text(BUMP_VERSION_SQL), {"visit_id": visit_id})
+        session.execute(text(RECORD_SQL), {
+            "reference": reference, "slot_id": slot_id, "child_name": child_name, "created_at": time.time()
+        })
+        return starts_at
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clinic visit slots")
+    parser.add_argument("--db", default="healthhub.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="Create a visit and its slots")
+    create.add_argument("name")
+    create.add_argument("date", help="YYYY-MM-DD")
+    create.add_argument("--start", default="08:00")
+    create.add_argument("--end", default="14:00")
+    create.add_argument("--slot-minutes", type=int, default=60)
+    create.add_argument("--capacity", type=int, default=20)
+    create.add_argument("--service", action="append", choices=SERVICES,
+                        help="Repeat for several services (default: all)")
+    create.add_argument("--kind", default="clinic", choices=KINDS)
+    create.add_argument("--school", default=None)
+
+    commands.add_parser("list", help="Upcoming visits and free places")
+    show = commands.add_parser("show", help="Slots of one visit")
+    show.add_argument("visit_id", type=int)
+
+    args = parser.parse_args(argv)
+    scheduler = SlotScheduler(args.db)
+
+    if args.command == "create":
+        try:
+            visit_id = scheduler.create_visit(
+                args.name, args.date, args.start, args.end, args.slot_minutes, args.capacity,
+                args.service or SERVICES, args.kind, args.school
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Created visit {visit_id}")
+    elif args.command == "list":
+        print(json.dumps(scheduler.visits(), indent=2))
+    else:
+        found = scheduler.availability(args.visit_id)
+        if found is None:
+            parser.error(f"no visit {args.visit_id}")
+        print(json.dumps(json.loads(found[1]), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
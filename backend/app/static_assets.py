@@ -0,0 +1,308 @@
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import mimetypes
+import threading
+from email.utils import formatdate
+from flask import request, send_file, Response
+from .utils import file_lock
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+ASSET_RELOAD = os.getenv("ASSET_RELOAD", "0") == "1"
+ASSET_MIN_COMPRESS_BYTES = int(os.getenv("ASSET_MIN_COMPRESS_BYTES", "1024"))
+MANIFEST_NAME = "manifest.json"
+
+# Files in these top-level folders are served with a one-year immutable lifetime
+# when requested with the current `?v=<hash>` fingerprint.
+IMMUTABLE_DIRS = ("lib", "css", "img", "js")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/javascript", "application/json", "application/xml",
+    "image/svg+xml", "application/pdf", "font/ttf", "application/vnd.ms-fontobject",
+)
+
+# href/src attributes pointing at a local asset, e.g. href="css/style.css".
+ASSET_REF_RE = re.compile(r"""(\b(?:href|src)=["'])((?:\.\./|\./|/)*(?:lib|css|img|js)/[^"'?#]+)(["'])""")
+
+
+class Asset:
+    def __init__(self, path, rel_path, data, mtime):
+        self.rel_path = rel_path
+        self.path = path  # identity body (a rewritten copy for HTML)
+        self.digest = hashlib.sha256(data).hexdigest()
+        self.version = self.digest[:10]
+        self.size = len(data)
+        self.mtime = mtime
+        self.mimetype = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+        # Pages using Jinja tags still go through render_template.
+        self.is_template = rel_path.endswith(".html") and (b"{{" in data or b"{%" in data)
+        self.variants = {}  # content-coding -> (path, size)
+
+    def to_dict(self):
+        return {
+            "path": self.path, "digest": self.digest, "size": self.size, "mtime": self.mtime,
+            "mimetype": self.mimetype, "is_template": self.is_template,
+            "variants": {encoding: list(variant) for encoding, variant in self.variants.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, rel_path, saved):
+        asset = cls.__new__(cls)
+        asset.rel_path = rel_path
+        asset.path = saved["path"]
+        asset.digest = saved["digest"]
+        asset.version = asset.digest[:10]
+        asset.size = saved["size"]
+        asset.mtime = saved["mtime"]
+        asset.mimetype = saved["mimetype"]
+        asset.is_template = saved["is_template"]
+        asset.variants = {encoding: tuple(variant) for encoding, variant in saved["variants"].items()}
+        return asset
+
+    def etag(self, encoding):
+        # Strong validators must differ per representation.
+        return f'"{self.version}"' if encoding == "identity" else f'"{self.version}-{encoding}"'
+
+
+class AssetManifest:
+    """
+    Content-hashed index of every file under `root`, built once into `cache_dir`
+    (`flask --app a build-assets` or `python -m app.static_assets`) and loaded
+    by every worker.
+
+    - ETag from the SHA-256 of the content, `304 Not Modified` on If-None-Match.
+    - gzip (and brotli, when installed) variants of text assets, written once
+      to `cache_dir` keyed by content hash and chosen from Accept-Encoding.
+    - HTML pages get their lib/css/img/js references fingerprinted
+      (`/css/style.css?v=<hash>`), so those files can be cached as immutable.
+    """
+
+    def __init__(self, root, cache_dir):
+        self.root = os.path.abspath(root)
+        self.cache_dir = cache_dir
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def load_or_build(self):
+        """
+        Loads the saved manifest. If it is missing or no longer matches the files
+        under root, one process rebuilds it (under a file lock) and the rest load it.
+        """
+        if self.load():
+            return self
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with file_lock(os.path.join(self.cache_dir, MANIFEST_NAME + ".lock")):
+            if not self.load():
+                self.build()
+        return self
+
+    def load(self):
+        """True if the manifest in cache_dir was loaded; False if it is missing or stale."""
+        try:
+            with open(os.path.join(self.cache_dir, MANIFEST_NAME), encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if saved.get("settings") != self._settings():
+            return False
+        assets = {rel_path: Asset.from_dict(rel_path, entry) for rel_path, entry in saved["assets"].items()}
+        if not self._current(assets):
+            return False
+        self._assets = assets
+        return True
+
+    def _settings(self):
+        return {"root": self.root, "brotli": brotli is not None, "min_compress_bytes": ASSET_MIN_COMPRESS_BYTES}
+
+    def _current(self, assets):
+        """True if `assets` lists exactly the files under root, unmodified, and their cached bodies exist."""
+        seen = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                asset = assets.get(os.path.relpath(path, self.root).replace(os.sep, "/"))
+                if asset is None or os.path.getmtime(path) != asset.mtime:
+                    return False
+                seen += 1
+        return seen == len(assets) and all(
+            os.path.exists(asset.path) and all(os.path.exists(path) for path, _ in asset.variants.values())
+            for asset in assets.values()
+        )
+
+    def save(self):
+        saved = {
+            "settings": self._settings(),
+            "assets": {rel_path: asset.to_dict() for rel_path, asset in self._assets.items()},
+        }
+        self._cache_file(MANIFEST_NAME, json.dumps(saved).encode("utf-8"), replace=True)
+
+    def build(self):
+        """Hashes and compresses every file under root and saves the manifest."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        assets, pages = {}, []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                rel_path = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if rel_path.endswith(".html"):
+                    pages.append((path, rel_path))
+                    continue
+                assets[rel_path] = self._load(path, rel_path, assets)
+        self._assets = assets
+        # Pages last: their fingerprints need the hashes of everything they link to.
+        for path, rel_path in pages:
+            assets[rel_path] = self._load(path, rel_path, assets)
+        self.save()
+        return self
+
+    def _load(self, path, rel_path, assets):
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        if rel_path.endswith(".html"):
+            rewritten = self._fingerprint(data, rel_path, assets)
+            if rewritten != data:
+                data = rewritten
+                path = self._cache_file(hashlib.sha256(data).hexdigest() + ".html", data)
+        asset = Asset(path, rel_path, data, stat.st_mtime)
+        if asset.size >= ASSET_MIN_COMPRESS_BYTES and asset.mimetype.startswith(COMPRESSIBLE_TYPES):
+            self._add_variant(asset, "gzip", ".gz", data, lambda d: gzip.compress(d, 9, mtime=0))
+            if brotli is not None:
+                self._add_variant(asset, "br", ".br", data, lambda d: brotli.compress(d, quality=11))
+        return asset
+
+    def _add_variant(self, asset, encoding, suffix, data, compress):
+        name = asset.digest + suffix
+        path = os.path.join(self.cache_dir, name)
+        if not os.path.exists(path):
+            self._cache_file(name, compress(data))
+        size = os.path.getsize(path)
+        if size < asset.size:
+            asset.variants[encoding] = (path, size)
+
+    def _cache_file(self, name, data, replace=False):
+        path = os.path.join(self.cache_dir, name)
+        if replace or not os.path.exists(path):
+            # Written under a temporary name and renamed, which is atomic.
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return path
+
+    def _fingerprint(self, data, rel_path, assets):
+        text = data.decode("utf-8", errors="surrogateescape")
+        base = os.path.dirname(rel_path)
+
+        def replace(match):
+            ref = match.group(2)
+            target = ref.lstrip("/") if ref.startswith("/") else os.path.normpath(os.path.join(base, ref))
+            asset = assets.get(target.replace(os.sep, "/"))
+            if asset is None:
+                return match.group(0)
+            # Root-relative, so pages served from nested routes (/health/...) resolve them too.
+            return f"{match.group(1)}/{asset.rel_path}?v={asset.version}{match.group(3)}"
+
+        return ASSET_REF_RE.sub(replace, text).encode("utf-8", errors="surrogateescape")
+
+    def get(self, rel_path):
+        """Asset for a path relative to root, or None. Files added after startup are picked up here."""
+        rel_path = rel_path.replace("\\", "/").lstrip("/")
+        path = os.path.normpath(os.path.join(self.root, rel_path))
+        if not path.startswith(self.root + os.sep):
+            return None
+        # Cache under the normalised path so "./x" and "a/../x" don't each add an entry.
+        rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+        asset = self._assets.get(rel)
+        if asset is not None and not ASSET_RELOAD:
+            return asset
+        if not os.path.isfile(path):
+            return None
+        if asset is not None and os.path.getmtime(path) == asset.mtime:
+            return asset
+        with self._lock:
+            asset = self._load(path, rel, self._assets)
+            self._assets[rel] = asset
+        return asset
+
+    def url(self, rel_path):
+        """Fingerprinted URL for templates: asset_url('css/style.css')."""
+        asset = self.get(rel_path)
+        return f"/{rel_path}?v={asset.version}" if asset else f"/{rel_path}"
+
+    def serve(self, asset):
+        encoding = choose_encoding(request.headers.get("Accept-Encoding", ""), asset.variants)
+        etag = asset.etag(encoding)
+        top = asset.rel_path.split("/", 1)[0]
+        fingerprinted = top in IMMUTABLE_DIRS and request.args.get("v") == asset.version
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE if fingerprinted else REVALIDATE_CACHE,
+            "Last-Modified": formatdate(asset.mtime, usegmt=True),
+        }
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            return Response(status=304, headers=headers)
+
+        if encoding == "identity":
+            response = send_file(asset.path, mimetype=asset.mimetype, conditional=False, etag=False)
+        else:
+            path, _ = asset.variants[encoding]
+            response = send_file(path, mimetype=asset.mimetype, conditional=False, etag=False)
+            response.headers["Content-Encoding"] = encoding
+        response.headers.update(headers)
+        return response
+
+
+def choose_encoding(accept_encoding, variants):
+    """Best of br / gzip / identity the client accepts (q > 0) and we have."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+    for encoding in ("br", "gzip"):
+        if encoding in variants and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match requires; proxies may add W/.
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Hash, fingerprint and precompress the frontend assets")
+    parser.add_argument("root", help="Frontend directory")
+    parser.add_argument("cache_dir", help="Where the manifest and compressed variants are written")
+    args = parser.parse_args(argv)
+    manifest = AssetManifest(args.root, args.cache_dir).build()
+    print(f"Built {len(manifest._assets)} assets into {args.cache_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""
+Durable background task queue stored in SQLite.
+
+Tasks are rows in the `tasks` table. A request enqueues them on its own
+database session, so they commit (or roll back) together with the row that
+caused them. Workers claim ready tasks with a visibility timeout; a task
+whose worker died becomes visible again once the timeout passes. Failures
+are retried with exponential backoff until max_attempts.
+
+    python -m app.task_queue --db healthhub.db stats
+    python -m app.task_queue --db healthhub.db list --status failed
+    python -m app.task_queue --db healthhub.db retry 42
+    python -m app.task_queue --db healthhub.db purge --older-than 7
+    python -m app.task_queue work --app a:tasks --concurrency 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import importlib
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from .db.connection import get_connection, unit_of_work
+
+TASK_VISIBILITY_TIMEOUT = float(os.getenv("TASK_VISIBILITY_TIMEOUT", "120"))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "5"))
+TASK_BACKOFF_BASE = float(os.getenv("TASK_BACKOFF_BASE", "2"))
+TASK_BACKOFF_MAX = float(os.getenv("TASK_BACKOFF_MAX", "600"))
+TASK_POLL_INTERVAL = float(os.getenv("TASK_POLL_INTERVAL", "1.0"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    locked_until REAL,
+    worker TEXT,
+    last_error TEXT,
+    dedupe_key TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, run_at);
+CREATE UNIQUE INDEX IF NOT EXISTS tasks_queued_dedupe ON tasks (dedupe_key)
+    WHERE dedupe_key IS NOT NULL AND status = 'queued';
+"""
+
+# Named parameters work for both sqlite3 and SQLAlchemy text().
+INSERT_SQL = """
+INSERT OR IGNORE INTO tasks (name, payload, max_attempts, run_at, dedupe_key, created_at)
+VALUES (:name, :payload, :max_attempts, :run_at, :dedupe_key, :created_at)
+"""
+
+STATUSES = ("queued", "running", "done", "failed")
+
+
+def backoff_delay(attempts, base=TASK_BACKOFF_BASE, cap=TASK_BACKOFF_MAX):
+    """Exponential backoff with full jitter: up to base * 2**(attempts - 1) seconds."""
+    return random.uniform(0, min(cap, base * 2 ** max(0, attempts - 1)))
+
+
+class TaskQueue:
+    def __init__(self, db_path, context=None):
+        """`context` is a callable returning a context manager each task runs in (e.g. app.app_context)."""
+        self.db_path = db_path
+        self.context = context
+        self.handlers = {}
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+        with unit_of_work(db_path) as conn:
+            conn.executescript(SCHEMA)
+
+    # -----------------------------
+    # Producing
+    # -----------------------------
+    def task(self, name, max_attempts=TASK_MAX_ATTEMPTS):
+        """Registers a handler: @tasks.task("ambulance.journal") def f(payload): ..."""
+        def register(fn):
+            self.handlers[name] = (fn, max_attempts)
+            return fn
+        return register
+
+    def enqueue(self, name, payload, session=None, delay=0.0, dedupe_key=None):
+        """
+        Adds a task. With a SQLAlchemy `session` the insert joins that session's
+        transaction and the task only exists once the caller commits. A queued
+        (not yet running) task with the same dedupe_key makes this a no-op.
+        """
+        _, max_attempts = self.handlers.get(name, (None, TASK_MAX_ATTEMPTS))
+        now = time.time()
+        params = {
+            "name": name,
+            "payload": json.dumps(payload, default=str),
+            "max_attempts": max_attempts,
+            "run_at": now + delay,
+            "dedupe_key": dedupe_key,
+            "created_at": now,
+        }
+        if session is not None:
+            from sqlalchemy import text
+            session.execute(text(INSERT_SQL), params)
+            session.info["tasks_enqueued"] = True
+        else:
+            with unit_of_work(self.db_path) as conn:
+                conn.execute(INSERT_SQL, params)
+            self.notify()
+
+    def notify(self):
+        """Wakes a worker in this process instead of waiting for its next poll."""
+        self._wakeup.set()
+
+    # -----------------------------
+    # Consuming
+    # -----------------------------
+    def claim(self, worker_id, limit=1, visibility_timeout=TASK_VISIBILITY_TIMEOUT):
+        """Claims up to `limit` ready tasks: [(id, name, payload, attempts)]."""
+        now = time.time()
+        conn = get_connection(self.db_path)
+        with unit_of_work(self.db_path):
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")  # take the write lock before choosing rows
+            # Tasks whose worker vanished on their last attempt are not retried again.
+            conn.execute("""
+                UPDATE tasks SET status = 'failed', finished_at = :now, locked_until = NULL,
+                    last_error = COALESCE(last_error, 'visibility timeout expired')
+                WHERE status = 'running' AND locked_until <= :now AND attempts >= max_attempts
+            """, {"now": now})
+            rows = conn.execute("""
+                SELECT id, name, payload, attempts FROM tasks
+                WHERE (status = 'queued' AND run_at <= :now)
+                   OR (status = 'running' AND locked_until <= :now)
+                ORDER BY run_at, id LIMIT :limit
+            """, {"now": now, "limit": limit}).fetchall()
+            if rows:
+                conn.executemany("""
+                    UPDATE tasks SET status = 'running', attempts = attempts + 1,
+                        locked_until = ?, worker = ?
+                    WHERE id = ?
+                """, [(now + visibility_timeout, worker_id, row[0]) for row in rows])
+        return [(task_id, name, json.loads(payload), attempts + 1) for task_id, name, payload, attempts in rows]
+
+    def complete(self, task_id, worker_id):
+        with unit_of_work(self.db_path) as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'done', finished_at = ?, locked_until = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), task_id, worker_id)
+            )
+
+    def fail(self, task_id, worker_id, attempts, error):
+        with unit_of_work(self.db_path) as conn:
+            row = conn.execute("SELECT max_attempts FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                return
+            if attempts >= row[0]:
+                conn.execute(
+                    "UPDATE tasks SET status = 'failed', last_error = ?, finished_at = ?, locked_until = NULL "
+                    "WHERE id = ? AND worker = ? AND status = 'running'",
+                    (error, time.time(), task_id, worker_id)
+                )
+            else:
+                requeued = conn.execute(
+                    "UPDATE OR IGNORE tasks SET status = 'queued', last_error = ?, run_at = ?, locked_until = NULL "
+                    "WHERE id = ? AND worker = ? AND status = 'running'",
+                    (error, time.time() + backoff_delay(attempts), task_id, worker_id)
+                ).rowcount
+                if not requeued:
+                    # A queued task with the same dedupe_key already covers this work.
+                    conn.execute(
+                        "UPDATE tasks SET status = 'done', last_error = ?, finished_at = ?, locked_until = NULL "
+                        "WHERE id = ? AND worker = ? AND status = 'running'",
+                        (error + " (superseded by a queued duplicate)", time.time(), task_id, worker_id)
+                    )
+
+    def run_task(self, task_id, name, payload, attempts, worker_id):
+        handler = self.handlers.get(name)
+        try:
+            if handler is None:
+                raise LookupError(f"no handler registered for task '{name}'")
+            if self.context is not None:
+                with self.context():
+                    handler[0](payload)
+            else:
+                handler[0](payload)
+        except Exception as e:
+            print(f"Task {task_id} ({name}) failed on attempt {attempts}:", e)
+            self.fail(task_id, worker_id, attempts, "".join(traceback.format_exception_only(type(e), e)).strip())
+            return False
+        self.complete(task_id, worker_id)
+        return True
+
+    def start_worker(self, concurrency=2):
+        """Starts (once per process) a background worker thread pool for this queue."""
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return self._worker
+        self._worker = Worker(self, concurrency=concurrency)
+        self._worker_pid = os.getpid()
+        self._worker.start()
+        return self._worker
+
+    # -----------------------------
+    # Inspection
+    # -----------------------------
+    def stats(self):
+        conn = get_connection(self.db_path)
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+        oldest = conn.execute(
+            "SELECT MIN(run_at) FROM tasks WHERE status = 'queued' AND run_at <= ?", (time.time(),)
+        ).fetchone()[0]
+        stats = {status: counts.get(status, 0) for status in STATUSES}
+        stats["oldest_ready_age"] = round(time.time() - oldest, 1) if oldest else 0.0
+        return stats
+
+    def list(self, status=None, limit=20):
+        conn = get_connection(self.db_path)
+        query = "SELECT id, name, status, attempts, max_attempts, run_at, worker, last_error FROM tasks"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return conn.execute(query, params).fetchall()
+
+    def retry(self, task_ids=None):
+        """Re-queues failed tasks (all of them, or the given ids). Returns how many."""
+        with unit_of_work(self.db_path) as conn:
+            # OR IGNORE: a failed task whose dedupe_key is already pending again stays failed.
+            query = ("UPDATE OR IGNORE tasks SET status = 'queued', attempts = 0, run_at = ?, finished_at = NULL "
+                     "WHERE status = 'failed'")
+            params = [time.time()]
+            if task_ids:
+                query += f" AND id IN ({','.join('?' * len(task_ids))})"
+                params.extend(task_ids)
+            return conn.execute(query, params).rowcount
+
+    def purge(self, older_than_days=7):
+        """Deletes finished (done/failed) tasks older than the given age. Returns how many."""
+        cutoff = time.time() - older_than_days * 86400
+        with unit_of_work(self.db_path) as conn:
+            return conn.execute(
+                "DELETE FROM tasks WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,)
+            ).rowcount
+
+
+class Worker:
+    """Polls the queue and runs tasks on a thread pool of `concurrency` threads."""
+
+    def __init__(self, queue, concurrency=2, poll_interval=TASK_POLL_INTERVAL,
+                 visibility_timeout=TASK_VISIBILITY_TIMEOUT):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="task-worker")
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="task-poller", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self.queue.notify()
+        if self._thread is not None and wait:
+            self._thread.join()
+        self._pool.shutdown(wait=wait)
+
+    def _run_one(self, task):
+        try:
+            self.queue.run_task(*task, self.worker_id)
+        finally:
+            self._slots.release()
+            self.queue.notify()  # a slot is free: poll now
+
+    def run(self):
+        while not self._stop.is_set():
+            free = 0
+            while self._slots.acquire(blocking=False):
+                free += 1
+            claimed = []
+            if free:
+                try:
+                    claimed = self.queue.claim(self.worker_id, free, self.visibility_timeout)
+                except Exception as e:
+                    print("Task queue poll error:", e)
+            for _ in range(free - len(claimed)):
+                self._slots.release()
+            for task in claimed:
+                self._pool.submit(self._run_one, task)
+            if len(claimed) < free or not free:
+                # Idle (or every thread busy): sleep until notified or the next poll.
+                self.queue._wakeup.wait(self.poll_interval)
+                self.queue._wakeup.clear()
+
+
+def _load_queue(spec, db_path):
+    if spec:
+        module_name, _, attr = spec.partition(":")
+        return getattr(importlib.import_module(module_name), attr or "tasks")
+    return TaskQueue(db_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and run the background task queue")
+    parser.add_argument("--db", default="healthhub.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats")
+    listing = sub.add_parser("list")
+    listing.add_argument("--status", choices=STATUSES)
+    listing.add_argument("--limit", type=int, default=20)
+    retry = sub.add_parser("retry", help="Re-queue failed tasks (all, or the given ids)")
+    retry.add_argument("ids", nargs="*", type=int)
+    purge = sub.add_parser("purge", help="Delete finished tasks")
+    purge.add_argument("--older-than", type=float, default=7, help="Days")
+    work = sub.add_parser("work", help="Run a worker until interrupted")
+    work.add_argument("--app", default="a:tasks", help="module:attribute of the TaskQueue with handlers")
+    work.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.command == "work":
+        sys.path.insert(0, os.getcwd())
+        queue = _load_queue(args.app, args.db)
+        worker = Worker(queue, concurrency=args.concurrency).start()
+        print(f"Worker {worker.worker_id} running {', '.join(sorted(queue.handlers)) or 'no handlers'}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            worker.stop()
+        return
+
+    queue = TaskQueue(args.db)
+    if args.command == "stats":
+        print(json.dumps(queue.stats(), indent=2))
+    elif args.command == "list":
+        for task_id, name, status, attempts, max_attempts, run_at, worker, error in queue.list(args.status, args.limit):
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run_at))
+            print(f"{task_id:>6}  {status:<8} {name:<28} {attempts}/{max_attempts}  {when}  {worker or ''}")
+            if error:
+                print(f"        {error.splitlines()[-1]}")
+    elif args.command == "retry":
+        print(f"Re-queued {queue.retry(args.ids)} tasks")
+    elif args.command == "purge":
+        print(f"Deleted {queue.purge(args.older_than)} tasks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live.
+    Entries are evicted when they expire or when the cache grows past max_size
+    (least recently used first). `on_evict(key)`, if given, is called for each
+    evicted or expired key after the cache lock is released (not on clear()).
+    """
+
+    def __init__(self, max_size=512, ttl=3600, on_evict=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None, count=True):
+        expired = False
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._data[key]
+                entry, expired = None, True
+            if entry is None:
+                if count:
+                    self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+        if expired and self.on_evict is not None:
+            self.on_evict(key)
+        return default if entry is None else entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                evicted.append(self._data.popitem(last=False)[0])
+                self.evictions += 1
+        if self.on_evict is not None:
+            for old_key in evicted:
+                self.on_evict(old_key)
+
+    def items(self):
+        """Snapshot of live (key, value) pairs, most recently used last."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (v, expires_at) in self._data.items() if expires_at >= now]
+
+    def record(self, hit):
+        """Count a hit or miss decided by the caller (e.g. after a fuzzy lookup)."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive cross-process lock held on `path` (created if missing) for the
+    duration of the block. Uses fcntl on POSIX and msvcrt on Windows.
+    """
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield handle
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
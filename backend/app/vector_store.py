@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+import numpy as np
+from .utils import file_lock
+
+EMBED_DIM = 256
+
+
+def hash_embed(text, dim=EMBED_DIM):
+    """
+    Deterministic bag-of-words embedding (feature hashing of unigrams and
+    bigrams into `dim` signed buckets), L2-normalised. No model download needed.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    words = re.findall(r"[a-z0-9]+", (text or "").lower())
+    features = words + [a + " " + b for a, b in zip(words, words[1:])]
+    for feature in features:
+        digest = hashlib.md5(feature.encode()).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+class VectorStore:
+    """
+    Append-only float32 embedding matrix.
+
+    - `<path>.vectors.f32`    raw row-major float32 matrix, read through np.memmap
+    - `<path>.vectors.sqlite` side tables mapping row number -> document id, and
+                              document id -> content and tags
+
+    Rows are only ever appended. Re-saving a document appends a new row and the
+    older row is masked out of search results. Other processes pick up appended
+    rows on their next search. A document's text is committed in the same
+    transaction as its row, so it is searchable exactly when it is readable.
+    """
+
+    def __init__(self, path, dim=EMBED_DIM):
+        self.path = path
+        self.dim = dim
+        self.vectors_path = path + ".vectors.f32"
+        self.ids_path = path + ".vectors.sqlite"
+        self.lock_path = path + ".vectors.lock"
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._ids = []
+        self._rows = {}
+        self._live = np.zeros(0, dtype=bool)
+
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS vector_rows (row_id INTEGER PRIMARY KEY, doc_id TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS vector_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents (doc_id TEXT PRIMARY KEY, content TEXT NOT NULL, tags TEXT NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO vector_meta (key, value) VALUES ('dim', ?)", (str(dim),))
+            stored_dim = int(conn.execute("SELECT value FROM vector_meta WHERE key = 'dim'").fetchone()[0])
+        if stored_dim != dim:
+            raise ValueError(f"{self.vectors_path} holds {stored_dim}-dimensional vectors, not {dim}")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.ids_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _file_size(self):
+        try:
+            return os.path.getsize(self.vectors_path)
+        except OSError:
+            return 0
+
+    def _refresh(self):
+        """Load side-table rows appended since the last call and remap the matrix."""
+        if self._matrix is not None and self._file_size() == len(self._ids) * self.dim * 4:
+            return
+        with self._connect() as conn:
+            new_rows = conn.execute(
+                "SELECT row_id, doc_id FROM vector_rows WHERE row_id >= ? ORDER BY row_id",
+                (len(self._ids),)
+            ).fetchall()
+        if not new_rows and self._matrix is not None:
+            return
+        live = np.ones(len(self._ids) + len(new_rows), dtype=bool)
+        live[:len(self._live)] = self._live
+        for row_id, doc_id in new_rows:
+            previous = self._rows.get(doc_id)
+            if previous is not None:
+                live[previous] = False
+            self._rows[doc_id] = row_id
+            self._ids.append(doc_id)
+        self._live = live
+        count = len(self._ids)
+        self._matrix = (
+            np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+            if count else np.zeros((0, self.dim), dtype=np.float32)
+        )
+
+    def add(self, doc_ids, vectors, documents=None):
+        """
+        Append one row per document id, and with `documents` (one (content, tags)
+        per id) store their text in the same transaction. Returns the new row numbers.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(doc_ids) != len(vectors) or (documents is not None and len(documents) != len(doc_ids)):
+            raise ValueError("doc_ids, vectors and documents must have the same length")
+        if not len(doc_ids):
+            return []
+        with self._lock, file_lock(self.lock_path):
+            with self._connect() as conn:
+                start = conn.execute("SELECT COALESCE(MAX(row_id) + 1, 0) FROM vector_rows").fetchone()[0]
+                with open(self.vectors_path, "ab") as f:
+                    # Drop bytes left behind by a writer that crashed before committing its ids.
+                    f.truncate(start * self.dim * 4)
+                    f.write(np.ascontiguousarray(vectors).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                rows = list(range(start, start + len(doc_ids)))
+                conn.executemany(
+                    "INSERT INTO vector_rows (row_id, doc_id) VALUES (?, ?)",
+                    zip(rows, doc_ids)
+                )
+                if documents is not None:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO documents (doc_id, content, tags) VALUES (?, ?, ?)",
+                        [(doc_id, content, json.dumps(tags or {})) for doc_id, (content, tags) in zip(doc_ids, documents)]
+                    )
+            self._refresh()
+        return rows
+
+    def documents(self, doc_ids=None):
+        """{doc_id: (content, tags)} for the given ids (all documents if None)."""
+        with self._connect() as conn:
+            if doc_ids is None:
+                rows = conn.execute("SELECT doc_id, content, tags FROM documents").fetchall()
+            else:
+                doc_ids = list(doc_ids)
+                rows = []
+                for start in range(0, len(doc_ids), 500):
+                    part = doc_ids[start:start + 500]
+                    rows += conn.execute(
+                        f"SELECT doc_id, content, tags FROM documents WHERE doc_id IN ({','.join('?' * len(part))})", part
+                    ).fetchall()
+        return {doc_id: (content, json.loads(tags)) for doc_id, content, tags in rows}
+
+    def search(self, query, k=3):
+        """Top-k (doc_id, cosine score) pairs by dot product against every live row."""
+        with self._lock:
+            self._refresh()
+            matrix, live, ids = self._matrix, self._live, self._ids
+        live_count = int(live.sum())
+        k = min(k, live_count)
+        if k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        scores = np.asarray(matrix @ query)
+        scores[~live[:len(scores)]] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i])) for i in top]
+
+    def version(self):
+        """Number of rows ever appended; changes whenever the corpus changes."""
+        with self._lock:
+            self._refresh()
+            return len(self._ids)
+
+    def rows(self):
+        """(matrix, live mask, row ids) snapshot, e.g. for building an ANN index."""
+        with self._lock:
+            self._refresh()
+            return self._matrix, self._live, list(self._ids)
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return int(self._live.sum())
@@ -0,0 +1,369 @@
+"""
+Benchmark cases for the backend hot paths.
+
+Each case is a function `(workspace, size) -> op`: it seeds `size` rows or
+documents into a scratch store and returns the zero-argument callable that is
+timed. Cases never touch the checked-in databases; the runner points a.py,
+reference.py and the RAG store at a temporary directory before importing them.
+"""
+import os
+import json
+import sys
+import random
+import sqlite3
+import itertools
+import subprocess
+from datetime import date, timedelta
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SET_UP_DB = os.path.join(BACKEND_DIR, "app", "db", "set_up_db.py")
+
+CASES = {}
+
+WORDS = (
+    "fever cough rash asthma allergy vomiting headache injury cut bruise hydration "
+    "vaccination measles polio dental eye check-up nurse clinic parent teacher school "
+    "temperature inhaler medicine rest sleep hygiene handwashing lunch outdoor play"
+).split()
+SYMPTOMS = ["fever", "cough", "rash", "vomiting", "headache", "sore throat"]
+EMERGENCIES = ["High Fever", "Injury", "Allergic reaction", "Breathing difficulty", "Other"]
+
+
+def case(name, max_size=None):
+    """Registers a benchmark; sizes above max_size are skipped for slow-to-seed cases."""
+    def register(func):
+        CASES[name] = (func, max_size)
+        return func
+    return register
+
+
+def sentence(rng, length=40):
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def child_name(i):
+    return f"Child {i % 5000}"
+
+
+class Workspace:
+    """Scratch directory plus the lazily imported app under test."""
+
+    def __init__(self, root):
+        self.root = root
+        self._app = None
+        self._client = None
+
+    def dir(self, name):
+        path = os.path.join(self.root, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @property
+    def app(self):
+        if self._app is None:
+            import a
+            with a.app.app_context():
+                a.db.create_all()
+                a.create_demo_data()
+            self._app = a
+        return self._app
+
+    @property
+    def client(self):
+        """Test client logged in as the demo admin."""
+        if self._client is None:
+            self._client = self.app.app.test_client()
+            self._client.post("/api/login", data={"username": "admin@kgodisong.com", "password": "123456"})
+        return self._client
+
+    def crud_db(self, name):
+        """A fresh database.db created by app/db/set_up_db.py."""
+        directory = self.dir(name)
+        subprocess.run([sys.executable, SET_UP_DB], cwd=directory, check=True)
+        return os.path.join(directory, "database.db")
+
+
+def _check(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+
+
+# -----------------------------
+# RAG documents (app/retrieval.py)
+# -----------------------------
+def _rag_store(ws, size):
+    """A DocumentStore holding `size` documents."""
+    from app.retrieval import DocumentStore, fake_embed
+    from app.vector_store import VectorStore
+    from app.bm25_index import BM25Index
+
+    rng = random.Random(size)
+    path = os.path.join(ws.dir(f"rag-{size}"), "vector_store.db")
+    docs = [(f"doc-{i}", sentence(rng)) for i in range(size)]
+    VectorStore(path).add([d for d, _ in docs], [fake_embed(c) for _, c in docs], [(c, {}) for _, c in docs])
+    BM25Index(path).add(docs)
+    return DocumentStore(path), rng
+
+
+@case("rag.search_documents")
+def bench_search_documents(ws, size):
+    documents, rng = _rag_store(ws, size)
+    questions = itertools.cycle([sentence(rng, 8) for _ in range(64)])
+    return lambda: documents.search(next(questions))
+
+
+@case("rag.save_document")
+def bench_save_document(ws, size):
+    documents, rng = _rag_store(ws, size)
+    contents = itertools.cycle([sentence(rng) for _ in range(64)])
+    return lambda: documents.save(next(contents), {"source": "bench"})
+
+
+# -----------------------------
+# Health Hub (a.py)
+# -----------------------------
+def _seed_health_tables(ws, size):
+    """`size` rows in each health table, spread over 5000 children."""
+    a = ws.app
+    today = date.today()
+    with a.app.app_context():
+        for model in (a.SickLog, a.VaccineBooking, a.CheckupBooking, a.AmbulanceBooking, a.ChildHealthSummary):
+            a.db.session.query(model).delete()
+        rows = range(size)
+        days = [(today - timedelta(days=i % 365)).isoformat() for i in rows]
+        a.db.session.execute(a.db.insert(a.SickLog), [
+            {"child_name": child_name(i), "grade": "Grade 1", "symptoms": SYMPTOMS[i % len(SYMPTOMS)],
+             "description": "seeded", "date": days[i]} for i in rows
+        ])
+        a.db.session.execute(a.db.insert(a.VaccineBooking), [
+            {"child_name": child_name(i), "vaccine_type": "Measles", "date": days[i],
+             "reference": f"SEED-V-{i}"} for i in rows
+        ])
+        a.db.session.execute(a.db.insert(a.CheckupBooking), [
+            {"child_name": child_name(i), "parent_email": f"parent{i % 5000}@example.com",
+             "check_type": "Eye Check-up", "date": days[i], "reference_number": f"SEED-C-{i}"} for i in rows
+        ])
+        a.db.session.execute(a.db.insert(a.AmbulanceBooking), [
+            {"child_name": child_name(i), "class_name": "1A", "emergency_type": EMERGENCIES[i % len(EMERGENCIES)],
+             "description": "seeded", "reference_number": f"SEED-A-{i}"} for i in rows
+        ])
+        a.db.session.commit()
+        a.rebuild_health_summaries()
+        a.rebuild_health_rollups()
+    return a
+
+
+def _post(ws, url, forms):
+    forms = itertools.cycle(forms)
+    client = ws.client
+
+    def op():
+        _check(client.post(url, data=next(forms)))
+    return op
+
+
+@case("booking.vaccine")
+def bench_vaccine_booking(ws, size):
+    _seed_health_tables(ws, size)
+    day = (date.today() + timedelta(days=7)).isoformat()
+    return _post(ws, "/api/vaccine-booking", [
+        {"child_name": child_name(i), "vaccine_type": "Polio", "date": day} for i in range(64)
+    ])
+
+
+@case("booking.checkup")
+def bench_checkup_booking(ws, size):
+    _seed_health_tables(ws, size)
+    day = (date.today() + timedelta(days=7)).isoformat()
+    return _post(ws, "/api/checkup-booking", [
+        {"child_name": child_name(i), "parent_email": f"parent{i}@example.com",
+         "check_type": "Dental Check-up", "date": day} for i in range(64)
+    ])
+
+
+def _clinic_visit(ws, name, capacity=1_000_000):
+    """A visit tomorrow with hourly vaccine and check-up slots; returns (visit id, first vaccine slot id)."""
+    a = ws.app
+    day = (date.today() + timedelta(days=1)).isoformat()
+    visit_id = a.scheduler.create_visit(name, day, "08:00", "14:00", 60, capacity)
+    slots = json.loads(a.scheduler.availability(visit_id)[1])["slots"]
+    return visit_id, next(slot["id"] for slot in slots if slot["service"] == "vaccine")
+
+
+@case("booking.vaccine_slot")
+def bench_vaccine_slot_booking(ws, size):
+    """The 8am rush: every booking takes a place in the same slot."""
+    _seed_health_tables(ws, size)
+    _, slot_id = _clinic_visit(ws, f"rush-{size}")
+    return _post(ws, "/api/vaccine-booking", [
+        {"child_name": child_name(i), "vaccine_type": "Polio", "date": "", "slot_id": slot_id}
+        for i in range(64)
+    ])
+
+
+@case("clinic.availability", max_size=10000)
+def bench_clinic_availability(ws, size):
+    """Availability of one visit among `size`, served from the per-visit index."""
+    a = ws.app
+    for i in range(size - 1):
+        a.scheduler.create_visit(f"visit-{size}-{i}", "2026-01-01", "08:00", "09:00", 60, 20)
+    visit_id, _ = _clinic_visit(ws, f"availability-{size}")
+    client = ws.client
+
+    def op():
+        _check(client.get(f"/api/clinic-visits/{visit_id}/availability"))
+    return op
+
+
+@case("booking.sick_log")
+def bench_sick_log(ws, size):
+    _seed_health_tables(ws, size)
+    return _post(ws, "/api/sick-log", [
+        {"child_name": child_name(i), "grade": "Grade 2", "symptoms": "cough",
+         "description": "bench", "date": date.today().isoformat()} for i in range(64)
+    ])
+
+
+@case("booking.ambulance")
+def bench_ambulance_booking(ws, size):
+    _seed_health_tables(ws, size)
+    return _post(ws, "/api/ambulance-booking", [
+        {"child_name": child_name(i), "class_name": "1A", "emergency_type": EMERGENCIES[i % len(EMERGENCIES)],
+         "description": "wheezing after play"} for i in range(64)
+    ])
+
+
+@case("dashboard.api")
+def bench_dashboard(ws, size):
+    _seed_health_tables(ws, size)
+    client = ws.client
+
+    def op():
+        _check(client.get("/api/dashboard"))
+    return op
+
+
+@case("ambulance.save_request")
+def bench_save_ambulance_request(ws, size):
+    from app.journal import JsonlJournal
+
+    a = ws.app
+    journal = JsonlJournal(os.path.join(ws.dir(f"journal-{size}"), "ambulance_requests.jsonl"), max_bytes=1 << 40)
+    journal.append_many([
+        {"child_name": child_name(i), "class_name": "1A", "emergency_type": "Other",
+         "description": "seeded", "reference_number": f"SEED-{i}"} for i in range(size)
+    ], durable=False)
+    a.ambulance_journal = journal  # save_ambulance_request looks the journal up by name
+    counter = itertools.count()
+
+    def op():
+        i = next(counter)
+        a.save_ambulance_request({
+            "child_name": child_name(i), "class_name": "1A", "emergency_type": "Injury",
+            "description": "bench", "reference_number": f"BENCH-{size}-{i}"
+        })
+    return op
+
+
+@case("reference.allocate")
+def bench_reference_allocate(ws, size):
+    """`size` prefixes with live sequences, allocated round-robin."""
+    from reference import ReferenceAllocator
+
+    allocator = ReferenceAllocator(os.path.join(ws.dir(f"references-{size}"), "healthhub.db"))
+    prefixes = [f"BENCH-{i}" for i in range(size)]
+    for prefix in prefixes:
+        allocator.allocate(prefix)
+    cycle = itertools.cycle(prefixes)
+    return lambda: allocator.allocate(next(cycle))
+
+
+@case("static.serve_resource", max_size=10000)
+def bench_serve_resource(ws, size):
+    """One page served out of a manifest of `size` files."""
+    from app.static_assets import AssetManifest
+
+    a = ws.app
+    root = ws.dir(f"frontend-{size}")
+    rng = random.Random(size)
+    for i in range(size):
+        with open(os.path.join(root, f"page{i}.css"), "w", encoding="utf-8") as f:
+            f.write(f".c{i} {{ color: #{rng.randrange(1 << 24):06x}; }}\n" * 40)
+    a.assets = AssetManifest(root, ws.dir(f"frontend-{size}-cache")).build()
+    client = ws.client
+    paths = itertools.cycle([f"/page{rng.randrange(size)}.css" for _ in range(64)])
+
+    def op():
+        _check(client.get(next(paths), headers={"Accept-Encoding": "gzip"}))
+    return op
+
+
+# -----------------------------
+# app/db/crud.py
+# -----------------------------
+def _crud(ws, name, size):
+    """A set_up_db.py database with `size` parents, children and absence logs."""
+    path = ws.crud_db(f"{name}-{size}")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO Parents (Parent_id_number, First_name, Surname, Phone_number, Email) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         ((i, f"P{i}", "Seed", 821234567, f"p{i}@example.com") for i in range(size)))
+        conn.executemany("INSERT INTO Children (Child_id_number, First_name, Surname, Date_of_birth, "
+                         "School, Grade, Class, Parent_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         ((i, f"C{i}", "Seed", "2020-01-01", "wtc", 1, "A", i) for i in range(size)))
+        conn.executemany("INSERT INTO Absence_logs (Child_id, Absence_date, Reason, Logged_by) "
+                         "VALUES (?, ?, ?, ?)",
+                         ((i % max(size // 10, 1), "2026-01-01", "flu", "seed") for i in range(size)))
+        conn.execute("INSERT INTO Booking_types (Booking_type) VALUES ('Dental')")
+    conn.close()
+    from app.db import crud
+    return crud, path
+
+
+@case("crud.add_parent")
+def bench_crud_add_parent(ws, size):
+    crud, path = _crud(ws, "add_parent", size)
+    parents = crud.Parent(path)
+    ids = itertools.count(size + 1)
+
+    def op():
+        i = next(ids)
+        parents.add_parent([(i, "Bench", "Parent", 821234567, f"b{i}@example.com")])
+    return op
+
+
+@case("crud.add_child")
+def bench_crud_add_child(ws, size):
+    crud, path = _crud(ws, "add_child", size)
+    children = crud.Children(path)
+    ids = itertools.count(size + 1)
+
+    def op():
+        i = next(ids)
+        children.add_child([(i, "Bench", "Child", "2021-01-01", "wtc", 1, "A", i % max(size, 1))])
+    return op
+
+
+@case("crud.create_booking")
+def bench_crud_create_booking(ws, size):
+    crud, path = _crud(ws, "create_booking", size)
+    bookings = crud.Bookings(path)
+    ids = itertools.cycle(range(max(size, 1)))
+    return lambda: bookings.create_booking(next(ids), 1, "2026-11-01")
+
+
+@case("crud.log_absence")
+def bench_crud_log_absence(ws, size):
+    crud, path = _crud(ws, "log_absence", size)
+    absences = crud.Absence_log(path)
+    ids = itertools.cycle(range(max(size, 1)))
+    return lambda: absences.log_absence(next(ids), "2026-10-01", "cold", "bench")
+
+
+@case("crud.view_absence_history")
+def bench_crud_view_absence_history(ws, size):
+    crud, path = _crud(ws, "view_absence_history", size)
+    absences = crud.Absence_log(path)
+    ids = itertools.cycle(range(max(size // 10, 1)))
+    return lambda: absences.view_absence_history(next(ids))
@@ -0,0 +1,186 @@
+"""
+Microbenchmarks for the backend hot paths, run in-process (Flask test client,
+no server or Groq quota needed). Every case runs at each data size against a
+scratch copy of the stores:
+
+    python -m benchmarks.runner run --sizes 10,1000,100000 --out benchmarks/baseline.json
+    python -m benchmarks.runner run --filter booking --out /tmp/now.json --compare benchmarks/baseline.json
+    python -m benchmarks.runner compare benchmarks/baseline.json /tmp/now.json --threshold 0.25
+
+`compare` exits with status 1 when a case got slower than the threshold allows.
+Baselines are only comparable on the same machine.
+"""
+import os
+import io
+import sys
+import json
+import time
+import timeit
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+from contextlib import redirect_stdout
+from datetime import datetime
+
+DEFAULT_SIZES = "10,1000,100000"
+DEFAULT_THRESHOLD = 0.25
+
+
+def prepare_environment(root):
+    """Points a.py, reference.py and the task/metrics stores at `root`; must run before they are imported."""
+    os.environ["HEALTHHUB_DATA_DIR"] = root
+    os.environ["REFERENCE_DB_PATH"] = os.path.join(root, "healthhub.db")
+    os.environ["ASSET_CACHE_DIR"] = os.path.join(root, ".asset_cache")
+    os.environ["METRICS_DIR"] = os.path.join(root, "metrics")
+    os.environ["PROFILE_DIR"] = os.path.join(root, "profiles")
+    os.environ["TASK_WORKERS"] = "0"  # queued follow-up work stays queued
+    os.environ.setdefault("LLM_ASYNC", "0")
+    if not os.getenv("GROQ_API_KEY"):
+        os.environ.setdefault("GROQ_BASE_URL", "http://127.0.0.1:1")  # no case calls the LLM
+
+
+def measure(op, repeat=5, min_time=0.2):
+    """Seconds per call: best and median of `repeat` rounds of about min_time each."""
+    op()  # warm caches and lazy imports
+    timer = timeit.Timer(op)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    rounds = [timer.timeit(number) / number for _ in range(repeat)]
+    return {
+        "min": min(rounds),
+        "median": statistics.median(rounds),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run(sizes, name_filter=None, repeat=5, min_time=0.2, keep_workdir=False):
+    workdir = tempfile.mkdtemp(prefix="kgodisong-bench-")
+    prepare_environment(workdir)
+    from benchmarks.cases import CASES, Workspace
+
+    ws = Workspace(workdir)
+    results = {}
+    try:
+        for name, (setup, max_size) in CASES.items():
+            if name_filter and name_filter not in name:
+                continue
+            for size in sizes:
+                if max_size is not None and size > max_size:
+                    continue
+                started = time.perf_counter()
+                # crud.py prints on every call; keep that out of the timings and the report.
+                with redirect_stdout(io.StringIO()):
+                    op = setup(ws, size)
+                    seeded = time.perf_counter() - started
+                    stats = measure(op, repeat, min_time)
+                results.setdefault(name, {})[str(size)] = stats
+                print(f"{name:<28} {size:>8}  {_fmt(stats['median']):>10}/op"
+                      f"  (min {_fmt(stats['min'])}, x{stats['number']}, seeded in {seeded:.1f}s)")
+    finally:
+        if keep_workdir:
+            print("Scratch data kept in", workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "sizes": sizes,
+            "repeat": repeat,
+            "min_time": min_time,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD, metric="median"):
+    """Rows of (name, size, old, new, change, status); status is "REGRESSION", "faster" or ""."""
+    rows = []
+    for name, by_size in sorted(current["results"].items()):
+        for size, stats in by_size.items():
+            old = baseline["results"].get(name, {}).get(size)
+            if old is None:
+                rows.append((name, size, None, stats[metric], None, "new"))
+                continue
+            change = stats[metric] / old[metric] - 1 if old[metric] else 0.0
+            status = "REGRESSION" if change > threshold else "faster" if change < -threshold else ""
+            rows.append((name, size, old[metric], stats[metric], change, status))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'benchmark':<28} {'size':>8} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, size, old, new, change, status in rows:
+        old_text = _fmt(old) if old is not None else "-"
+        change_text = f"{change:+.0%}" if change is not None else "-"
+        print(f"{name:<28} {size:>8} {old_text:>10} {_fmt(new):>10} {change_text:>8}  {status}")
+    regressions = sum(1 for row in rows if row[5] == "REGRESSION")
+    print(f"{regressions} regression(s)")
+    return regressions
+
+
+def _fmt(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.1f}us"
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backend microbenchmarks with stored baselines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated data sizes")
+    run_parser.add_argument("--filter", default=None, help="Only cases whose name contains this")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing round")
+    run_parser.add_argument("--out", default=None, help="Write results JSON here")
+    run_parser.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    run_parser.add_argument("--keep-workdir", action="store_true")
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="Flag cases more than this fraction slower (0.25 = 25%%)")
+    compare_parser.add_argument("--metric", choices=["median", "min"], default="median")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        rows = compare(_load(args.baseline), _load(args.current), args.threshold, args.metric)
+        return 1 if print_comparison(rows) else 0
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = run(sizes, args.filter, args.repeat, args.min_time, args.keep_workdir)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print("Results written to", args.out)
+    if args.compare:
+        rows = compare(_load(args.compare), results, args.threshold)
+        return 1 if print_comparison(rows) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
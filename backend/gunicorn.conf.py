@@ -0,0 +1,7 @@
+# Loaded automatically by gunicorn from the working directory.
+from app.metrics import registry
+
+
+def on_starting(server):
+    # Snapshots left by the previous run's workers would otherwise be merged into /metrics.
+    registry.clear_directory()
@@ -0,0 +1,254 @@
+"""
+End-to-end load driver for the Health Hub backend (a.py).
+
+Each virtual user logs in once, then loops over a weighted mix of
+bookings, sick logs, ambulance requests and /api/ask-ai questions:
+
+    python -m loadtest.load_driver --base-url http://127.0.0.1:5000 \
+        --concurrency 50 --duration 60 --mix ask_ai=4,vaccine=2,checkup=2,ambulance=1,sick_log=1
+
+Reports p50/p95/p99 latency and throughput per route.
+"""
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+import requests
+
+QUESTIONS = [
+    "My child has a fever, what should I do?",
+    "My child has a fever and is vomiting",
+    "My son has a runny nose and a cough",
+    "My daughter has a stomach ache after lunch",
+    "What should I do if my child has a nosebleed?",
+    "My child has a rash on the arms",
+    "How can I help my child with an asthma attack?",
+    "My toddler is not eating vegetables",
+    "My child keeps having tantrums at bedtime",
+    "My child was stung by a bee",
+]
+URGENT_QUESTIONS = [
+    "My child is choking and can't breathe",
+    "My child is having a seizure",
+    "My child swallowed cleaning liquid",
+]
+LOW_PRIORITY_QUESTIONS = [
+    "My toddler is not eating vegetables",
+    "My child keeps having tantrums at bedtime",
+    "How much screen time is okay for a 5 year old?",
+]
+EMERGENCIES = ["High Fever", "Injury / Cut", "Allergic Reaction", "Breathing Difficulty", "Seizures"]
+VACCINES = ["Measles", "Polio", "BCG", "Immunization", "Chickenpox"]
+CHECKUPS = ["Eye Check-up", "Dental Check-up", "Both Eye & Dental"]
+GRADES = ["Grade R", "Grade 1", "Grade 2", "Grade 3"]
+DEFAULT_MIX = "ask_ai=4,vaccine=2,checkup=2,ambulance=1,sick_log=1"
+
+
+def _child(rng):
+    return f"Child {rng.randint(1, 500)}"
+
+
+def _day(rng):
+    return (date.today() + timedelta(days=rng.randint(0, 30))).isoformat()
+
+
+def scenario_login(session, base_url, rng, user):
+    return "POST /api/login", session.post(
+        f"{base_url}/api/login", data={"username": user, "role": "parent"}, allow_redirects=False
+    )
+
+
+def scenario_ask_ai(session, base_url, rng, user):
+    return "POST /api/ask-ai", session.post(f"{base_url}/api/ask-ai", json={
+        "question": rng.choice(QUESTIONS),
+        "age": str(rng.randint(2, 6)),
+        "category": "health",
+    })
+
+
+def scenario_ask_emergency(session, base_url, rng, user):
+    return "POST /api/ask-ai [emergency]", session.post(f"{base_url}/api/ask-ai", json={
+        "question": rng.choice(URGENT_QUESTIONS),
+        "age": str(rng.randint(2, 6)),
+        "category": "health",
+    })
+
+
+def scenario_ask_low(session, base_url, rng, user):
+    return "POST /api/ask-ai [low]", session.post(f"{base_url}/api/ask-ai", json={
+        "question": rng.choice(LOW_PRIORITY_QUESTIONS),
+        "age": str(rng.randint(2, 6)),
+        "category": "behaviour",
+    })
+
+
+def scenario_vaccine(session, base_url, rng, user):
+    return "POST /api/vaccine-booking", session.post(f"{base_url}/api/vaccine-booking", data={
+        "child_name": _child(rng), "vaccine_type": rng.choice(VACCINES), "date": _day(rng),
+    })
+
+
+def scenario_checkup(session, base_url, rng, user):
+    return "POST /api/checkup-booking", session.post(f"{base_url}/api/checkup-booking", data={
+        "child_name": _child(rng), "parent_email": user,
+        "check_type": rng.choice(CHECKUPS), "date": _day(rng),
+    })
+
+
+def scenario_sick_log(session, base_url, rng, user):
+    return "POST /api/sick-log", session.post(f"{base_url}/api/sick-log", data={
+        "child_name": _child(rng), "grade": rng.choice(GRADES), "symptoms": "fever, cough",
+        "description": "Sent home after lunch", "date": date.today().isoformat(),
+    })
+
+
+def scenario_ambulance(session, base_url, rng, user):
+    return "POST /api/ambulance-booking", session.post(f"{base_url}/api/ambulance-booking", data={
+        "child_name": _child(rng), "class_name": rng.choice(GRADES),
+        "emergency_type": rng.choice(EMERGENCIES), "description": "Load test request",
+    })
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "ask_ai": scenario_ask_ai,
+    "ask_emergency": scenario_ask_emergency,
+    "ask_low": scenario_ask_low,
+    "vaccine": scenario_vaccine,
+    "checkup": scenario_checkup,
+    "sick_log": scenario_sick_log,
+    "ambulance": scenario_ambulance,
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}'. Choose from: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def report(self, elapsed):
+        rows = []
+        for route in sorted(self.latencies):
+            values = sorted(self.latencies[route])
+            rows.append({
+                "route": route,
+                "requests": len(values),
+                "errors": self.errors[route],
+                "rps": len(values) / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+            })
+        return rows
+
+
+def virtual_user(index, args, mix, recorder, stop_at, budget, seed):
+    rng = random.Random(seed + index)
+    session = requests.Session()
+    user = f"load{index}@kgodisong.com"
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    first = True
+    while time.monotonic() < stop_at:
+        if budget is not None and not budget():
+            break
+        name = "login" if first else rng.choices(names, weights)[0]
+        first = False
+        started = time.perf_counter()
+        try:
+            route, response = SCENARIOS[name](session, args.base_url, rng, user)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            route, ok = name, False
+        recorder.record(route, time.perf_counter() - started, ok)
+        if args.think_ms:
+            time.sleep(rng.uniform(0, args.think_ms / 1000.0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Health Hub backend")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--concurrency", type=int, default=20, help="Number of virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted scenarios, e.g. ask_ai=4,vaccine=2")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Max random pause between requests")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_out", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    recorder = Recorder()
+    budget = None
+    if args.requests is not None:
+        remaining = [args.requests]
+        lock = threading.Lock()
+
+        def budget():
+            with lock:
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+                return True
+
+    started = time.monotonic()
+    stop_at = started + args.duration
+    threads = [
+        threading.Thread(target=virtual_user, args=(i, args, mix, recorder, stop_at, budget, args.seed), daemon=True)
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    rows = recorder.report(elapsed)
+    total = sum(r["requests"] for r in rows)
+    print(f"{args.concurrency} users, {elapsed:.1f}s, {total} requests, {total / elapsed:.1f} req/s\n")
+    header = f"{'route':<30}{'reqs':>8}{'errs':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['route']:<30}{r['requests']:>8}{r['errors']:>7}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"elapsed": elapsed, "concurrency": args.concurrency, "routes": rows}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Local stand-in for the Groq / OpenAI chat completions API.
+
+Lets the backend be load tested without spending real Groq quota:
+
+    python -m loadtest.mock_groq --port 8700 --latency lognormal --latency-ms 900
+    GROQ_BASE_URL=http://127.0.0.1:8700 python a.py
+
+Serves POST /openai/v1/chat/completions (Groq SDK path) and
+POST /v1/chat/completions (OpenAI SDK path), buffered or streamed (SSE).
+"""
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETION_PATHS = ("/openai/v1/chat/completions", "/v1/chat/completions")
+
+SAMPLE_ANSWER = (
+    "1. Keep the child comfortable, offer small sips of water and let them rest. "
+    "2. Red flags: trouble breathing, a stiff neck, a rash that does not fade, "
+    "unusual drowsiness or signs of dehydration. "
+    "3. Call the clinic if the fever lasts more than two days, or emergency "
+    "services straight away if any red flag appears. "
+    "If symptoms worsen or life is at risk, seek urgent medical care."
+)
+
+
+class LatencyModel:
+    """Samples response latency (seconds) from a named distribution."""
+
+    def __init__(self, distribution="lognormal", mean_ms=800.0, jitter_ms=300.0, seed=None):
+        self.distribution = distribution
+        self.mean = mean_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            r = self._random
+            if self.distribution == "constant":
+                value = self.mean
+            elif self.distribution == "uniform":
+                value = r.uniform(self.mean - self.jitter, self.mean + self.jitter)
+            elif self.distribution == "normal":
+                value = r.gauss(self.mean, self.jitter)
+            elif self.distribution == "exponential":
+                value = r.expovariate(1.0 / self.mean) if self.mean > 0 else 0.0
+            elif self.distribution == "lognormal":
+                # Parameterised so the distribution's mean is self.mean and its
+                # standard deviation is roughly self.jitter (long right tail).
+                if self.mean <= 0:
+                    value = 0.0
+                else:
+                    sigma2 = math.log(1 + (self.jitter / self.mean) ** 2)
+                    mu = math.log(self.mean) - sigma2 / 2
+                    value = r.lognormvariate(mu, math.sqrt(sigma2))
+            else:
+                raise ValueError(f"Unknown latency distribution: {self.distribution}")
+        return max(0.0, value)
+
+
+class MockGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency, ttft, tokens_per_sec, error_rate, error_statuses,
+                 answer=SAMPLE_ANSWER, seed=None):
+        super().__init__(address, MockGroqHandler)
+        self.latency = latency
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.answer = answer
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests_served = 0
+        self.errors_served = 0
+
+    def roll_error(self):
+        with self._lock:
+            self.requests_served += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors_served += 1
+                return self._random.choice(self.error_statuses)
+        return None
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in ("/health", "/"):
+            self._send_json(200, {
+                "status": "ok",
+                "requests": self.server.requests_served,
+                "errors": self.server.errors_served,
+            })
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        if self.path not in COMPLETION_PATHS:
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        server = self.server
+        status = server.roll_error()
+        if status is not None:
+            # Fail fast-ish, like a real rate limiter or overloaded upstream.
+            time.sleep(min(server.latency.sample(), 0.05))
+            headers = {"retry-after": "1"} if status == 429 else None
+            self._send_json(status, {"error": {"message": f"Mock error {status}", "type": "mock_error"}}, headers)
+            return
+
+        model = body.get("model", "llama-3.1-8b-instant")
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        words = server.answer.split(" ")
+        if body.get("stream"):
+            self._stream(model, words, prompt_tokens)
+        else:
+            time.sleep(server.latency.sample())
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": server.answer},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(words),
+                    "total_tokens": prompt_tokens + len(words),
+                },
+            })
+
+    def _stream(self, model, words, prompt_tokens):
+        server = self.server
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish_reason=None, usage=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if usage:
+                payload["x_groq"] = {"usage": usage}
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+            self.wfile.flush()
+
+        time.sleep(server.ttft.sample())
+        delay = 1.0 / server.tokens_per_sec if server.tokens_per_sec else 0.0
+        try:
+            chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(words):
+                chunk({"content": word if i == 0 else " " + word})
+                if delay:
+                    time.sleep(delay)
+            chunk({}, "stop", {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(words),
+                "total_tokens": prompt_tokens + len(words),
+            })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock Groq/OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency", default="lognormal",
+                        choices=["constant", "uniform", "normal", "exponential", "lognormal"],
+                        help="Distribution of full (non-streamed) response latency")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Mean latency")
+    parser.add_argument("--jitter-ms", type=float, default=300.0, help="Spread (stddev / half-range)")
+    parser.add_argument("--ttft-ms", type=float, default=250.0, help="Mean time to first streamed token")
+    parser.add_argument("--tokens-per-sec", type=float, default=120.0, help="Streaming token rate (0 = burst)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", default="429,500,503",
+                        help="Comma-separated HTTP statuses used for injected errors")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    latency = LatencyModel(args.latency, args.latency_ms, args.jitter_ms, args.seed)
+    ttft = LatencyModel(args.latency, args.ttft_ms, args.ttft_ms / 3, args.seed)
+    statuses = [int(s) for s in args.error_status.split(",") if s.strip()]
+    server = MockGroqServer(
+        (args.host, args.port), latency, ttft, args.tokens_per_sec,
+        args.error_rate, statuses, seed=args.seed,
+    )
+    print(f"Mock Groq server on http://{args.host}:{args.port} "
+          f"({args.latency} {args.latency_ms:.0f}ms, error rate {args.error_rate:.1%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
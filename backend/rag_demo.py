@@ -1,10 +1,11 @@
-import os, uuid, hashlib, shelve, json
-from flask import Flask, request, session, redirect, url_for, render_template_string
+import os, hashlib, shelve, json
+from flask import Flask, request, session, redirect, url_for, render_template_string, jsonify
+from app.retrieval import default_store
+from app.ingest import ingest_directory
 
 app = Flask(__name__)
 app.secret_key = "supersecretkey"
 
-DB_PATH = "vector_store.db"
 USER_DB = "users.db"
 
 
@@ -19,12 +20,6 @@ def check_password(raw, hashed):
     return hash_password(raw) == hashed
 
 
-# --- Fake embedding ---
-def fake_embed(text):
-    """Deterministic tiny embedding using md5 hashing."""
-    return [float(int(hashlib.md5(text.encode()).hexdigest()[:8], 16)) / 1e8]
-
-
 # -----------------------------------------------------
 # User management
 # -----------------------------------------------------
@@ -51,43 +46,17 @@ def authenticate_user(username, password):
 # Document operations
 # -----------------------------------------------------
 
+# --- Document store (app/retrieval.py) ---
 def save_document(content, tags=None, doc_id=None):
-    doc_id = doc_id or str(uuid.uuid4())
-    tags = tags or {}
-    with shelve.open(DB_PATH, writeback=True) as db:
-        db[doc_id] = {
-            "content": content,
-            "tags": tags,
-            "embedding": fake_embed(content)
-        }
-    return doc_id
+    return default_store().save(content, tags, doc_id)
 
 
 def search_documents(question, number_of_results=3):
-    """Sort by absolute difference between embeddings."""
-    q_emb = fake_embed(question)
-
-    with shelve.open(DB_PATH) as db:
-        items = list(db.items())
-
-    # Improved scoring
-    def score(item):
-        diff = abs(item[1]["embedding"][0] - q_emb[0])
-        return diff
-
-    items_sorted = sorted(items, key=score)
-    results = []
-
-    for doc_id, data in items_sorted[:number_of_results]:
-        relevance = 1 - abs(data["embedding"][0] - q_emb[0])
-        results.append({
-            "document_id": doc_id,
-            "content": data["content"],
-            "tags": data["tags"],
-            "relevance_score": round(relevance, 3)
-        })
-
-    return results
+    """
+    Hybrid search: vector similarity (exact or approximate, see app/ann_index.py)
+    and BM25 keyword hits, fused with reciprocal-rank fusion.
+    """
+    return default_store().search(question, number_of_results)
 
 
 def format_answer(results, is_admin=False):
@@ -252,6 +221,35 @@ def index():
     return render_template_string(html)
 
 
+@app.route("/admin/ingest", methods=["POST"])
+def ingest():
+    """Bulk-ingest a server-side directory of PDF/text files (admin only)."""
+    if session.get("role") != "admin":
+        return ("Forbidden", 403)
+    data = request.get_json(silent=True) or {}
+    directory = data.get("directory")
+    if not directory or not os.path.isdir(directory):
+        return jsonify({"status": "error", "message": "directory must be an existing server path"}), 400
+    try:
+        workers = int(data["workers"]) if data.get("workers") not in (None, "") else None
+        chunk_words = int(data.get("chunk_words", 200))
+        overlap = int(data.get("overlap", 40))
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "workers, chunk_words and overlap must be integers"}), 400
+    if workers is not None:
+        if workers < 1:
+            return jsonify({"status": "error", "message": "workers must be at least 1"}), 400
+        workers = min(workers, os.cpu_count() or 1)
+    if not 1 <= chunk_words <= 5000 or not 0 <= overlap < chunk_words:
+        return jsonify({"status": "error", "message": "need 1 <= chunk_words <= 5000 and 0 <= overlap < chunk_words"}), 400
+    documents = default_store()
+    stats = ingest_directory(
+        directory, documents.path, store=documents.vector_store(), keyword_index=documents.keyword_index(),
+        workers=workers, chunk_words=chunk_words, overlap=overlap,
+    )
+    return jsonify({"status": "success", **stats})
+
+
 # -----------------------------------------------------
 # Run App
 # -----------------------------------------------------
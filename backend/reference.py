@@ -1,6 +1,105 @@
-import random
-import string
+import os
+import zlib
+import itertools
+import threading
 from datetime import datetime
+from app.db.connection import unit_of_work
+
+# References come from a per-day, per-type sequence in the database. Each worker
+# reserves a block of numbers at a time and hands them out from memory, so
+# references are unique across workers without a database round trip each.
+# Defaults to a.py's DB_PATH, so the sequences live next to the bookings they number.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REFERENCE_DB_PATH = os.getenv(
+    "REFERENCE_DB_PATH", os.path.join(os.getenv("HEALTHHUB_DATA_DIR", BASE_DIR), "healthhub.db")
+)
+REFERENCE_BLOCK_SIZE = int(os.getenv("REFERENCE_BLOCK_SIZE", "50"))
+
+BASE36 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+SUFFIX_LENGTH = 5
+SUFFIX_SPACE = 36 ** SUFFIX_LENGTH
+# Coprime with 36**5, so n -> n * MULTIPLIER mod 36**5 is a permutation: suffixes stay
+# unique but consecutive bookings don't get guessable 00001, 00002, ... references.
+SUFFIX_MULTIPLIER = 48271
+
+
+def encode_suffix(number, salt=0):
+    number = ((number + salt) * SUFFIX_MULTIPLIER) % SUFFIX_SPACE
+    chars = []
+    for _ in range(SUFFIX_LENGTH):
+        number, digit = divmod(number, 36)
+        chars.append(BASE36[digit])
+    return "".join(reversed(chars))
+
+
+class ReferenceAllocator:
+    def __init__(self, db_path=REFERENCE_DB_PATH, block_size=REFERENCE_BLOCK_SIZE):
+        self.db_path = db_path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}  # (day, type_code) -> (counter, end), current day only
+        self._day = None
+        self._pid = os.getpid()
+        self._table_ready = False
+
+    def _reserve(self, day, type_code):
+        """Reserves the next block for (day, type_code); returns its first number."""
+        with unit_of_work(self.db_path) as conn:
+            if not self._table_ready:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS reference_sequences (
+                        day TEXT NOT NULL,
+                        type_code TEXT NOT NULL,
+                        next_value INTEGER NOT NULL,
+                        PRIMARY KEY (day, type_code)
+                    )
+                """)
+                self._table_ready = True
+            conn.execute(
+                "INSERT OR IGNORE INTO reference_sequences (day, type_code, next_value) VALUES (?, ?, 1)",
+                (day, type_code)
+            )
+            # The UPDATE takes the write lock, so no other worker can be handed the same block.
+            conn.execute(
+                "UPDATE reference_sequences SET next_value = next_value + ? WHERE day = ? AND type_code = ?",
+                (self.block_size, day, type_code)
+            )
+            end = conn.execute(
+                "SELECT next_value FROM reference_sequences WHERE day = ? AND type_code = ?", (day, type_code)
+            ).fetchone()[0]
+        return end - self.block_size
+
+    def next_number(self, type_code, day):
+        if self._pid != os.getpid():
+            # Forked worker: blocks held by the parent must not be reused.
+            self._blocks, self._pid = {}, os.getpid()
+        key = (day, type_code)
+        block = self._blocks.get(key)
+        if block is not None:
+            number = next(block[0])  # atomic under the GIL, no lock needed
+            if number < block[1]:
+                return number
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                number = next(block[0])
+                if number < block[1]:
+                    return number
+            start = self._reserve(day, type_code)
+            if day != self._day:
+                self._blocks, self._day = {}, day  # forget earlier days
+            # Inserting in place is safe for the lock-free readers above (GIL-atomic).
+            self._blocks[key] = (itertools.count(start + 1), start + self.block_size)
+            return start
+
+    def allocate(self, prefix):
+        """e.g. allocate("KGH-MSL") -> "KGH-MSL-20251212-7K2QD". Each prefix has its own sequence."""
+        day = datetime.now().strftime("%Y%m%d")
+        return f"{prefix}-{day}-{encode_suffix(self.next_number(prefix, day), zlib.crc32(prefix.encode()))}"
+
+
+allocator = ReferenceAllocator()
+
 
 def generate_ai_reference(vaccine_type):
     # Map vaccine types to short codes
@@ -14,13 +113,7 @@ def generate_ai_reference(vaccine_type):
     }
 
     code = type_codes.get(vaccine_type, "GEN")
-
-    date_part = datetime.now().strftime("%Y%m%d")
-
-    random_part = ''.join(random.choices(string.hexdigits.upper(), k=5))
-
-    reference = f"KGH-{code}-{date_part}-{random_part}"
-    return reference
+    return allocator.allocate(f"KGH-{code}")
 
 
 def generate_ai_checkup_reference(check_type):
@@ -30,6 +123,8 @@ def generate_ai_checkup_reference(check_type):
         "Both Eye & Dental": "BOTH"
     }
     code = type_codes.get(check_type, "GEN")
-    date_part = datetime.now().strftime("%Y%m%d")
-    random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-    return f"KGH-{code}-{date_part}-{random_part}"
+    return allocator.allocate(f"KGH-{code}")
+
+
+def generate_ambulance_reference():
+    return allocator.allocate("AMB")
@@ -0,0 +1,47 @@
+import pytest
+from app.admission import (
+    AdmissionController, Overloaded, PRIORITY_EMERGENCY, PRIORITY_HEALTH, PRIORITY_LOW,
+)
+
+
+def controller(**kwargs):
+    # A near-zero refill rate: only the initial burst is available.
+    options = dict(rate_per_min=0.001, burst=3, max_inflight=4, reserve_tokens=1, reserve_slots=1,
+                   max_wait={PRIORITY_HEALTH: 0.05, PRIORITY_LOW: 0.05})
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+def test_ordinary_traffic_is_shed_while_the_emergency_reserve_holds():
+    admission = controller()
+    admission.acquire(PRIORITY_HEALTH)
+    admission.acquire(PRIORITY_LOW)
+    # One token is left, and it is reserved for emergencies.
+    with pytest.raises(Overloaded) as shed:
+        admission.acquire(PRIORITY_HEALTH)
+    assert shed.value.retry_after >= 1
+
+    admission.acquire(PRIORITY_EMERGENCY, max_wait=0.05)
+    stats = admission.stats()
+    assert stats["inflight"] == 3
+    assert stats["admitted"] == {"emergency": 1, "health": 1, "low": 1}
+    assert stats["shed"]["health"] == 1
+
+
+def test_reserved_slots_are_kept_for_emergencies():
+    admission = controller(burst=10, max_inflight=3, reserve_slots=1)
+    admission.acquire(PRIORITY_HEALTH)
+    admission.acquire(PRIORITY_HEALTH)
+    with pytest.raises(Overloaded):
+        admission.acquire(PRIORITY_HEALTH)
+    admission.acquire(PRIORITY_EMERGENCY, max_wait=0.05)
+    with pytest.raises(Overloaded):
+        admission.acquire(PRIORITY_EMERGENCY, max_wait=0.05)
+
+    # Ordinary traffic gets a slot back only once it is under its own limit again.
+    admission.release()
+    with pytest.raises(Overloaded):
+        admission.acquire(PRIORITY_HEALTH)
+    admission.release()
+    admission.acquire(PRIORITY_HEALTH)
+    assert admission.stats()["inflight"] == 2
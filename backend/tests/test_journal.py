@@ -0,0 +1,30 @@
+from app.journal import JsonlJournal
+
+
+def test_rotation_keeps_every_record_in_order(tmp_path):
+    journal = JsonlJournal(str(tmp_path / "requests.jsonl"), max_bytes=300)
+    for i in range(60):
+        journal.append({"reference": f"AMB-{i:03d}", "note": "x" * 20}, durable=i % 10 == 0)
+
+    files = journal.files()
+    assert len(files) > 2
+    assert files[-1] == str(tmp_path / "requests.jsonl")
+    assert [r["reference"] for r in journal] == [f"AMB-{i:03d}" for i in range(60)]
+
+
+def test_recent_reads_across_rotated_files(tmp_path):
+    journal = JsonlJournal(str(tmp_path / "requests.jsonl"), max_bytes=300)
+    for i in range(60):
+        journal.append({"n": i}, durable=False)
+
+    assert [r["n"] for r in journal.recent(25, block_size=16)] == list(range(35, 60))
+    assert [r["n"] for r in journal.recent(1000)] == list(range(60))
+
+
+def test_recent_skips_a_torn_final_line(tmp_path):
+    path = tmp_path / "requests.jsonl"
+    journal = JsonlJournal(str(path))
+    journal.append_many([{"n": 1}, {"n": 2}])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"n": 3')
+    assert journal.recent(5) == [{"n": 1}, {"n": 2}]
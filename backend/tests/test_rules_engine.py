@@ -0,0 +1,54 @@
+import json
+import pytest
+from app.rules_engine import CompiledRules, RulesEngine, DEFAULT_RULES, validate_rules
+
+
+def legacy_guidance_name(emergency_type):
+    """The if/elif chain the default rules replaced."""
+    text = emergency_type.lower()
+    if "fever" in text:
+        return "fever"
+    elif "injury" in text or "cut" in text:
+        return "injury"
+    elif "allergic" in text:
+        return "allergy"
+    elif "breathing" in text or "asthma" in text:
+        return "breathing"
+    return None
+
+
+@pytest.mark.parametrize("emergency_type", [
+    "Fever", "high fever and a cut", "cut on the knee with fever", "Injury",
+    "allergic reaction, breathing fast", "Breathing trouble after an injury",
+    "asthma attack", "ASTHMA and allergic", "allergic", "nose bleed", "",
+])
+def test_default_rules_follow_the_old_if_elif_order(emergency_type):
+    match = CompiledRules(validate_rules(DEFAULT_RULES)).first_match(emergency_type)
+    assert (match["name"] if match else None) == legacy_guidance_name(emergency_type)
+
+
+def test_earlier_rule_wins_wherever_its_keyword_appears():
+    rules = validate_rules([
+        {"name": "first", "keywords": ["seizure"], "guidance": []},
+        {"name": "second", "keywords": ["sei", "head injury"], "guidance": []},
+    ])
+    compiled = CompiledRules(rules)
+    assert compiled.first_match("head   injury then a seizure")["name"] == "first"
+    assert compiled.first_match("HEAD INJURY")["name"] == "second"
+    assert compiled.first_match("ſeizure")["name"] == "first"
+
+
+def test_keywords_match_at_word_starts_only():
+    compiled = CompiledRules(validate_rules(DEFAULT_RULES))
+    assert compiled.first_match("acute pain") is None
+    assert compiled.first_match("two cuts")["name"] == "injury"
+
+
+def test_broken_rules_file_keeps_the_previous_rules(tmp_path):
+    path = tmp_path / "health_rules.json"
+    path.write_text(json.dumps([{"name": "custom", "keywords": ["rash"], "guidance": ["Keep cool."]}]))
+    engine = RulesEngine(str(path), check_interval=0)
+    assert engine.match("itchy rash")["name"] == "custom"
+
+    path.write_text("[{not json")
+    assert engine.match("itchy rash")["name"] == "custom"
@@ -0,0 +1,55 @@
+import json
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.scheduler import SlotScheduler, SlotUnavailable
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return SlotScheduler(str(tmp_path / "healthhub.db"))
+
+
+def book(scheduler, slot_id, service, reference):
+    engine = create_engine(f"sqlite:///{scheduler.db_path}")
+    with Session(engine) as session, session.begin():
+        return scheduler.reserve(session, slot_id, service, reference, "Child 1")
+
+
+def slots(scheduler, visit_id):
+    return json.loads(scheduler.availability(visit_id)[1])["slots"]
+
+
+def test_reservation_fails_once_the_slot_is_full(scheduler):
+    visit_id = scheduler.create_visit("Mobile clinic", "2030-03-02", "08:00", "09:00",
+                                      capacity=2, services=["vaccine"])
+    [slot] = slots(scheduler, visit_id)
+
+    assert book(scheduler, slot["id"], "vaccine", "VAC-1") == "2030-03-02 08:00"
+    book(scheduler, slot["id"], "vaccine", "VAC-2")
+    with pytest.raises(SlotUnavailable) as full:
+        book(scheduler, slot["id"], "vaccine", "VAC-3")
+    assert full.value.reason == "this slot is full"
+    assert slots(scheduler, visit_id)[0]["free"] == 0
+
+
+def test_reservation_checks_the_service_and_the_slot(scheduler):
+    visit_id = scheduler.create_visit("Clinic", "2030-03-02", "08:00", "09:00", capacity=5, services=["checkup"])
+    [slot] = slots(scheduler, visit_id)
+    with pytest.raises(SlotUnavailable, match="checkup"):
+        book(scheduler, slot["id"], "vaccine", "VAC-1")
+    with pytest.raises(SlotUnavailable, match="no such slot"):
+        book(scheduler, 999, "checkup", "CHK-1")
+    assert slots(scheduler, visit_id)[0]["free"] == 5
+
+
+def test_a_rolled_back_booking_releases_its_place(scheduler):
+    visit_id = scheduler.create_visit("Clinic", "2030-03-02", "08:00", "09:00", capacity=1, services=["vaccine"])
+    [slot] = slots(scheduler, visit_id)
+    engine = create_engine(f"sqlite:///{scheduler.db_path}")
+    with Session(engine) as session:
+        scheduler.reserve(session, slot["id"], "vaccine", "VAC-1", "Child 1")
+        session.rollback()
+    assert slots(scheduler, visit_id)[0]["free"] == 1
+    book(scheduler, slot["id"], "vaccine", "VAC-2")
+    assert slots(scheduler, visit_id)[0]["free"] == 0
@@ -0,0 +1,75 @@
+import threading
+from app import task_queue
+from app.task_queue import TaskQueue
+
+
+def test_concurrent_claims_never_issue_a_task_twice(tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    queue = TaskQueue(db_path)
+    for i in range(200):
+        queue.enqueue("job", {"i": i})
+
+    claimed = []
+    def work(worker_id):
+        while True:
+            tasks = queue.claim(worker_id, limit=3)
+            if not tasks:
+                return
+            claimed.extend(task_id for task_id, _, _, _ in tasks)
+
+    threads = [threading.Thread(target=work, args=(f"w{n}",)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(claimed) == 200
+    assert len(set(claimed)) == 200
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(tmp_path):
+    queue = TaskQueue(str(tmp_path / "tasks.db"))
+    queue.enqueue("job", {})
+    [(task_id, _, _, attempts)] = queue.claim("w1", visibility_timeout=-1)
+    [(again, _, _, second)] = queue.claim("w2")
+    assert (again, attempts, second) == (task_id, 1, 2)
+    assert queue.claim("w3") == []
+
+
+def test_failed_task_is_retried_then_marked_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_queue, "backoff_delay", lambda attempts: 0.0)
+    queue = TaskQueue(str(tmp_path / "tasks.db"))
+    calls = []
+
+    @queue.task("flaky", max_attempts=2)
+    def flaky(payload):
+        calls.append(payload)
+        raise RuntimeError("boom")
+
+    queue.enqueue("flaky", {"n": 1})
+    [task] = queue.claim("w1")
+    assert queue.run_task(*task, "w1") is False
+    assert queue.stats()["queued"] == 1
+
+    [task] = queue.claim("w1")
+    assert task[3] == 2
+    assert queue.run_task(*task, "w1") is False
+    assert queue.stats()["failed"] == 1
+    assert queue.claim("w1") == []
+    assert calls == [{"n": 1}, {"n": 1}]
+    [(_, _, status, attempts, _, _, _, last_error)] = queue.list()
+    assert (status, attempts) == ("failed", 2)
+    assert "boom" in last_error
+
+
+def test_dedupe_key_collapses_queued_tasks_only(tmp_path):
+    queue = TaskQueue(str(tmp_path / "tasks.db"))
+    queue.enqueue("flush", {}, dedupe_key="flush")
+    queue.enqueue("flush", {}, dedupe_key="flush")
+    assert queue.stats()["queued"] == 1
+
+    # Once the first one runs, a follow-up may be queued behind it.
+    queue.claim("w1")
+    queue.enqueue("flush", {}, dedupe_key="flush")
+    queue.enqueue("flush", {}, dedupe_key="flush")
+    assert queue.stats()["queued"] == 1
+    assert queue.stats()["running"] == 1